@@ -4,6 +4,12 @@ from langgraph.graph import StateGraph, START, END
 from agents.basic.state import State
 
 from agents.basic.nodes.chatbot.node import chatbot
+from agents.basic.nodes.semantic_cache.node import (
+    semantic_cache_lookup,
+    semantic_cache_store,
+    route_after_semantic_cache,
+)
+from src.core.semantic_cache import semantic_cache
 
 def make_graph(config: TypedDict):
 
@@ -12,8 +18,17 @@ def make_graph(config: TypedDict):
     workflow = StateGraph(State)
     workflow.add_node("chatbot", chatbot)
 
-    workflow.add_edge(START, "chatbot")
-    workflow.add_edge("chatbot", END)
+    if semantic_cache is None:
+        workflow.add_edge(START, "chatbot")
+        workflow.add_edge("chatbot", END)
+    else:
+        # Near-duplicate questions are answered before reaching the LLM
+        workflow.add_node("semantic_cache", semantic_cache_lookup)
+        workflow.add_node("semantic_cache_store", semantic_cache_store)
+        workflow.add_edge(START, "semantic_cache")
+        workflow.add_conditional_edges("semantic_cache", route_after_semantic_cache, ["chatbot", END])
+        workflow.add_edge("chatbot", "semantic_cache_store")
+        workflow.add_edge("semantic_cache_store", END)
 
     # compile the graph with checkpointer for state persistence
     # Using PostgreSQL for persistent checkpoints
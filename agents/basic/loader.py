@@ -0,0 +1,78 @@
+"""
+Lazy access to the compiled agent graph.
+
+Importing the graph pulls in langgraph, langchain and the provider SDK,
+which takes seconds. Routers go through this module instead, so a worker
+can start (and a --reload cycle finish) without them. The stack is loaded
+by the app lifespan in the background (AGENT_PRELOAD) or on first use, and
+the graph is compiled once per checkpointer instead of once per request.
+"""
+import asyncio
+import threading
+import weakref
+
+_lock = threading.Lock()
+_graphs: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_loaded = False
+
+
+def load_agent_stack() -> None:
+    """Import the graph modules and build the chat model. Blocking and idempotent."""
+    global _loaded
+    if _loaded:
+        return
+    with _lock:
+        if _loaded:
+            return
+        from agents.basic import agent  # noqa: F401
+        from agents.basic.nodes.chatbot.node import get_llm, llm_model
+        from agents.basic.routing import model_router
+        from src.core.tracing import register_graph_tracing_hook
+
+        register_graph_tracing_hook()
+        get_llm()
+        # The encodings may have to be downloaded; prompts use the heuristic count until they are ready
+        models = list(dict.fromkeys([llm_model, *(route.model for route in model_router.routes)]))
+        threading.Thread(target=load_tokenizers, args=(models,), name="tokenizer-load", daemon=True).start()
+        _loaded = True
+
+
+def load_tokenizers(models: list[str]) -> None:
+    """Load the exact token counter of each model (the default model and every route's), in order. Blocking."""
+    from agents.basic.tokens import get_context_budget
+
+    for model in models:
+        get_context_budget(model).counter.load()
+
+
+def get_graph(checkpointer):
+    """Graph compiled with `checkpointer`, compiled on the first call. Blocking."""
+    graph = _graphs.get(checkpointer)
+    if graph is not None:
+        return graph
+    load_agent_stack()
+    from agents.basic.agent import make_graph
+
+    with _lock:
+        graph = _graphs.get(checkpointer)
+        if graph is None:
+            graph = make_graph(config={"checkpointer": checkpointer})
+            _graphs[checkpointer] = graph
+    return graph
+
+
+async def aget_graph(checkpointer):
+    """get_graph without blocking the event loop while the stack is imported."""
+    graph = _graphs.get(checkpointer)
+    if graph is not None:
+        return graph
+    return await asyncio.to_thread(get_graph, checkpointer)
+
+
+async def aget_ephemeral_graph():
+    """A graph on a fresh in-memory checkpointer (batch runs). Not cached."""
+    await asyncio.to_thread(load_agent_stack)
+    from agents.basic.agent import make_graph
+    from langgraph.checkpoint.memory import InMemorySaver
+
+    return make_graph(config={"checkpointer": InMemorySaver()})
@@ -1,29 +1,58 @@
 import logging
-import uuid
 from typing import Literal
 from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import merge_configs
 from agents.basic.state import State
-from langchain.chat_models import init_chat_model
 from langchain_core.callbacks import UsageMetadataCallbackHandler
 from langchain_core.messages import SystemMessage, AIMessage
 
-from src.db.database import SessionLocal
+from src.core.config import settings
+from src.core.adaptive_limiter import llm_limiter
+from src.core.llm_cache import CachedResponse, make_cache_key, response_cache
+from src.core.resilient_llm import build_resilient_chat_model
+from src.core.metrics import llm_metrics_callback
+from src.core.token_budget import TokenBudgetExceeded
 
-from src.services.usage_log_service import create_usage_log
-from src.schemas.usage_log import UsageLogCreate
+from agents.basic.routing import ModelRoute, model_router
+from agents.basic.tokens import ContextWindowExceeded, get_context_budget
+from agents.basic.usage import get_run_context, record_usage
 
 from .prompt import SYSTEM_PROMPT
 
 # Configure logger for this module
 logger = logging.getLogger(__name__)
 
-llm_model = "openai:gpt-4o-mini"
-llm_temperature = 1
+llm_model = settings.LLM_MODEL
+llm_temperature = settings.LLM_TEMPERATURE
 
-# Initialize LLM
-llm = init_chat_model(llm_model, temperature=llm_temperature)
+# LLM (hedged, with fallbacks) on the shared, pooled HTTP client; built on first use so importing the graph stays cheap
+llm = None
 
-def chatbot(state: State, config: RunnableConfig) -> dict:
+
+def get_llm():
+    global llm
+    if llm is None:
+        llm = build_resilient_chat_model(llm_model, temperature=llm_temperature)
+    return llm
+
+
+# Models picked by the router, built on first use
+_routed_llms: dict = {}
+
+
+def get_routed_llm(route: ModelRoute):
+    routed = _routed_llms.get(route)
+    if routed is None:
+        # A routed model falls back to the default model and its fallbacks
+        routed = _routed_llms.setdefault(route, build_resilient_chat_model(
+            route.model,
+            temperature=llm_temperature if route.temperature is None else route.temperature,
+            fallbacks=[llm_model, *settings.LLM_FALLBACK_MODELS],
+        ))
+    return routed
+
+
+async def chatbot(state: State, config: RunnableConfig) -> dict:
     """
     Node that handles the chatbot logic.
     
@@ -37,42 +66,74 @@ def chatbot(state: State, config: RunnableConfig) -> dict:
         Logs errors but returns graceful error message instead of raising
     """
 
-    # Extract user_id from config
-    # In LangGraph, custom context is passed at the top level of config
-    user_id = config.get("user_id") if isinstance(config, dict) else None
-    main_call_tid = config.get("main_call_tid") if isinstance(config, dict) else None
-    
-    # Fallback: try to get from configurable
-    if not user_id and isinstance(config, dict):
-        user_id = config.get("configurable", {}).get("user_id")
+    user_id, main_call_tid, usage_log_buffer = get_run_context(config)
     
-    if not main_call_tid and isinstance(config, dict):
-        main_call_tid = config.get("configurable", {}).get("main_call_tid")
-    
-    logger.debug(f"Extracted user_id from config: {user_id}")
-    logger.debug(f"Full config keys: {config.keys() if isinstance(config, dict) else 'Not a dict'}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Extracted user_id from config: %s", user_id)
+        logger.debug("Full config keys: %s", list(config.keys()) if isinstance(config, dict) else "Not a dict")
 
     callback = UsageMetadataCallbackHandler()
 
     try:
         # Log incoming message
         message_count = len(state.get("messages", []))
-        logger.debug(f"Processing chatbot node with {message_count} messages in state")
+        logger.debug("Processing chatbot node with %d messages in state", message_count)
+
+        # Pick the smallest sufficient model for this turn (None keeps the default one)
+        configurable = config.get("configurable", {}) if isinstance(config, dict) else {}
+        route = model_router.choose(state["messages"], configurable.get("plan"))
+        model = llm_model if route is None else route.model
+        temperature = llm_temperature if route is None or route.temperature is None else route.temperature
         
-        # Add the system prompt to the messages
-        messages = [SystemMessage(content=SYSTEM_PROMPT)] + state["messages"]
-        logger.debug(f"Total messages to send to LLM: {len(messages)}")
+        # Serve repeated stateless prompts from the exact-match response cache
+        cache_key = None
+        if response_cache is not None and response_cache.is_cacheable(temperature, state["messages"]):
+            cache_key = make_cache_key(model, temperature, SYSTEM_PROMPT, state["messages"])
+            cached = await response_cache.get(cache_key)
+            if cached is not None:
+                logger.info("Chatbot response served from cache")
+                # Cache hits still count as a query, with zero tokens
+                zero_usage = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+                await record_usage(
+                    {cached.model or model: zero_usage},
+                    user_id,
+                    main_call_tid,
+                    usage_log_buffer,
+                    "Node chatbot (cache hit)"
+                )
+                return {"messages": [AIMessage(content=cached.content)], **zero_usage}
+
+        # Add the system prompt and drop the oldest history that does not fit the model's context window
+        prompt = get_context_budget(model).fit(SystemMessage(content=SYSTEM_PROMPT), state["messages"])
+        messages = prompt.messages
+        logger.debug("Total messages to send to LLM: %d (%d tokens)", len(messages), prompt.tokens)
+
+        # Reject turns whose prompt alone would overrun the plan's token budget, before paying for them
+        token_budget = configurable.get("token_budget")
+        if token_budget is not None and token_budget.limited:
+            token_budget.check_prompt(prompt.tokens)
         
         # Invoke the LLM without structured output to allow streaming
         logger.info("Invoking LLM for response generation")
 
-        response = llm.invoke(messages, config={"callbacks": [callback]})
+        chat_model = get_llm() if route is None else get_routed_llm(route)
+
+        # The adaptive limiter bounds in-flight LLM calls based on observed latency
+        async with llm_limiter.slot():
+            # Keep the graph's callbacks so stream_mode="messages" receives tokens
+            response = await chat_model.ainvoke(messages, config=merge_configs(config, {"callbacks": [callback, llm_metrics_callback]}))
         
-        logger.debug(f"LLM response received: {type(response).__name__}")
+        logger.debug("LLM response received: %s", type(response).__name__)
         logger.info("Chatbot node completed successfully")
 
-        # Process usage logs
-        totals = process_usage_logs(callback, user_id, main_call_tid)
+        # Record usage first: the tokens are spent even if the run is cancelled from here on
+        totals = await record_usage(callback.usage_metadata, user_id, main_call_tid, usage_log_buffer)
+
+        if cache_key is not None and isinstance(response.content, str) and response.content and not response.tool_calls:
+            await response_cache.set(
+                cache_key,
+                CachedResponse(content=response.content, model=response.response_metadata.get("model_name"))
+            )
 
         return {
             "messages": [response],
@@ -80,7 +141,17 @@ def chatbot(state: State, config: RunnableConfig) -> dict:
             "output_tokens": totals.get("output_tokens", 0),
             "total_tokens": totals.get("total_tokens", 0)
         }
-        
+
+    except TokenBudgetExceeded:
+        raise
+
+    except ContextWindowExceeded as e:
+        logger.warning("Chatbot prompt does not fit the context window: %s", e)
+        return {"messages": [AIMessage(
+            content="Your message is too long for me to process. Please shorten it and try again.",
+            response_metadata={"error": True}
+        )]}
+
     except Exception as e:
         logger.error(
             f"Error in chatbot node: {str(e)}",
@@ -93,61 +164,8 @@ def chatbot(state: State, config: RunnableConfig) -> dict:
         
         # Return graceful error message to user
         error_message = AIMessage(
-            content="I'm sorry, there was an error processing your message. Please try again."
+            content="I'm sorry, there was an error processing your message. Please try again.",
+            response_metadata={"error": True}
         )
 
         return {"messages": [error_message]}
-
-def process_usage_logs(callback: UsageMetadataCallbackHandler, user_id: int, main_call_tid: str) -> dict:
-
-    input_tokens = 0
-    output_tokens = 0
-    total_tokens = 0
-
-    try:
-
-        db = SessionLocal()
-
-        # Extract token usage from callback
-        # usage_metadata structure: {"model-name": {"input_tokens": X, "output_tokens": Y, ...}}
-        usage_metadata = callback.usage_metadata or {}
-        
-        logger.debug(f"Usage metadata: {usage_metadata}")
-        
-        # Iterate over each model in usage_metadata and create a log entry for each
-        for model_name, model_tokens in usage_metadata.items():
-            try:
-
-                input_tokens += model_tokens.get("input_tokens", 0)
-                output_tokens += model_tokens.get("output_tokens", 0)
-                total_tokens += model_tokens.get("total_tokens", 0)
-
-                usage_data = UsageLogCreate(
-                    main_call_tid=str(main_call_tid),
-                    node_call_tid=f"node-{str(uuid.uuid4())}",
-                    description="Node chatbot",
-                    model=model_name,
-                    inputs=model_tokens.get("input_tokens", 0),
-                    outputs=model_tokens.get("output_tokens", 0),
-                    total=model_tokens.get("total_tokens", 0),
-                )
-                
-                logger.debug(f"Creating usage log for model: {model_name}, tokens: {model_tokens}")
-                
-                create_usage_log(
-                    db,
-                    user_id=user_id,
-                    usage_data=usage_data,
-                )
-                
-            except Exception as model_error:
-                logger.error(f"Error creating usage log for model {model_name}: {str(model_error)}")
-
-    except Exception as e:
-        logger.error(f"Error processing usage logs: {str(e)}")
-
-    return {
-        "input_tokens": input_tokens,
-        "output_tokens": output_tokens,
-        "total_tokens": total_tokens
-    }
\ No newline at end of file
@@ -0,0 +1,108 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Literal
+from langchain_core.runnables import RunnableConfig
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.graph import END
+from agents.basic.state import State
+
+from src.core.config import settings
+from src.core.llm_cache import CachedResponse
+from src.core.semantic_cache import semantic_cache
+
+from agents.basic.usage import get_run_context, record_usage
+
+# Configure logger for this module
+logger = logging.getLogger(__name__)
+
+# Query embeddings from lookups that missed, waiting for the chatbot answer.
+# Bounded so runs that never reach the store node cannot leak memory.
+MAX_PENDING = 1024
+_pending: OrderedDict[str, tuple[list[float], float]] = OrderedDict()
+
+
+def _run_key(config: RunnableConfig) -> str:
+    configurable = config.get("configurable", {}) if isinstance(config, dict) else {}
+    _, main_call_tid, _ = get_run_context(config)
+    return f"{configurable.get('thread_id')}:{main_call_tid}"
+
+
+async def semantic_cache_lookup(state: State, config: RunnableConfig) -> dict:
+    """
+    Node that answers near-duplicate questions from the semantic cache.
+    
+    Args:
+        state: Current conversation state with messages
+        
+    Returns:
+        dict: The cached answer on a hit, otherwise only the miss flag
+    """
+    messages = state.get("messages", [])
+    if (
+        semantic_cache is None
+        or not messages
+        or len(messages) > settings.SEMANTIC_CACHE_MAX_MESSAGES
+        or not isinstance(messages[-1], HumanMessage)
+        or not isinstance(messages[-1].content, str)
+    ):
+        return {"semantic_cache_hit": False}
+
+    try:
+        cached, vector = await semantic_cache.lookup(messages[-1].content)
+    except Exception as e:
+        logger.error(f"Semantic cache lookup failed: {str(e)}")
+        return {"semantic_cache_hit": False}
+
+    if cached is None:
+        _pending[_run_key(config)] = (vector, time.perf_counter())
+        while len(_pending) > MAX_PENDING:
+            _pending.popitem(last=False)
+        return {"semantic_cache_hit": False}
+
+    # Hits still count as a query, with zero tokens
+    user_id, main_call_tid, usage_log_buffer = get_run_context(config)
+    zero_usage = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+    await record_usage(
+        {cached.model or settings.LLM_MODEL: zero_usage},
+        user_id,
+        main_call_tid,
+        usage_log_buffer,
+        "Node semantic_cache (hit)"
+    )
+    return {"messages": [AIMessage(content=cached.content)], "semantic_cache_hit": True, **zero_usage}
+
+
+def route_after_semantic_cache(state: State) -> Literal["chatbot", "__end__"]:
+    """Skip the chatbot node when the semantic cache answered."""
+    return END if state.get("semantic_cache_hit") else "chatbot"
+
+
+async def semantic_cache_store(state: State, config: RunnableConfig) -> dict:
+    """
+    Node that indexes the chatbot answer for questions that missed the cache.
+    
+    Returns:
+        dict: Empty update
+    """
+    pending = _pending.pop(_run_key(config), None)
+    if semantic_cache is None or pending is None:
+        return {}
+
+    response = state["messages"][-1]
+    if (
+        not isinstance(response, AIMessage)
+        or response.response_metadata.get("error")
+        or response.tool_calls
+        or not isinstance(response.content, str)
+        or not response.content
+    ):
+        return {}
+
+    vector, started_at = pending
+    semantic_cache.store(
+        vector,
+        CachedResponse(content=response.content, model=response.response_metadata.get("model_name")),
+        miss_path_seconds=time.perf_counter() - started_at
+    )
+    return {}
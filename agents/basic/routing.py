@@ -0,0 +1,143 @@
+"""
+Per-turn model routing for the chatbot node.
+
+LLM_ROUTES lists candidate models from the smallest (fastest, cheapest) up.
+Each turn goes to the first route whose limits all hold, and to LLM_MODEL
+when none does:
+
+- max_message_chars: length of the user's new message(s)
+- max_context_tokens: estimated tokens of the whole conversation, which must
+  also fit the route model's context window
+- plans: plan names that may use the route (every plan when omitted)
+- max_latency_seconds: the route is skipped while the model's recent p95
+  latency is above this (time to first token and whole-call latency are
+  both checked once LLM_ROUTE_MIN_LATENCY_SAMPLES are known), and while its
+  circuit is open. Only samples from the last LLM_ROUTE_LATENCY_MAX_AGE_SECONDS
+  count, so a route skipped for being slow is tried again once they age out
+
+Example sending short questions of a short conversation to a smaller model:
+    LLM_ROUTES='[{"model": "openai:gpt-4.1-nano", "max_message_chars": 300, "max_context_tokens": 2000}]'
+
+Token counts are cached per message id, so routing a turn only tokenizes its
+new messages. Usage logs record the model that answered.
+"""
+import logging
+from dataclasses import dataclass, fields
+from typing import Optional, Sequence
+
+from langchain_core.messages import BaseMessage, HumanMessage
+
+from src.core.config import settings
+from src.core.metrics import llm_routed_turns
+from src.core.resilient_llm import ModelHealth, model_health
+
+from agents.basic.tokens import get_context_budget, message_text
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ModelRoute:
+    """A candidate model and the turns it may serve."""
+    model: str
+    temperature: Optional[float] = None  # None uses LLM_TEMPERATURE
+    max_message_chars: Optional[int] = None
+    max_context_tokens: Optional[int] = None
+    plans: Optional[frozenset[str]] = None
+    max_latency_seconds: Optional[float] = None
+
+    @classmethod
+    def from_dict(cls, raw: dict) -> "ModelRoute":
+        """
+        Raises:
+            ValueError: If the entry has no model or unknown keys
+        """
+        unknown = set(raw) - {f.name for f in fields(cls)}
+        if unknown or not raw.get("model"):
+            raise ValueError(f"Invalid LLM_ROUTES entry {raw!r}: needs a model and only {[f.name for f in fields(cls)]}")
+        plans = raw.get("plans")
+        return cls(**{**raw, "plans": frozenset(plans) if plans is not None else None})
+
+
+def turn_message_chars(messages: Sequence[BaseMessage]) -> int:
+    """Characters of the user messages at the end of the conversation (more than one when turns were merged)."""
+    chars = 0
+    for message in reversed(messages):
+        if not isinstance(message, HumanMessage):
+            break
+        chars += len(message_text(message))
+    return chars
+
+
+class ModelRouter:
+    """Picks the smallest sufficient model for a turn."""
+
+    def __init__(
+        self,
+        routes: Sequence[ModelRoute],
+        default_model: str,
+        health: ModelHealth,
+        min_latency_samples: int = 20,
+        latency_max_age_seconds: Optional[float] = None,
+    ):
+        self.routes = tuple(routes)
+        self.default_model = default_model
+        self.health = health
+        self.min_latency_samples = min_latency_samples
+        self.latency_max_age_seconds = latency_max_age_seconds
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.routes)
+
+    def choose(self, messages: Sequence[BaseMessage], plan: Optional[str] = None) -> Optional[ModelRoute]:
+        """The route for this turn, or None for the default model."""
+        if not self.routes:
+            return None
+        message_chars = turn_message_chars(messages)
+        context_tokens = get_context_budget(self.default_model).counter.count_messages(messages)
+        for route in self.routes:
+            if self._fits(route, message_chars, context_tokens, plan):
+                llm_routed_turns.labels(route.model).inc()
+                logger.debug("Turn routed to %s (%d chars, ~%d tokens)", route.model, message_chars, context_tokens)
+                return route
+        llm_routed_turns.labels(self.default_model).inc()
+        return None
+
+    def _fits(self, route: ModelRoute, message_chars: int, context_tokens: int, plan: Optional[str]) -> bool:
+        if route.max_message_chars is not None and message_chars > route.max_message_chars:
+            return False
+        if route.max_context_tokens is not None and context_tokens > route.max_context_tokens:
+            return False
+        if context_tokens > get_context_budget(route.model).available:
+            return False
+        if route.plans is not None and plan not in route.plans:
+            return False
+        if self.health.breaker(route.model).rejecting:
+            return False
+        return not self._too_slow(route)
+
+    def _too_slow(self, route: ModelRoute) -> bool:
+        if route.max_latency_seconds is None:
+            return False
+        for streamed in (False, True):
+            # Skipped routes get no new samples, so old ones must age out for the route to be tried again
+            window = self.health.latency(route.model, streamed)
+            if len(window.recent(self.latency_max_age_seconds)) < self.min_latency_samples:
+                continue
+            if window.percentile(95, self.latency_max_age_seconds) > route.max_latency_seconds:
+                return True
+        return False
+
+
+def build_model_router() -> ModelRouter:
+    return ModelRouter(
+        [ModelRoute.from_dict(raw) for raw in settings.LLM_ROUTES],
+        settings.LLM_MODEL,
+        model_health,
+        settings.LLM_ROUTE_MIN_LATENCY_SAMPLES,
+        settings.LLM_ROUTE_LATENCY_MAX_AGE_SECONDS,
+    )
+
+
+model_router = build_model_router()
@@ -8,4 +8,5 @@ class State(MessagesState):
     input_tokens: int
     output_tokens: int
     total_tokens: int
+    semantic_cache_hit: bool
     
\ No newline at end of file
@@ -0,0 +1,253 @@
+"""
+Prompt token counting and the per-model context budget.
+
+Counts come from an exact tokenizer (tiktoken) when its encoding can be
+loaded, and otherwise from a fast heuristic (about four characters per token
+for English text, plus the per-message framing the chat format adds) that
+deliberately errs on the high side. Encodings are loaded once, in the
+background, from tiktoken's cache directory; pre-populate TOKENIZER_CACHE_DIR
+on hosts without internet access.
+
+History messages keep their id across turns, so their counts are cached per
+message id and only the new messages of a turn are tokenized.
+"""
+import json
+import logging
+import math
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Protocol, Sequence
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4
+TOKENS_PER_MESSAGE = 4  # Role and separators around each message
+TOKENS_PER_REPLY = 3  # Priming of the assistant reply
+
+# Context windows of common models, matched by prefix (longest first) after the provider prefix
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4.1": 1_047_576,
+    "gpt-4o": 128_000,
+    "gpt-4-turbo": 128_000,
+    "gpt-4": 8_192,
+    "gpt-3.5-turbo": 16_385,
+    "o1": 200_000,
+    "o3": 200_000,
+    "o4-mini": 200_000,
+}
+DEFAULT_CONTEXT_WINDOW = 128_000
+
+
+class Tokenizer(Protocol):
+    """Counts the tokens of a piece of text."""
+
+    name: str
+
+    def count(self, text: str) -> int:
+        ...
+
+
+class HeuristicTokenizer:
+    """Character-based estimate; needs nothing loaded."""
+
+    name = "heuristic"
+
+    def count(self, text: str) -> int:
+        return estimate_text_tokens(text)
+
+
+class TiktokenTokenizer:
+    """Exact counts with a tiktoken encoding."""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        self.name = f"tiktoken:{encoding.name}"
+
+    def count(self, text: str) -> int:
+        # disallowed_special=() counts special-token text as ordinary text instead of raising
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+
+def estimate_text_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def message_text(message: BaseMessage) -> str:
+    return message.content if isinstance(message.content, str) else json.dumps(message.content)
+
+
+def estimate_message_tokens(messages: Sequence[BaseMessage]) -> int:
+    """Heuristic prompt tokens of a message list."""
+    total = TOKENS_PER_REPLY
+    for message in messages:
+        total += TOKENS_PER_MESSAGE + estimate_text_tokens(message_text(message))
+    return total
+
+
+def model_name(model: str) -> str:
+    """Model name without the provider prefix ("openai:gpt-4o-mini" -> "gpt-4o-mini")."""
+    return model.split(":", 1)[1] if ":" in model else model
+
+
+def load_tiktoken(model: str):
+    """
+    The tiktoken encoding for `model`. Blocking: tiktoken reads the encoding
+    from its cache directory (TOKENIZER_CACHE_DIR) and downloads it when it is
+    not there. Raises when tiktoken is missing or the encoding cannot be loaded.
+    """
+    if settings.TOKENIZER_CACHE_DIR:
+        os.environ["TIKTOKEN_CACHE_DIR"] = settings.TOKENIZER_CACHE_DIR
+    import tiktoken
+
+    try:
+        return tiktoken.encoding_for_model(model_name(model))
+    except KeyError:
+        # Unknown (or non-OpenAI) model: the current OpenAI encoding is a close enough proxy
+        return tiktoken.get_encoding("o200k_base")
+
+
+class TokenCounter:
+    """
+    Counts prompt tokens with the exact tokenizer once it is loaded and the
+    heuristic until then (or for good, when loading failed). Per-message
+    counts are cached in an LRU keyed by message id.
+    """
+
+    def __init__(self, model: str, mode: str = "auto", max_entries: int = 10_000):
+        self.model = model
+        self.mode = mode
+        self.max_entries = max_entries
+        self.tokenizer: Tokenizer = HeuristicTokenizer()
+        self._counts: OrderedDict[tuple, int] = OrderedDict()
+        self._lock = threading.Lock()
+        self._loaded = mode == "heuristic"
+
+    @property
+    def exact(self) -> bool:
+        return self.tokenizer.name != "heuristic"
+
+    def load(self) -> None:
+        """Load the exact tokenizer. Blocking and idempotent; failures keep the heuristic."""
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            try:
+                self.tokenizer = TiktokenTokenizer(load_tiktoken(self.model))
+                self._counts.clear()
+                logger.info("Token counts for %s use %s", self.model, self.tokenizer.name)
+            except Exception as e:
+                if self.mode == "tiktoken":
+                    logger.error("Could not load the tiktoken encoding for %s, using the heuristic: %s", self.model, e)
+                else:
+                    logger.info("tiktoken unavailable for %s, using the heuristic token estimate: %s", self.model, e)
+            self._loaded = True
+
+    def count_message(self, message: BaseMessage) -> int:
+        """Tokens of one message, framing included."""
+        text = message_text(message)
+        tokenizer = self.tokenizer
+        # The length guards against a message replaced in place under the same id
+        key = (tokenizer.name, message.id, len(text)) if message.id else (tokenizer.name, None, hash(text))
+        with self._lock:
+            count = self._counts.get(key)
+            if count is not None:
+                self._counts.move_to_end(key)
+                return count
+        count = TOKENS_PER_MESSAGE + tokenizer.count(text)
+        with self._lock:
+            self._counts[key] = count
+            if len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+        return count
+
+    def count_messages(self, messages: Sequence[BaseMessage]) -> int:
+        """Prompt tokens of a message list, reply priming included."""
+        return TOKENS_PER_REPLY + sum(self.count_message(message) for message in messages)
+
+
+class ContextWindowExceeded(Exception):
+    """Raised when the system prompt and the latest message alone do not fit the model."""
+
+    def __init__(self, model: str, required: int, available: int):
+        self.model = model
+        self.required = required
+        self.available = available
+        super().__init__(f"Prompt needs {required} tokens but {model} accepts {available} (reply reserve excluded)")
+
+
+@dataclass
+class FittedPrompt:
+    """Messages to send and what it took to get there."""
+    messages: list[BaseMessage]
+    tokens: int
+    dropped: int = 0
+
+
+class ContextBudget:
+    """
+    Keeps a prompt inside a model's context window: the system prompt and the
+    latest turn always go, older history is dropped oldest first, and
+    `reserve_tokens` are left for the reply.
+    """
+
+    def __init__(self, counter: TokenCounter, context_window: int, reserve_tokens: int):
+        self.counter = counter
+        self.context_window = context_window
+        self.reserve_tokens = reserve_tokens
+
+    @property
+    def available(self) -> int:
+        return self.context_window - self.reserve_tokens
+
+    def fit(self, system: SystemMessage, history: Sequence[BaseMessage]) -> FittedPrompt:
+        counts = [self.counter.count_message(message) for message in history]
+        tokens = TOKENS_PER_REPLY + self.counter.count_message(system) + sum(counts)
+        start = 0
+        while tokens > self.available and start < len(history) - 1:
+            tokens -= counts[start]
+            start += 1
+        # Start the kept history at a user turn so the model never sees an orphaned reply
+        while start < len(history) - 1 and not isinstance(history[start], HumanMessage):
+            tokens -= counts[start]
+            start += 1
+        if tokens > self.available:
+            raise ContextWindowExceeded(self.counter.model, tokens, self.available)
+        if start:
+            logger.info("Dropped %d history messages to fit the %s context window", start, self.counter.model)
+        return FittedPrompt(messages=[system, *history[start:]], tokens=tokens, dropped=start)
+
+
+def context_window(model: str) -> int:
+    """LLM_CONTEXT_WINDOW when set, else the known window of `model`."""
+    if settings.LLM_CONTEXT_WINDOW > 0:
+        return settings.LLM_CONTEXT_WINDOW
+    name = model_name(model)
+    for prefix in sorted(MODEL_CONTEXT_WINDOWS, key=len, reverse=True):
+        if name.startswith(prefix):
+            return MODEL_CONTEXT_WINDOWS[prefix]
+    return DEFAULT_CONTEXT_WINDOW
+
+
+_budgets: dict[str, ContextBudget] = {}
+_budgets_lock = threading.Lock()
+
+
+def get_context_budget(model: str) -> ContextBudget:
+    """The context budget of `model`, shared by every run in this process."""
+    budget = _budgets.get(model)
+    if budget is None:
+        with _budgets_lock:
+            budget = _budgets.get(model)
+            if budget is None:
+                counter = TokenCounter(model, settings.TOKENIZER, settings.TOKEN_COUNT_CACHE_SIZE)
+                budget = ContextBudget(counter, context_window(model), settings.LLM_CONTEXT_RESERVE_TOKENS)
+                _budgets[model] = budget
+    return budget
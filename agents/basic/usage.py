@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import uuid
+from langchain_core.runnables import RunnableConfig
+
+from src.db.database import SessionLocal
+from src.services.usage_log_service import create_usage_log
+from src.schemas.usage_log import UsageLogCreate
+
+# Configure logger for this module
+logger = logging.getLogger(__name__)
+
+
+def get_run_context(config: RunnableConfig) -> tuple:
+    """
+    Extract the per-run context passed by the routers.
+    
+    Returns:
+        tuple: (user_id, main_call_tid, usage_log_buffer)
+    """
+    # In LangGraph, custom context is passed at the top level of config
+    user_id = config.get("user_id") if isinstance(config, dict) else None
+    main_call_tid = config.get("main_call_tid") if isinstance(config, dict) else None
+    
+    # Fallback: try to get from configurable
+    if not user_id and isinstance(config, dict):
+        user_id = config.get("configurable", {}).get("user_id")
+    
+    if not main_call_tid and isinstance(config, dict):
+        main_call_tid = config.get("configurable", {}).get("main_call_tid")
+
+    # Optional buffer used by batch runs to write usage logs in bulk
+    usage_log_buffer = config.get("configurable", {}).get("usage_log_buffer") if isinstance(config, dict) else None
+
+    return user_id, main_call_tid, usage_log_buffer
+
+
+def process_usage_logs(
+    usage_metadata: dict,
+    user_id: int,
+    main_call_tid: str,
+    usage_log_buffer: list | None = None,
+    description: str = "Node chatbot"
+) -> dict:
+    """
+    Record token usage for a node call.
+    
+    When usage_log_buffer is given, entries are appended to it instead of
+    being written, so the caller can persist them in bulk.
+    """
+
+    input_tokens = 0
+    output_tokens = 0
+    total_tokens = 0
+
+    db = None
+    try:
+
+        db = SessionLocal() if usage_log_buffer is None else None
+
+        # usage_metadata structure: {"model-name": {"input_tokens": X, "output_tokens": Y, ...}}
+        usage_metadata = usage_metadata or {}
+        
+        logger.debug("Usage metadata: %s", usage_metadata)
+        
+        # Iterate over each model in usage_metadata and create a log entry for each
+        for model_name, model_tokens in usage_metadata.items():
+            try:
+
+                input_tokens += model_tokens.get("input_tokens", 0)
+                output_tokens += model_tokens.get("output_tokens", 0)
+                total_tokens += model_tokens.get("total_tokens", 0)
+
+                usage_data = UsageLogCreate(
+                    main_call_tid=str(main_call_tid),
+                    node_call_tid=f"node-{str(uuid.uuid4())}",
+                    description=description,
+                    model=model_name,
+                    inputs=model_tokens.get("input_tokens", 0),
+                    outputs=model_tokens.get("output_tokens", 0),
+                    total=model_tokens.get("total_tokens", 0),
+                )
+                
+                if usage_log_buffer is not None:
+                    usage_log_buffer.append(usage_data)
+                    continue
+
+                logger.debug("Creating usage log for model: %s, tokens: %s", model_name, model_tokens)
+                
+                create_usage_log(
+                    db,
+                    user_id=user_id,
+                    usage_data=usage_data,
+                )
+                
+            except Exception as model_error:
+                logger.error(f"Error creating usage log for model {model_name}: {str(model_error)}")
+                if db is not None:
+                    db.rollback()
+
+    except Exception as e:
+        logger.error(f"Error processing usage logs: {str(e)}")
+    finally:
+        # Return the connection to the pool; the session used to leak on every node call
+        if db is not None:
+            db.close()
+
+    return {
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "total_tokens": total_tokens
+    }
+
+async def record_usage(
+    usage_metadata: dict,
+    user_id: int,
+    main_call_tid: str,
+    usage_log_buffer: list | None = None,
+    description: str = "Node chatbot"
+) -> dict:
+    """
+    process_usage_logs from a node. Database writes run in a thread; buffered
+    entries (batch runs) are appended right away on the event loop, so a run
+    cancelled after its LLM call has still recorded them once it stops.
+    """
+    if usage_log_buffer is not None:
+        return process_usage_logs(usage_metadata, user_id, main_call_tid, usage_log_buffer, description)
+    return await asyncio.to_thread(process_usage_logs, usage_metadata, user_id, main_call_tid, None, description)
@@ -17,6 +17,10 @@ from src.models.base import Base
 from src.models.user import User
 from src.models.profile import Profile
 from src.models.usage_log import UsageLog
+from src.models.plan import Plan
+from src.models.llm_cache import LLMCacheEntry
+from src.models.rate_limit import RateLimitBucket
+from src.models.usage_counter import UsageCounter
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
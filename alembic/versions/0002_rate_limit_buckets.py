@@ -0,0 +1,34 @@
+"""rate limit buckets
+
+Shared GCRA state for the per-user chatbot rate limit, so the limit holds
+across workers instead of multiplying with WEB_CONCURRENCY.
+
+Revision ID: 0002_rate_limit_buckets
+Revises: 0001_initial
+Create Date: 2026-10-19 04:02:13.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002_rate_limit_buckets'
+down_revision: Union[str, None] = '0001_initial'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('rate_limit_buckets',
+    sa.Column('key', sa.String(length=255), nullable=False),
+    sa.Column('tat', sa.Float(precision=53), nullable=False, comment='Theoretical arrival time (unix seconds)'),
+    sa.Column('allowed', sa.Boolean(), nullable=False, comment='Outcome of the last check'),
+    sa.PrimaryKeyConstraint('key')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('rate_limit_buckets')
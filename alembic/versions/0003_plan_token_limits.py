@@ -0,0 +1,44 @@
+"""plan token limits
+
+Token budgets per plan (input, output and total tokens per query window,
+NULL = unlimited) and the hourly usage_counters they are enforced from.
+
+Revision ID: 0003_plan_token_limits
+Revises: 0002_rate_limit_buckets
+Create Date: 2026-10-19 04:21:37.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003_plan_token_limits'
+down_revision: Union[str, None] = '0002_rate_limit_buckets'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('plans', sa.Column('input_token_limit', sa.Integer(), nullable=True, comment='Prompt tokens allowed per query window (NULL = unlimited)'))
+    op.add_column('plans', sa.Column('output_token_limit', sa.Integer(), nullable=True, comment='Completion tokens allowed per query window (NULL = unlimited)'))
+    op.add_column('plans', sa.Column('total_token_limit', sa.Integer(), nullable=True, comment='Total tokens allowed per query window (NULL = unlimited)'))
+    op.create_table('usage_counters',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(), nullable=False, comment='Start of the hour (UTC)'),
+    sa.Column('input_tokens', sa.BigInteger(), nullable=False),
+    sa.Column('output_tokens', sa.BigInteger(), nullable=False),
+    sa.Column('total_tokens', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'bucket_start')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('usage_counters')
+    with op.batch_alter_table('plans') as batch_op:
+        batch_op.drop_column('total_token_limit')
+        batch_op.drop_column('output_token_limit')
+        batch_op.drop_column('input_token_limit')
@@ -0,0 +1,95 @@
+"""
+Connection-reuse benchmark for the LLM HTTP client.
+
+Sends the same chat completions to the local fake provider twice: once with a
+fresh httpx client per call (a new connection every time) and once through
+the shared pooled client from src.core.llm_client. Reports latency
+percentiles, wall time and how many connections the server saw.
+
+    python -m benchmarks.bench_llm_client --requests 200 --concurrency 10 --handshake-ms 30
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+from langchain_core.messages import HumanMessage
+from langchain_openai import ChatOpenAI
+
+from benchmarks.fake_llm_server import FakeLLMServer, create_app
+from src.core.llm_client import build_http_client, build_http_timeout
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def run_scenario(base_url: str, requests: int, concurrency: int, shared: bool) -> dict:
+    shared_client = build_http_client() if shared else None
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def one_call() -> None:
+        async with semaphore:
+            client = shared_client or httpx.AsyncClient(timeout=build_http_timeout())
+            llm = ChatOpenAI(model="fake-model", base_url=base_url, api_key="sk-bench", http_async_client=client, max_retries=0)
+            start = time.perf_counter()
+            try:
+                await llm.ainvoke([HumanMessage(content="ping")])
+            finally:
+                latencies.append(time.perf_counter() - start)
+                if shared_client is None:
+                    await client.aclose()
+
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(one_call() for _ in range(requests)))
+    wall = time.perf_counter() - wall_start
+    if shared_client is not None:
+        await shared_client.aclose()
+
+    return {
+        "requests": requests,
+        "wall_seconds": round(wall, 4),
+        "rps": round(requests / wall, 2),
+        "latency_mean_ms": round(statistics.mean(latencies) * 1000, 2),
+        "latency_p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "latency_p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+    }
+
+
+async def connection_count(base_url: str) -> int:
+    async with httpx.AsyncClient() as client:
+        response = await client.get(base_url.removesuffix("/v1") + "/stats")
+        return response.json()["connections"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark LLM HTTP connection reuse")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Fake provider response latency")
+    parser.add_argument("--handshake-ms", type=float, default=30.0, help="Extra cost of opening a connection")
+    args = parser.parse_args()
+
+    results = {}
+    for name, shared in (("new_connection_per_call", False), ("shared_pooled_client", True)):
+        # A fresh server per scenario keeps the connection counts separate
+        with FakeLLMServer(create_app(latency_ms=args.latency_ms, handshake_ms=args.handshake_ms)) as server:
+            result = asyncio.run(run_scenario(server.base_url, args.requests, args.concurrency, shared))
+            result["connections_opened"] = asyncio.run(connection_count(server.base_url))
+            results[name] = result
+
+    baseline, pooled = results["new_connection_per_call"], results["shared_pooled_client"]
+    results["savings"] = {
+        "latency_mean_ms": round(baseline["latency_mean_ms"] - pooled["latency_mean_ms"], 2),
+        "wall_seconds": round(baseline["wall_seconds"] - pooled["wall_seconds"], 4),
+        "connections": baseline["connections_opened"] - pooled["connections_opened"],
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
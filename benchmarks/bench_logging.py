@@ -0,0 +1,136 @@
+"""
+Per-request logging cost benchmark.
+
+Replays the log calls a chatbot request makes (authentication, rate-limit
+check, chatbot node, usage logs) under several logging configurations and
+reports the time spent in the request thread per request. The previous
+setup (root at DEBUG, synchronous file handler, eager f-strings) is the
+baseline; the queued configurations also report how long the listener
+thread needed to drain what was left when the loop finished.
+
+    python -m benchmarks.bench_logging --requests 20000
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from src.core import logging as app_logging
+from src.core.config import settings
+
+logger = logging.getLogger("src.bench.request")
+
+USAGE = {"gpt-4o-mini": {"input_tokens": 412, "output_tokens": 96, "total_tokens": 508}}
+
+
+def request_eager(user_id: int, email: str) -> None:
+    """Log calls of one request, formatted eagerly as f-strings."""
+    logger.info(f"Authentication attempt for email: {email}")
+    logger.debug(f"User found: {email}, verifying password...")
+    logger.debug(f"Password verified successfully (took {0.0812:.2f}s)")
+    logger.debug(f"Updating last login for user: {email}")
+    logger.info(f"Authentication successful for {email} (total time: {0.0951:.2f}s)")
+    logger.info(f"Chatbot rate limit check for user {user_id} (plan: Free): used=1/5, remaining=4, window=24h, can_query=True")
+    logger.debug(f"Extracted user_id from config: {user_id}")
+    logger.debug(f"Processing chatbot node with {3} messages in state")
+    logger.debug(f"Total messages to send to LLM: {4}")
+    logger.info("Invoking LLM for response generation")
+    logger.debug(f"Usage metadata: {USAGE}")
+    logger.info("Chatbot node completed successfully")
+
+
+def request_lazy(user_id: int, email: str) -> None:
+    """The same log calls with %-style arguments, formatted only if emitted."""
+    logger.info("Authentication attempt for email: %s", email)
+    logger.debug("User found: %s, verifying password...", email)
+    logger.debug("Password verified successfully (took %.2fs)", 0.0812)
+    logger.debug("Updating last login for user: %s", email)
+    logger.info("Authentication successful for %s (total time: %.2fs)", email, 0.0951)
+    logger.info(
+        "Chatbot rate limit check for user %s (plan: %s): used=%d/%d, remaining=%d, window=%sh, can_query=%s",
+        user_id, "Free", 1, 5, 4, 24, True
+    )
+    logger.debug("Extracted user_id from config: %s", user_id)
+    logger.debug("Processing chatbot node with %d messages in state", 3)
+    logger.debug("Total messages to send to LLM: %d", 4)
+    logger.info("Invoking LLM for response generation")
+    logger.debug("Usage metadata: %s", USAGE)
+    logger.info("Chatbot node completed successfully")
+
+
+SCENARIOS = {
+    # name: (request function, settings overrides)
+    "baseline_sync_debug_eager": (request_eager, {"LOG_ASYNC": False, "LOG_LEVEL": "DEBUG"}),
+    "sync_info_lazy": (request_lazy, {"LOG_ASYNC": False, "LOG_LEVEL": "INFO"}),
+    "queued_info_lazy": (request_lazy, {"LOG_ASYNC": True, "LOG_LEVEL": "INFO"}),
+    "queued_info_lazy_json": (request_lazy, {"LOG_ASYNC": True, "LOG_LEVEL": "INFO", "LOG_FORMAT": "json"}),
+    "queued_debug_sampled_10pct": (
+        request_lazy, {"LOG_ASYNC": True, "LOG_LEVEL": "DEBUG", "LOG_SAMPLING": {"src.bench": 0.1}}
+    ),
+}
+
+
+@contextlib.contextmanager
+def configured(log_file: Path, overrides: dict):
+    """Apply settings overrides and install the logging pipeline, console to /dev/null."""
+    values = {"LOG_FILE": str(log_file), "LOG_FORMAT": "text", "LOG_SAMPLING": {}, **overrides}
+    previous = {key: getattr(settings, key) for key in values}
+    with open(os.devnull, "w") as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            for key, value in values.items():
+                setattr(settings, key, value)
+            app_logging.setup_logging()
+            yield
+        finally:
+            sys.stdout = stdout
+            for key, value in previous.items():
+                setattr(settings, key, value)
+
+
+def run_scenario(name: str, requests: int, workdir: Path) -> dict:
+    request, overrides = SCENARIOS[name]
+    log_file = workdir / f"{name}.log"
+    with configured(log_file, overrides):
+        start = time.perf_counter()
+        for index in range(requests):
+            request(index, f"user{index}@example.com")
+        elapsed = time.perf_counter() - start
+
+        drain_start = time.perf_counter()
+        app_logging.shutdown_logging()
+        drain = time.perf_counter() - drain_start
+
+    return {
+        "requests": requests,
+        "us_per_request": round(elapsed / requests * 1e6, 2),
+        "drain_seconds": round(drain, 4),
+        "log_bytes": log_file.stat().st_size if log_file.exists() else 0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark per-request logging cost")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), action="append", help="Run only these scenarios")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in args.scenario or SCENARIOS:
+            results[name] = run_scenario(name, args.requests, Path(workdir))
+
+    baseline = results.get("baseline_sync_debug_eager")
+    if baseline:
+        for name, result in results.items():
+            result["speedup_vs_baseline"] = round(baseline["us_per_request"] / result["us_per_request"], 2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
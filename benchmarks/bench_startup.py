@@ -0,0 +1,150 @@
+"""
+Import-time and cold-start benchmark.
+
+Measures, in fresh interpreter processes:
+
+- import: seconds to `import src.main` (what every worker, --reload cycle
+  and test session pays before doing anything)
+- cold start: seconds from spawning uvicorn to the first successful
+  response, and to the first chatbot reply (agent stack loaded, graph
+  compiled, answered by the local fake LLM provider)
+
+Runs on SQLite with the in-memory checkpointer, so no database server or
+API key is needed.
+
+    python -m benchmarks.bench_startup --runs 5
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.fake_llm_server import FakeLLMServer, create_app
+
+ROOT = Path(__file__).resolve().parent.parent
+
+IMPORT_SNIPPET = (
+    "import time; start = time.perf_counter(); import src.main; "
+    "print(time.perf_counter() - start)"
+)
+
+SEED_SNIPPET = """
+from src.db.database import SessionLocal, engine
+from src.db.schema import create_tables
+from src.models.plan import Plan
+from src.schemas.user import UserCreate
+from src.services.user_service import create_user
+
+create_tables(engine)
+db = SessionLocal()
+db.add(Plan(name="Free", query_limit=10**6, query_window_hours=24))
+db.commit()
+create_user(db, UserCreate(username="startup", email="startup@example.com", password="startup-password"))
+db.close()
+"""
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def build_env(database_url: str, fake_llm_url: str, preload: bool) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": database_url,
+        "SECRET_KEY": env.get("SECRET_KEY", "benchmark-secret"),
+        "CHECKPOINT_BACKEND": "memory",
+        "LLM_FAKE_SERVER": "true",
+        "LLM_FAKE_SERVER_URL": fake_llm_url,
+        "LANGSMITH_TRACING": "false",
+        "SCHEMA_CHECK": "off",
+        "AGENT_PRELOAD": "true" if preload else "false",
+        "BCRYPT_ROUNDS": "4",
+        "PYTHONPATH": str(ROOT),
+    })
+    return env
+
+
+def measure_import(env: dict) -> float:
+    result = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", IMPORT_SNIPPET],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def measure_cold_start(env: dict, timeout: float = 60.0) -> dict:
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-W", "ignore", "-m", "uvicorn", "src.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(base_url=base_url, timeout=30.0) as client:
+            while True:
+                if time.perf_counter() - start > timeout:
+                    raise TimeoutError("Server did not start")
+                try:
+                    if client.get("/").status_code == 200:
+                        break
+                except httpx.TransportError:
+                    time.sleep(0.01)
+            first_response = time.perf_counter() - start
+
+            token = client.post(
+                "/auth/token", data={"username": "startup@example.com", "password": "startup-password"}
+            ).json()["access_token"]
+            response = client.post(
+                "/chatbot/", json={"message": "Hello"}, headers={"Authorization": f"Bearer {token}"}
+            )
+            response.raise_for_status()
+            first_chat = time.perf_counter() - start
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+    return {"first_response_seconds": first_response, "first_chat_seconds": first_chat}
+
+
+def summarize(values: list[float]) -> dict:
+    return {
+        "median": round(statistics.median(values), 3),
+        "min": round(min(values), 3),
+        "max": round(max(values), 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark import time and cold start")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir, FakeLLMServer(create_app(latency_ms=5)) as fake_llm:
+        database_url = f"sqlite:///{Path(workdir) / 'startup.db'}"
+        env = build_env(database_url, fake_llm.base_url, preload=True)
+        subprocess.run([sys.executable, "-W", "ignore", "-c", SEED_SNIPPET], cwd=ROOT, env=env, check=True)
+
+        results["import_src_main"] = summarize([measure_import(env) for _ in range(args.runs)])
+        for name, preload in (("cold_start_preload", True), ("cold_start_lazy", False)):
+            runs = [measure_cold_start(build_env(database_url, fake_llm.base_url, preload)) for _ in range(args.runs)]
+            results[name] = {
+                key: summarize([run[key] for run in runs]) for key in ("first_response_seconds", "first_chat_seconds")
+            }
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
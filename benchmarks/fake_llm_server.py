@@ -0,0 +1,266 @@
+"""
+Local fake OpenAI-compatible server for load tests and benchmarks.
+
+Speaks enough of the OpenAI API for ChatOpenAI: GET /v1/models and
+POST /v1/chat/completions, both plain and streamed (SSE, including the final
+usage chunk when stream_options.include_usage is set). Latency, time to first
+token, inter-token delay, completion length and error rate are configurable.
+The first request on every new TCP connection can be delayed by an extra
+handshake cost, standing in for the DNS/TCP/TLS round trips of a real
+provider connection.
+
+Run in-process with FakeLLMServer, or as a subprocess:
+    python -m benchmarks.fake_llm_server --port 9100 --ttft-ms 200 --inter-token-ms 15 --completion-tokens 60
+
+Then start the API with LLM_FAKE_SERVER=true (and LLM_FAKE_SERVER_URL if the
+port differs) so the chatbot node talks to it instead of OpenAI.
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+WORDS = (
+    "the quick brown fox jumps over a lazy dog while agents plan tools and "
+    "answer questions about databases caches queues and latency budgets"
+).split()
+
+ERROR_BODIES = {
+    429: ("rate_limit_exceeded", "Rate limit reached for requests (fake server)"),
+    500: ("server_error", "The server had an error while processing your request (fake server)"),
+    503: ("server_overloaded", "The server is overloaded (fake server)"),
+}
+
+
+@dataclass
+class FakeLLMConfig:
+    """Behaviour of the fake provider; times are in milliseconds."""
+    latency_ms: float = 0.0  # Total delay of a non-streamed completion
+    ttft_ms: float = 0.0  # Delay before the first streamed token
+    inter_token_ms: float = 0.0  # Delay between streamed tokens
+    handshake_ms: float = 0.0  # Extra delay for the first request on a new connection
+    completion_tokens: Optional[int] = None  # Words generated; None returns `content` as is
+    content: str = "Hello from the fake LLM."
+    error_rate: float = 0.0  # Fraction of completions that fail
+    error_status: int = 429  # 429, 500 or 503
+    usage: bool = True  # Report token usage
+    seed: Optional[int] = None
+
+
+def _completion_text(config: FakeLLMConfig) -> list[str]:
+    """The completion split into streamed pieces (one word per token)."""
+    if config.completion_tokens is None:
+        words = config.content.split(" ")
+    else:
+        words = [WORDS[i % len(WORDS)] for i in range(config.completion_tokens)]
+    return [word if i == 0 else f" {word}" for i, word in enumerate(words)]
+
+
+def _prompt_tokens(body: dict) -> int:
+    return sum(len(str(message.get("content", "")).split()) for message in body.get("messages", []))
+
+
+def _usage(prompt_tokens: int, completion_tokens: int) -> dict:
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def create_app(config: Optional[FakeLLMConfig] = None, **overrides) -> FastAPI:
+    """
+    Build the fake provider app.
+
+    Args:
+        config: Provider behaviour (defaults to an instant, error-free server)
+        **overrides: Field overrides applied to config
+
+    Returns:
+        FastAPI app; counters are exposed at GET /stats
+    """
+    config = config or FakeLLMConfig()
+    for name, value in overrides.items():
+        setattr(config, name, value)
+
+    app = FastAPI(title="Fake LLM")
+    app.state.config = config
+    app.state.connections = set()
+    app.state.counters = {"requests": 0, "completions": 0, "streams": 0, "errors": 0}
+    rng = random.Random(config.seed)
+
+    async def simulate_connection_setup(request: Request) -> None:
+        app.state.counters["requests"] += 1
+        peer = request.scope.get("client")
+        if peer not in app.state.connections:
+            app.state.connections.add(peer)
+            if config.handshake_ms:
+                await asyncio.sleep(config.handshake_ms / 1000)
+
+    def chunk(completion_id: str, model: str, delta: dict, finish_reason=None) -> str:
+        payload = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        return f"data: {json.dumps(payload)}\n\n"
+
+    async def stream_completion(completion_id: str, model: str, pieces: list[str], prompt_tokens: int, include_usage: bool):
+        await asyncio.sleep(config.ttft_ms / 1000)
+        yield chunk(completion_id, model, {"role": "assistant", "content": ""})
+        for i, piece in enumerate(pieces):
+            if i and config.inter_token_ms:
+                await asyncio.sleep(config.inter_token_ms / 1000)
+            yield chunk(completion_id, model, {"content": piece})
+        yield chunk(completion_id, model, {}, finish_reason="stop")
+        if include_usage:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [],
+                "usage": _usage(prompt_tokens, len(pieces)),
+            }
+            yield f"data: {json.dumps(payload)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    @app.get("/v1/models")
+    async def list_models(request: Request):
+        await simulate_connection_setup(request)
+        return {"object": "list", "data": [{"id": "fake-model", "object": "model", "owned_by": "benchmarks"}]}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        await simulate_connection_setup(request)
+        body = await request.json()
+        model = body.get("model", "fake-model")
+
+        if config.error_rate and rng.random() < config.error_rate:
+            app.state.counters["errors"] += 1
+            code, message = ERROR_BODIES.get(config.error_status, ERROR_BODIES[500])
+            return JSONResponse(
+                status_code=config.error_status,
+                content={"error": {"message": message, "type": code, "code": code}},
+            )
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        pieces = _completion_text(config)
+        prompt_tokens = _prompt_tokens(body)
+
+        if body.get("stream"):
+            app.state.counters["streams"] += 1
+            include_usage = config.usage and bool((body.get("stream_options") or {}).get("include_usage"))
+            return StreamingResponse(
+                stream_completion(completion_id, model, pieces, prompt_tokens, include_usage),
+                media_type="text/event-stream",
+            )
+
+        app.state.counters["completions"] += 1
+        if config.latency_ms:
+            await asyncio.sleep(config.latency_ms / 1000)
+        response = {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(pieces)},
+                "finish_reason": "stop",
+            }],
+        }
+        if config.usage:
+            response["usage"] = _usage(prompt_tokens, len(pieces))
+        return response
+
+    @app.get("/stats")
+    async def stats():
+        return {"connections": len(app.state.connections), **app.state.counters}
+
+    return app
+
+
+class BackgroundServer:
+    """Runs an ASGI app with uvicorn in a background thread."""
+
+    def __init__(self, app, host: str = "127.0.0.1", port: int = 0, **uvicorn_options):
+        self.app = app
+        uvicorn_options.setdefault("log_level", "warning")
+        self._server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, **uvicorn_options))
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.servers[0].sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "BackgroundServer":
+        self._thread.start()
+        while not self._server.started:
+            if not self._thread.is_alive():
+                raise RuntimeError("Server failed to start")
+            time.sleep(0.01)
+        return self
+
+    def stop(self) -> None:
+        self._server.should_exit = True
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+class FakeLLMServer(BackgroundServer):
+    """The fake provider running in a background thread."""
+
+    @property
+    def base_url(self) -> str:
+        return f"{self.url}/v1"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Delay of non-streamed completions")
+    parser.add_argument("--ttft-ms", type=float, default=200.0, help="Time to first streamed token")
+    parser.add_argument("--inter-token-ms", type=float, default=15.0, help="Delay between streamed tokens")
+    parser.add_argument("--handshake-ms", type=float, default=0.0, help="Extra delay on new connections")
+    parser.add_argument("--completion-tokens", type=int, default=60)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=429, choices=sorted(ERROR_BODIES))
+    parser.add_argument("--no-usage", action="store_true", help="Omit token usage from responses")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = FakeLLMConfig(
+        latency_ms=args.latency_ms,
+        ttft_ms=args.ttft_ms,
+        inter_token_ms=args.inter_token_ms,
+        handshake_ms=args.handshake_ms,
+        completion_tokens=args.completion_tokens,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        usage=not args.no_usage,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="info")
+
+
+if __name__ == "__main__":
+    main()
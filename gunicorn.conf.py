@@ -0,0 +1,56 @@
+"""
+Gunicorn configuration for production.
+
+    gunicorn -c gunicorn.conf.py src.main:app
+
+Every value comes from Settings (environment / .env), see the "Production
+server" section of src/core/config.py.
+"""
+from src.core.config import settings
+from src.core.server import db_pool_sizes, request_graceful_timeout, resolve_workers, use_worker_count
+
+bind = f"{settings.SERVER_HOST}:{settings.SERVER_PORT}"
+workers = resolve_workers()
+worker_class = "src.core.uvicorn_worker.TunedUvicornWorker"
+backlog = settings.SERVER_BACKLOG
+keepalive = settings.SERVER_KEEPALIVE_SECONDS
+timeout = settings.SERVER_TIMEOUT_SECONDS
+# Whole shutdown budget: workers give open requests what the lifespan drain leaves over
+graceful_timeout = settings.SERVER_GRACEFUL_TIMEOUT_SECONDS
+max_requests = settings.SERVER_MAX_REQUESTS
+max_requests_jitter = settings.SERVER_MAX_REQUESTS_JITTER
+forwarded_allow_ips = settings.SERVER_FORWARDED_ALLOW_IPS
+
+# Preloading imports the app once in the master and forks it, so workers
+# start faster and share the imported modules' memory. It is safe because
+# import opens no sockets: the engine connects lazily and the checkpointer
+# pool, LLM client and agent graph are created in each worker's lifespan.
+# The log listener thread does not survive fork and is restarted below.
+preload_app = settings.SERVER_PRELOAD
+
+# Pool sizes are derived from the worker count; publish it before the app is imported
+use_worker_count(workers)
+db_pool_sizes()  # fail before forking if DB_MAX_CONNECTIONS is too small
+request_graceful_timeout()  # and if SHUTDOWN_DRAIN_SECONDS leaves no time for requests
+
+
+def when_ready(server):
+    if preload_app:
+        # Share the heavy agent modules with every worker; the model and graph are still built per worker
+        import agents.basic.agent  # noqa: F401
+    sizes = db_pool_sizes()
+    server.log.info(
+        "%d workers; per worker: %d+%d SQLAlchemy connections, %d checkpointer connections",
+        workers, sizes.pool_size, sizes.max_overflow, sizes.checkpoint_max_size,
+    )
+
+
+def post_fork(server, worker):
+    if not preload_app:
+        return
+    from src.core.logging import setup_logging
+    from src.db.database import engine
+
+    # Connections inherited from the master must not be shared with it
+    engine.dispose(close=False)
+    setup_logging()
@@ -0,0 +1,185 @@
+"""
+Adaptive concurrency limiter for LLM calls.
+
+Uses AIMD (additive increase, multiplicative decrease): the allowed number of
+in-flight calls grows by roughly one per round trip while latency stays close
+to the observed no-load baseline, and is cut by LLM_LIMITER_BACKOFF when
+latency degrades past LLM_LIMITER_LATENCY_TOLERANCE x baseline or the
+provider reports overload (429, 5xx, timeouts).
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Callable, Optional
+
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# HTTP statuses that signal provider overload rather than a bad request
+OVERLOAD_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# How quickly the baseline drifts up towards slower samples (per sample)
+BASELINE_DRIFT = 0.01
+
+
+def is_overload_error(exc: BaseException) -> bool:
+    """Return True if the exception indicates the provider is overloaded."""
+    if isinstance(exc, (TimeoutError, asyncio.TimeoutError)):
+        return True
+    status_code = getattr(exc, "status_code", None)
+    if status_code in OVERLOAD_STATUS_CODES:
+        return True
+    name = type(exc).__name__
+    return "RateLimit" in name or "Timeout" in name
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limiter driven by observed latency and errors."""
+
+    def __init__(
+        self,
+        initial_limit: int,
+        min_limit: int,
+        max_limit: int,
+        latency_tolerance: float = 2.0,
+        backoff_ratio: float = 0.7,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance
+        self.backoff_ratio = backoff_ratio
+        self._clock = clock
+
+        self._limit = float(max(min_limit, min(initial_limit, max_limit)))
+        self._in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+        self._baseline: Optional[float] = None
+        self._last_latency: Optional[float] = None
+        self._last_decrease = float("-inf")
+
+        self._increases = 0
+        self._decreases = 0
+        self._overload_errors = 0
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    async def acquire(self) -> None:
+        """Wait until a call may start."""
+        if self._in_flight < self.limit and not self._waiters:
+            self._in_flight += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # A slot was handed over while we were being cancelled
+                self._in_flight -= 1
+                self._wake_waiters()
+            raise
+
+    def release(self, latency: Optional[float], overloaded: bool = False) -> None:
+        """Finish a call and update the limit from its outcome; a None latency (cancelled call) frees the slot only."""
+        saturated = self._in_flight >= self.limit
+        self._in_flight -= 1
+        if latency is not None:
+            self._last_latency = latency
+
+        if overloaded:
+            self._overload_errors += 1
+            self._decrease("provider overload")
+        elif latency is not None:
+            self._update_baseline(latency)
+            if latency > self._baseline * self.latency_tolerance:
+                self._decrease(f"latency {latency:.3f}s over baseline {self._baseline:.3f}s")
+            elif saturated and self._limit < self.max_limit:
+                # Additive increase: about +1 per limit's worth of completions
+                self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+                self._increases += 1
+
+        self._wake_waiters()
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Hold a slot for one LLM call, measuring its latency and outcome.
+
+        A call cancelled by its caller (client gone, lost hedge, shutdown) says
+        nothing about the provider, so its partial latency is not sampled.
+        """
+        await self.acquire()
+        start = self._clock()
+        overloaded = False
+        cancelled = False
+        try:
+            yield
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        except BaseException as exc:
+            overloaded = is_overload_error(exc)
+            raise
+        finally:
+            self.release(None if cancelled else self._clock() - start, overloaded)
+
+    def stats(self) -> dict:
+        """Snapshot of the current limit and latency state."""
+        return {
+            "limit": self.limit,
+            "in_flight": self._in_flight,
+            "waiting": sum(1 for future in self._waiters if not future.done()),
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "baseline_latency_seconds": self._baseline,
+            "last_latency_seconds": self._last_latency,
+            "increases_total": self._increases,
+            "decreases_total": self._decreases,
+            "overload_errors_total": self._overload_errors,
+        }
+
+    def _update_baseline(self, latency: float) -> None:
+        if self._baseline is None or latency < self._baseline:
+            self._baseline = latency
+        else:
+            self._baseline += (latency - self._baseline) * BASELINE_DRIFT
+
+    def _decrease(self, reason: str) -> None:
+        # Back off at most once per baseline round trip so one congested
+        # period does not collapse the limit several times over
+        now = self._clock()
+        if now - self._last_decrease < (self._baseline or 0.0):
+            return
+        self._last_decrease = now
+        previous = self.limit
+        self._limit = max(float(self.min_limit), self._limit * self.backoff_ratio)
+        self._decreases += 1
+        logger.info("LLM concurrency limit %d -> %d (%s)", previous, self.limit, reason)
+
+    def _wake_waiters(self) -> None:
+        while self._waiters and self._in_flight < self.limit:
+            future = self._waiters.popleft()
+            if not future.done():
+                self._in_flight += 1
+                future.set_result(None)
+
+
+llm_limiter = AdaptiveLimiter(
+    initial_limit=settings.LLM_LIMITER_INITIAL,
+    min_limit=settings.LLM_LIMITER_MIN,
+    max_limit=settings.LLM_LIMITER_MAX,
+    latency_tolerance=settings.LLM_LIMITER_LATENCY_TOLERANCE,
+    backoff_ratio=settings.LLM_LIMITER_BACKOFF,
+)
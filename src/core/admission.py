@@ -0,0 +1,199 @@
+"""
+Admission control for agent graph runs.
+
+Caps how many graph runs (and therefore LLM calls) execute at once in this
+worker. Requests beyond the cap wait in a priority queue ordered by the
+user's plan, and are shed with 503 when the queue is full or the wait
+exceeds ADMISSION_MAX_WAIT_SECONDS.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from fastapi import Request, status
+from fastapi.responses import JSONResponse
+
+from src.core.config import settings
+from src.core.metrics import rate_limit_rejections
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a run cannot be admitted within the configured limits."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionSlot:
+    """Handle for an admitted run. Releasing it more than once is a no-op."""
+
+    def __init__(self, controller: "AdmissionController"):
+        self._controller = controller
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._controller._release()
+
+
+class AdmissionController:
+    """
+    Global concurrency cap with a plan-aware priority queue.
+
+    Lower priority values are admitted first; waiters with the same priority
+    are admitted in arrival order.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue_size: int, max_wait_seconds: float):
+        self.max_concurrency = max_concurrency
+        self.max_queue_size = max_queue_size
+        self.max_wait_seconds = max_wait_seconds
+
+        self._in_flight = 0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+
+        # Metrics
+        self._admitted = 0
+        self._rejected = {"queue_full": 0, "timeout": 0}
+        self._wait_total = 0.0
+        self._recent_waits: deque[float] = deque(maxlen=1000)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queue_length(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    async def acquire(self, priority: int) -> AdmissionSlot:
+        """
+        Wait for a slot.
+
+        Raises:
+            AdmissionRejected: If the queue is full or the wait times out
+        """
+        start = time.perf_counter()
+
+        if self._in_flight < self.max_concurrency and not self._waiters:
+            self._in_flight += 1
+            self._record_admission(start)
+            return AdmissionSlot(self)
+
+        if self.queue_length >= self.max_queue_size:
+            self._rejected["queue_full"] += 1
+            logger.warning("Admission rejected: queue full (%d waiting)", self.queue_length)
+            raise AdmissionRejected("Server is at capacity, please retry shortly", self._retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.max_wait_seconds)
+        except asyncio.TimeoutError:
+            if not self._abandon(future):
+                # The slot was handed over just as the wait expired
+                self._record_admission(start)
+                return AdmissionSlot(self)
+            self._rejected["timeout"] += 1
+            logger.warning("Admission rejected: waited %.2fs (priority %d)", time.perf_counter() - start, priority)
+            raise AdmissionRejected("Server is at capacity, please retry shortly", self._retry_after())
+        except asyncio.CancelledError:
+            if not self._abandon(future):
+                self._release()
+            raise
+
+        self._record_admission(start)
+        return AdmissionSlot(self)
+
+    @asynccontextmanager
+    async def slot(self, priority: int):
+        """Hold a slot for the duration of the block."""
+        admission_slot = await self.acquire(priority)
+        try:
+            yield admission_slot
+        finally:
+            admission_slot.release()
+
+    def stats(self) -> dict:
+        """Snapshot of queue length, concurrency and wait-time metrics."""
+        waits = sorted(self._recent_waits)
+        return {
+            "in_flight": self._in_flight,
+            "max_concurrency": self.max_concurrency,
+            "queue_length": self.queue_length,
+            "max_queue_size": self.max_queue_size,
+            "admitted_total": self._admitted,
+            "rejected_total": dict(self._rejected),
+            "wait_seconds_total": round(self._wait_total, 6),
+            "wait_seconds_p50": _percentile(waits, 50),
+            "wait_seconds_p95": _percentile(waits, 95),
+            "wait_seconds_max": waits[-1] if waits else 0.0,
+        }
+
+    def _release(self) -> None:
+        # Hand the slot directly to the next live waiter, if any
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._in_flight -= 1
+
+    def _abandon(self, future: asyncio.Future) -> bool:
+        """Give up a queued wait. Returns False if a slot was already handed over."""
+        if future.done():
+            return False
+        future.cancel()
+        return True
+
+    def _record_admission(self, start: float) -> None:
+        waited = time.perf_counter() - start
+        self._admitted += 1
+        self._wait_total += waited
+        self._recent_waits.append(waited)
+
+    def _retry_after(self) -> int:
+        return max(1, math.ceil(self.max_wait_seconds))
+
+
+def _percentile(sorted_values: list[float], percentile: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * percentile / 100))
+    return round(sorted_values[index], 6)
+
+
+def plan_priority(plan) -> int:
+    """Map a user's plan to an admission priority (lower is served first)."""
+    if plan is None:
+        return settings.ADMISSION_DEFAULT_PRIORITY
+    return settings.ADMISSION_PLAN_PRIORITIES.get(plan.name, settings.ADMISSION_DEFAULT_PRIORITY)
+
+
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected) -> JSONResponse:
+    """Exception handler that sheds rejected runs with 503 and Retry-After."""
+    rate_limit_rejections.labels("admission").inc()
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": exc.reason},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+admission_controller = AdmissionController(
+    max_concurrency=settings.ADMISSION_MAX_CONCURRENCY,
+    max_queue_size=settings.ADMISSION_MAX_QUEUE_SIZE,
+    max_wait_seconds=settings.ADMISSION_MAX_WAIT_SECONDS,
+)
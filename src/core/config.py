@@ -9,14 +9,177 @@ class Settings(BaseSettings):
     
     BCRYPT_ROUNDS: int = 10
 
+    # Schema is managed by Alembic; startup only compares the stamped revision with the head
+    SCHEMA_CHECK: str = "warn"  # "error" (refuse to start), "warn" or "off"
+    DB_CREATE_TABLES: bool = False  # create_all at startup, for throwaway local databases only
+
+    # Production server (gunicorn.conf.py; `python -m src.core.server` where gunicorn is unavailable)
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    WEB_CONCURRENCY: int = 0  # Worker processes; 0 = one per CPU. Async workers do not need 2n+1
+    SERVER_PRELOAD: bool = True  # Import the app (and agent modules) once in the master, then fork
+    SERVER_LOOP: str = "auto"  # "auto" (uvloop when installed), "uvloop" or "asyncio"
+    SERVER_HTTP: str = "auto"  # "auto" (httptools when installed), "httptools" or "h11"
+    SERVER_KEEPALIVE_SECONDS: int = 5  # Keep above the load balancer's idle timeout to avoid 502s on reuse
+    SERVER_BACKLOG: int = 2048  # Pending connections queued by the kernel
+    SERVER_TIMEOUT_SECONDS: int = 120  # Restart a worker that stops heartbeating for this long
+    SERVER_GRACEFUL_TIMEOUT_SECONDS: int = 30  # Whole shutdown: in-flight requests (and streams), then the lifespan drain
+    SHUTDOWN_DRAIN_SECONDS: float = 20.0  # Part of the above kept for the lifespan wait for graph runs and buffered writes
+    SERVER_MAX_REQUESTS: int = 0  # Recycle a worker after this many requests (0 = never)
+    SERVER_MAX_REQUESTS_JITTER: int = 0  # Random extra requests so workers do not recycle together
+    SERVER_FORWARDED_ALLOW_IPS: str = "127.0.0.1"  # Proxies trusted for X-Forwarded-* headers
+
+    # SQLAlchemy pool per worker. With DB_MAX_CONNECTIONS > 0 the pools of every worker (and the
+    # checkpointer pools) are derived from that total instead, see src/core/server.py:db_pool_sizes
+    DB_MAX_CONNECTIONS: int = 0
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
+
+    # LangGraph checkpointer: "postgres" (DATABASE_URL) or "memory" (per process, not persisted)
+    CHECKPOINT_BACKEND: str = "postgres"
+    CHECKPOINT_POOL_MIN_SIZE: int = 1  # psycopg connection pool used by the Postgres checkpointer
+    CHECKPOINT_POOL_MAX_SIZE: int = 10
+
+    # Logging (records are queued and written by a background listener thread)
+    LOG_LEVEL: str = "INFO"  # Root level; DEBUG enables the high-volume per-request lines
+    LOG_FORMAT: str = "text"  # "text" or "json" (one object per line, for log shippers)
+    LOG_FILE: str = "logs/app.log"
+    LOG_ROTATION: str = "size"  # "size" (LOG_MAX_BYTES) or "time" (LOG_ROTATE_WHEN)
+    LOG_MAX_BYTES: int = 10 * 1024 * 1024
+    LOG_ROTATE_WHEN: str = "midnight"
+    LOG_BACKUP_COUNT: int = 5
+    LOG_ASYNC: bool = True  # False writes from the calling thread (simpler when debugging)
+    LOG_SAMPLING: dict[str, float] = {}  # Logger name prefix -> fraction of DEBUG records kept
+
+    # Database query statistics
+    SLOW_QUERY_THRESHOLD_MS: float = 200.0  # Log statements slower than this (parameters redacted)
+    SERVER_TIMING_ENABLED: bool = True  # Add Server-Timing (db time, query count, app time) to responses
+
+    # In-process request tracing (spans for requests, dependencies, graph nodes, checkpoints, SQL)
+    TRACING_ENABLED: bool = False
+    TRACING_EXPORTER: str = "file"  # "file" (JSON lines at TRACING_FILE) or "memory"
+    TRACING_FILE: str = "logs/traces.jsonl"
+
     LANGSMITH_TRACING: bool = True
     LANGSMITH_API_KEY: str = ""
+
+    # Chatbot LLM
+    AGENT_PRELOAD: bool = True  # Import the agent stack and compile the graph in the background at startup
+    LLM_MODEL: str = "openai:gpt-4o-mini"
+    LLM_TEMPERATURE: float = 1.0
+    LLM_BASE_URL: str = ""  # OpenAI-compatible endpoint; empty uses the provider default
+    # Offline load testing: send LLM calls to benchmarks/fake_llm_server.py instead of the provider
+    LLM_FAKE_SERVER: bool = False
+    LLM_FAKE_SERVER_URL: str = "http://127.0.0.1:9100/v1"
+
+    # Prompt token counting and context window (agents/basic/tokens.py)
+    TOKENIZER: str = "auto"  # "auto" (tiktoken when its encoding loads, else heuristic), "tiktoken" or "heuristic"
+    TOKENIZER_CACHE_DIR: str = ""  # tiktoken encoding cache; pre-populate it on hosts without internet access
+    TOKEN_COUNT_CACHE_SIZE: int = 10000  # Per-message token counts kept (LRU, keyed by message id)
+    LLM_CONTEXT_WINDOW: int = 0  # Model context window in tokens; 0 uses the known window of LLM_MODEL
+    LLM_CONTEXT_RESERVE_TOKENS: int = 4096  # Left free for the reply; older history is dropped to keep it
+
+    # Shared HTTP client for LLM calls (one connection pool per worker)
+    LLM_HTTP_MAX_CONNECTIONS: int = 100
+    LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20  # Idle connections kept open for reuse
+    LLM_HTTP_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    LLM_HTTP_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    LLM_HTTP_READ_TIMEOUT_SECONDS: float = 60.0
+    LLM_HTTP_WRITE_TIMEOUT_SECONDS: float = 10.0
+    LLM_HTTP_POOL_TIMEOUT_SECONDS: float = 10.0  # Wait for a free pooled connection
+    LLM_HTTP2: bool = False  # Requires the 'h2' package
+    LLM_HTTP_WARMUP: bool = True  # Open a connection to the provider during startup
+
+    # Hedging, fallbacks, deadline and circuit breakers for chatbot LLM calls (src/core/resilient_llm.py)
+    LLM_FALLBACK_MODELS: list[str] = []  # Tried in order when LLM_MODEL fails, times out or has its circuit open
+    LLM_MAX_RETRIES: int = 1  # Provider SDK retries within one attempt
+    LLM_DEADLINE_SECONDS: float = 60.0  # Whole call, fallbacks included
+    LLM_ATTEMPT_TIMEOUT_SECONDS: float = 30.0  # One model (until the first token when streamed) before falling back
+    LLM_HEDGE_PERCENTILE: float = 95.0  # Duplicate an attempt slower than this latency percentile; 0 disables
+    LLM_HEDGE_MIN_DELAY_SECONDS: float = 0.5  # Never hedge sooner than this
+    LLM_HEDGE_MIN_SAMPLES: int = 20  # Latency samples of a model needed before it is hedged
+    LLM_LATENCY_WINDOW: int = 200  # Recent latencies kept per model
+    LLM_BREAKER_FAILURES: int = 5  # Consecutive provider failures that open a model's circuit
+    LLM_BREAKER_RESET_SECONDS: float = 30.0  # An open circuit lets one probe call through after this
+
+    # Per-turn model routing in the chatbot node (agents/basic/routing.py)
+    # Routes from the smallest model up: model, temperature, max_message_chars, max_context_tokens, plans, max_latency_seconds
+    LLM_ROUTES: list[dict] = []  # The first route that fits the turn is used, else LLM_MODEL; empty disables routing
+    LLM_ROUTE_MIN_LATENCY_SAMPLES: int = 20  # Latency samples of a model before max_latency_seconds applies
+    LLM_ROUTE_LATENCY_MAX_AGE_SECONDS: float = 300.0  # Only latencies this recent count against max_latency_seconds
     
     # Chatbot Rate Limiting (DEPRECATED - Now managed by user plans)
     # These values are kept as fallback only in case of errors
     CHATBOT_QUERY_LIMIT: int = 5  # Número máximo de consultas (fallback)
     CHATBOT_QUERY_WINDOW_HOURS: int = 24  # Ventana de tiempo en horas (fallback)
 
+    # Chatbot batch endpoint (/chatbot/batch)
+    CHATBOT_BATCH_MAX_ITEMS: int = 500  # Maximum number of messages per batch request
+    CHATBOT_BATCH_CONCURRENCY: int = 8  # Maximum number of graph runs in flight per batch
+
+    # Per-user request rate limit on the chat endpoints (GCRA)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "database"  # "database" (shared by all workers) or "memory" (per worker)
+    CHATBOT_RATE_LIMIT: str = "10/minute"  # Requests per user, e.g. "10/minute", "100/hour"
+
+    # One turn at a time per conversation thread (src/core/thread_lock.py)
+    THREAD_TURN_POLICY: str = "queue"  # Turn arriving while one runs: "queue", "reject" (409) or "merge"
+    THREAD_LOCK_BACKEND: str = "memory"  # "memory" (per worker) or "postgres" (advisory locks, all workers)
+    THREAD_LOCK_WAIT_SECONDS: float = 30.0  # Longest a queued turn waits before 409
+
+    # Idempotency-Key on /chatbot and /chatbot/stream (src/core/idempotency.py)
+    IDEMPOTENCY_BACKEND: str = "memory"  # "memory" (per worker) or "database" (llm_response_cache table, all workers)
+    IDEMPOTENCY_TTL_SECONDS: int = 86400  # Completed turns are replayed to retries for this long
+    IDEMPOTENCY_MAX_ENTRIES: int = 10000  # In-process LRU size
+
+    # Admission control for graph runs (per worker process)
+    ADMISSION_MAX_CONCURRENCY: int = 32  # Graph runs allowed to execute at once
+    ADMISSION_MAX_QUEUE_SIZE: int = 256  # Runs allowed to wait; beyond this requests are shed with 503
+    ADMISSION_MAX_WAIT_SECONDS: float = 10.0  # Maximum queue wait before shedding with 503
+    # Queue priority by plan name (lower is served first); unknown plans use the default
+    ADMISSION_PLAN_PRIORITIES: dict[str, int] = {"Enterprise": 0, "Pro": 1, "Basic": 2, "Free": 3}
+    ADMISSION_DEFAULT_PRIORITY: int = 3
+
+    # Adaptive (AIMD) concurrency limit for LLM calls from the chatbot node
+    # Set LLM_LIMITER_MIN = LLM_LIMITER_MAX to pin a fixed limit
+    LLM_LIMITER_INITIAL: int = 8  # Starting number of in-flight LLM calls
+    LLM_LIMITER_MIN: int = 1
+    LLM_LIMITER_MAX: int = 64
+    LLM_LIMITER_LATENCY_TOLERANCE: float = 2.0  # Back off when latency exceeds baseline x this factor
+    LLM_LIMITER_BACKOFF: float = 0.7  # Multiplicative decrease applied on overload
+
+    # Health probes and load shedding (per worker process)
+    LOOP_LAG_INTERVAL_SECONDS: float = 0.25  # Event-loop lag sampling period
+    LOOP_LAG_WARN_SECONDS: float = 0.1  # Log samples with at least this much lag
+    LOOP_BLOCK_DEBUG: bool = False  # Capture the stack of whatever blocks the loop (watchdog thread)
+    LOOP_BLOCK_THRESHOLD_SECONDS: float = 0.2  # Blocking time before the stack is captured
+    HEALTH_DB_TIMEOUT_SECONDS: float = 2.0  # Readiness fails if the database ping takes longer
+    LOAD_SHEDDING_ENABLED: bool = True
+    SHED_PATH_PREFIXES: list[str] = ["/chatbot/"]  # POSTs under these paths are shed when overloaded
+    SHED_DB_POOL_UTILIZATION: float = 1.0  # Checked-out share of pool_size + max_overflow
+    SHED_CHECKPOINTER_WAITING: int = 8  # Requests queued for a checkpointer connection
+    SHED_LLM_WAITING: int = 64  # LLM calls queued behind the adaptive limiter
+    SHED_LOOP_LAG_SECONDS: float = 0.5  # Event-loop scheduling delay
+    SHED_RETRY_AFTER_SECONDS: int = 2
+
+    # Exact-match LLM response cache
+    LLM_CACHE_ENABLED: bool = False
+    LLM_CACHE_BACKEND: str = "memory"  # "memory" (per worker) or "database" (shared llm_response_cache table)
+    LLM_CACHE_MAX_ENTRIES: int = 1024  # In-process LRU size
+    LLM_CACHE_TTL_SECONDS: int = 3600
+    LLM_CACHE_MAX_TEMPERATURE: float = 0.2  # Only cache when LLM_TEMPERATURE is at or below this
+    LLM_CACHE_MAX_MESSAGES: int = 1  # Only cache conversations with at most this many messages
+    LLM_CACHE_PURGE_INTERVAL_SECONDS: int = 600  # Delete expired llm_response_cache rows this often (0 = never)
+
+    # Semantic response cache (graph stage before the chatbot node)
+    SEMANTIC_CACHE_ENABLED: bool = False
+    SEMANTIC_CACHE_EMBEDDER: str = "hashing"  # "hashing" (local, deterministic) or "openai:<embedding-model>"
+    SEMANTIC_CACHE_DIMENSIONS: int = 256
+    SEMANTIC_CACHE_THRESHOLD: float = 0.92  # Minimum cosine similarity for a hit
+    SEMANTIC_CACHE_MEMORY_BUDGET_MB: int = 64  # LRU eviction once the index exceeds this size
+    SEMANTIC_CACHE_MAX_MESSAGES: int = 1  # Only use the cache on conversations this short
+
     class Config:
         env_file = ".env"
 
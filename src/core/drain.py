@@ -0,0 +1,130 @@
+"""
+Graceful shutdown.
+
+On SIGTERM the worker stops taking new chat turns (they get 503 and the
+readiness check fails, so the load balancer moves traffic away), lets
+in-flight graph runs and streams finish, waits for buffered writes such as
+batch usage logs, and only then closes the checkpointer and database pools.
+
+uvicorn itself stops listening on SIGTERM and waits for open connections
+before running the lifespan shutdown; drain() then covers work that
+outlives its request, bounded by SHUTDOWN_DRAIN_SECONDS. Both waits share
+SERVER_GRACEFUL_TIMEOUT_SECONDS, after which gunicorn kills the worker, so
+uvicorn gets what the drain leaves over (see request_graceful_timeout).
+"""
+import asyncio
+import logging
+import signal
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class DrainController:
+    """Per-worker registry of in-flight chat work and pending writes."""
+
+    def __init__(self, poll_interval: float = 0.05):
+        self.poll_interval = poll_interval
+        self._draining = False
+        self._active = 0
+        self._writes: set[asyncio.Task] = set()
+
+    @property
+    def draining(self) -> bool:
+        return self._draining
+
+    @property
+    def ready(self) -> bool:
+        return not self._draining
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def pending_writes(self) -> int:
+        return len(self._writes)
+
+    def start(self) -> None:
+        """Stop accepting new chat turns. Safe to call from a signal handler."""
+        if not self._draining:
+            self._draining = True
+            logger.info("Draining: new chat turns are rejected, %d in flight", self._active)
+
+    def reset(self) -> None:
+        """Accept work again (lifespan startup)."""
+        self._draining = False
+
+    @asynccontextmanager
+    async def track(self):
+        """Mark a graph run or stream as in flight for the duration of the block."""
+        self._active += 1
+        try:
+            yield
+        finally:
+            self._active -= 1
+
+    def defer_write(self, func: Callable, *args) -> asyncio.Task:
+        """
+        Run a blocking write in a thread as a task that outlives the request:
+        cancelling the caller (client gone, shutdown timeout) does not cancel
+        it, and drain() waits for it.
+        """
+        task = asyncio.create_task(asyncio.to_thread(func, *args))
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+        return task
+
+    async def drain(self, timeout: float) -> bool:
+        """
+        Wait up to `timeout` seconds for in-flight work, then for pending
+        writes. Returns False if anything was left behind.
+        """
+        self.start()
+        deadline = time.monotonic() + timeout
+        while self._active and time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+
+        writes = set(self._writes)
+        if writes:
+            await asyncio.wait(writes, timeout=max(0.0, deadline - time.monotonic()))
+
+        left_active, left_writes = self._active, sum(1 for task in writes if not task.done())
+        if left_active or left_writes:
+            logger.warning(
+                "Drain deadline of %.1fs reached with %d runs and %d writes pending", timeout, left_active, left_writes
+            )
+            return False
+        logger.info("Drained")
+        return True
+
+
+def install_signal_handlers(controller: DrainController, signals=(signal.SIGTERM, signal.SIGINT)) -> None:
+    """
+    Start draining as soon as a shutdown signal arrives, then hand the signal
+    to the server's own handler (uvicorn's, installed before the lifespan runs).
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+    for signum in signals:
+        previous = signal.getsignal(signum)
+        if getattr(previous, "drain_controller", None) is controller:
+            continue
+
+        def handler(received, frame, previous=previous):
+            controller.start()
+            if callable(previous):
+                previous(received, frame)
+            else:
+                # No server handler: restore the default action and deliver the signal again
+                signal.signal(received, previous if previous is not None else signal.SIG_DFL)
+                signal.raise_signal(received)
+
+        handler.drain_controller = controller
+        signal.signal(signum, handler)
+
+
+drain_controller = DrainController()
@@ -0,0 +1,179 @@
+"""
+Liveness, readiness and load shedding.
+
+Liveness only says the process serves requests. Readiness pings the database
+and the checkpointer and reports pool, LLM limiter, admission queue and
+event-loop state, failing while the worker drains or is overloaded so the
+load balancer stops routing to it. The same overload check backs
+LoadSheddingMiddleware, which answers new chat requests with 503 and
+Retry-After instead of letting them queue behind saturated pools until they
+time out.
+"""
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from fastapi import status
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+
+from src.core.adaptive_limiter import llm_limiter
+from src.core.admission import admission_controller
+from src.core.config import settings
+from src.core.drain import drain_controller
+from src.core.loop_monitor import loop_monitor
+from src.core.metrics import rate_limit_rejections
+from src.core.resilient_llm import model_health
+
+logger = logging.getLogger(__name__)
+
+
+def db_pool_state(engine) -> dict:
+    """Checked-out connections against the QueuePool's size plus overflow."""
+    pool = engine.pool
+    if not hasattr(pool, "checkedout"):
+        # SQLite and other non-queue pools have no fixed capacity
+        return {"pool": type(pool).__name__}
+    size = pool.size()
+    max_overflow = getattr(pool, "_max_overflow", 0)
+    checked_out = pool.checkedout()
+    capacity = size + max_overflow if max_overflow >= 0 else None
+    return {
+        "pool": type(pool).__name__,
+        "size": size,
+        "max_overflow": max_overflow,
+        "checked_out": checked_out,
+        "utilization": round(checked_out / capacity, 3) if capacity else None,
+    }
+
+
+def checkpointer_pool_state() -> Optional[dict]:
+    """psycopg_pool statistics of the checkpointer, or None for the memory backend."""
+    from src.db.checkpoint import get_checkpointer_pool
+
+    pool = get_checkpointer_pool()
+    if pool is None:
+        return None
+    stats = pool.get_stats()
+    return {
+        "size": stats.get("pool_size", 0),
+        "max_size": stats.get("pool_max", 0),
+        "available": stats.get("pool_available", 0),
+        "waiting": stats.get("requests_waiting", 0),
+    }
+
+
+def overload_reasons(engine) -> list[str]:
+    """Thresholds currently crossed; empty when the worker can take more chat work."""
+    reasons = []
+    db_utilization = db_pool_state(engine).get("utilization")
+    if db_utilization is not None and db_utilization >= settings.SHED_DB_POOL_UTILIZATION:
+        reasons.append("db_pool")
+    checkpointer = checkpointer_pool_state()
+    if checkpointer is not None and checkpointer["waiting"] >= settings.SHED_CHECKPOINTER_WAITING:
+        reasons.append("checkpointer_pool")
+    if llm_limiter.stats()["waiting"] >= settings.SHED_LLM_WAITING:
+        reasons.append("llm_limiter")
+    if loop_monitor.lag >= settings.SHED_LOOP_LAG_SECONDS:
+        reasons.append("event_loop_lag")
+    return reasons
+
+
+def _ping_database(engine) -> None:
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+
+async def _timed(check, timeout: float) -> dict:
+    start = time.perf_counter()
+    try:
+        await asyncio.wait_for(check(), timeout=timeout)
+    except Exception as e:
+        reason = "timeout" if isinstance(e, asyncio.TimeoutError) else str(e)
+        return {"ok": False, "error": reason}
+    return {"ok": True, "latency_ms": round((time.perf_counter() - start) * 1000, 2)}
+
+
+async def check_database(engine) -> dict:
+    result = await _timed(lambda: asyncio.to_thread(_ping_database, engine), settings.HEALTH_DB_TIMEOUT_SECONDS)
+    result["pool"] = db_pool_state(engine)
+    return result
+
+
+async def check_checkpointer() -> dict:
+    from src.db.checkpoint import get_checkpointer, get_checkpointer_pool
+
+    try:
+        get_checkpointer()
+    except RuntimeError as e:
+        return {"ok": False, "error": str(e)}
+    pool = get_checkpointer_pool()
+    if pool is None:
+        return {"ok": True, "backend": "memory"}
+
+    async def ping():
+        async with pool.connection() as conn:
+            await conn.execute("SELECT 1")
+
+    result = await _timed(ping, settings.HEALTH_DB_TIMEOUT_SECONDS)
+    result["pool"] = checkpointer_pool_state()
+    return result
+
+
+async def readiness(engine) -> tuple[bool, dict]:
+    """Run the deep checks. Returns (ready, report)."""
+    database, checkpointer = await asyncio.gather(check_database(engine), check_checkpointer())
+    overloaded = overload_reasons(engine)
+    ready = drain_controller.ready and database["ok"] and checkpointer["ok"] and not overloaded
+    report = {
+        "status": "ready" if ready else ("draining" if drain_controller.draining else "not_ready"),
+        "overloaded": overloaded,
+        "checks": {
+            "database": database,
+            "checkpointer": checkpointer,
+            "llm_limiter": llm_limiter.stats(),
+            "llm_models": model_health.stats(),
+            "admission": {
+                "in_flight": admission_controller.in_flight,
+                "queue_length": admission_controller.queue_length,
+            },
+            "event_loop": loop_monitor.stats(),
+        },
+    }
+    return ready, report
+
+
+class LoadSheddingMiddleware:
+    """
+    ASGI middleware rejecting new chat requests with 503 while overloaded.
+
+    Only POSTs under SHED_PATH_PREFIXES are shed: requests already admitted
+    keep their connections and slots, and cheap reads keep working.
+    """
+
+    def __init__(self, app, engine):
+        self.app = app
+        self.engine = engine
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not settings.LOAD_SHEDDING_ENABLED
+            or scope["method"] != "POST"
+            or not scope["path"].startswith(tuple(settings.SHED_PATH_PREFIXES))
+        ):
+            return await self.app(scope, receive, send)
+
+        reasons = overload_reasons(self.engine)
+        if not reasons:
+            return await self.app(scope, receive, send)
+
+        rate_limit_rejections.labels("overload").inc()
+        logger.warning("Shedding %s %s: %s", scope["method"], scope["path"], ", ".join(reasons))
+        response = JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"detail": "Server is overloaded, please retry shortly", "reasons": reasons},
+            headers={"Retry-After": str(settings.SHED_RETRY_AFTER_SECONDS)},
+        )
+        await response(scope, receive, send)
@@ -0,0 +1,205 @@
+"""
+Idempotency keys for chat turns.
+
+A client that times out and retries would otherwise run the whole turn again
+and pay for it twice (tokens, quota, usage logs). Requests carrying an
+`Idempotency-Key` header are deduplicated per user:
+
+- a duplicate of a turn still running in this worker attaches to it, and
+  receives the same reply or replays the same stream from its first chunk
+- a duplicate of a completed turn gets the stored reply for
+  IDEMPOTENCY_TTL_SECONDS, from memory or (IDEMPOTENCY_BACKEND=database) from
+  the llm_response_cache table, which every worker reads
+- reusing a key with a different request is refused with 422
+
+Only the first request runs the graph, so usage is logged once per key.
+Failed turns are not stored; a retry after a failure runs again.
+"""
+import asyncio
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Optional
+
+from fastapi import Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from src.core.config import settings
+from src.core.llm_cache import CachedResponse, DatabaseCacheBackend, LRUTTLCache
+
+logger = logging.getLogger(__name__)
+
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+@dataclass
+class IdempotencyRecord:
+    """
+    Output of one keyed turn: the JSON reply ("json") or the SSE chunks
+    ("stream"), growing while the turn runs.
+    """
+    fingerprint: str
+    kind: str
+    chunks: list[str] = field(default_factory=list)
+    done: bool = False
+    error: Optional[BaseException] = None
+    _changed: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    def append(self, chunk: str) -> None:
+        self.chunks.append(chunk)
+        self._notify()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.done = True
+        self.error = error
+        self._notify()
+
+    async def replay(self) -> AsyncIterator[str]:
+        """Every chunk from the first, following the turn until it ends."""
+        index = 0
+        while True:
+            while index < len(self.chunks):
+                yield self.chunks[index]
+                index += 1
+            if self.done:
+                # A failed stream already reported what it could in-band; just end it
+                if self.error is not None and self.kind == "json":
+                    raise self.error
+                return
+            await self._changed.wait()
+
+    async def result(self) -> str:
+        """The JSON reply once the turn has finished."""
+        async for _ in self.replay():
+            pass
+        return self.chunks[0]
+
+    def _notify(self) -> None:
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+
+class IdempotencyKeyReused(Exception):
+    """Raised when a key comes back with a different request."""
+
+
+class IdempotentReplay(Exception):
+    """Raised by the dependency to answer a duplicate without running the endpoint."""
+
+    def __init__(self, record: IdempotencyRecord):
+        super().__init__("Duplicate request")
+        self.record = record
+
+
+class IdempotencyStore:
+    """In-flight turns of this worker plus the completed ones (LRU with TTL, optional shared backend)."""
+
+    def __init__(self, memory: LRUTTLCache, backend: Optional[DatabaseCacheBackend] = None):
+        self.memory = memory
+        self.backend = backend
+        self._in_flight: dict[str, IdempotencyRecord] = {}
+        self._replayed = 0
+
+    async def lookup(self, key: str, fingerprint: str) -> Optional[IdempotencyRecord]:
+        """
+        The running or completed turn for `key`, if any.
+
+        Raises:
+            IdempotencyKeyReused: If the key was used for a different request
+        """
+        record = self._in_flight.get(key)
+        if record is None:
+            record = await self._load(key)
+        if record is not None:
+            if record.fingerprint != fingerprint:
+                raise IdempotencyKeyReused(key)
+            self._replayed += 1
+        return record
+
+    def begin(self, key: str, fingerprint: str, kind: str) -> tuple[IdempotencyRecord, bool]:
+        """
+        The record for `key` and whether this request owns (must run) the turn.
+        Called after lookup(); catches a duplicate that started or finished the
+        turn in this worker in the meantime.
+        """
+        record = self._in_flight.get(key)
+        if record is None:
+            value = self.memory.get(key)
+            record = self._decode(value) if value is not None else None
+        if record is not None:
+            if record.fingerprint != fingerprint:
+                raise IdempotencyKeyReused(key)
+            self._replayed += 1
+            return record, False
+        record = IdempotencyRecord(fingerprint=fingerprint, kind=kind)
+        self._in_flight[key] = record
+        return record, True
+
+    async def complete(self, key: str, record: IdempotencyRecord) -> None:
+        """Store a finished turn and wake its duplicates."""
+        record.finish()
+        value = CachedResponse(
+            content=json.dumps({"fingerprint": record.fingerprint, "kind": record.kind, "chunks": record.chunks}),
+            model="idempotency",
+        )
+        self.memory.set(key, value)
+        if self._in_flight.get(key) is record:
+            del self._in_flight[key]
+        if self.backend is not None:
+            try:
+                await asyncio.to_thread(self.backend.set, key, value, int(self.memory.ttl_seconds))
+            except Exception as e:
+                logger.error("Idempotency backend write failed: %s", e)
+
+    def fail(self, key: str, record: IdempotencyRecord, error: BaseException) -> None:
+        """Forget a failed turn; attached duplicates see the same error."""
+        record.finish(error)
+        if self._in_flight.get(key) is record:
+            del self._in_flight[key]
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._in_flight), "entries": len(self.memory), "replayed_total": self._replayed}
+
+    async def _load(self, key: str) -> Optional[IdempotencyRecord]:
+        value = self.memory.get(key)
+        if value is None and self.backend is not None:
+            try:
+                value = await asyncio.to_thread(self.backend.get, key)
+            except Exception as e:
+                logger.error("Idempotency backend lookup failed: %s", e)
+            if value is not None:
+                self.memory.set(key, value)
+        return self._decode(value) if value is not None else None
+
+    @staticmethod
+    def _decode(value: CachedResponse) -> IdempotencyRecord:
+        stored = json.loads(value.content)
+        return IdempotencyRecord(fingerprint=stored["fingerprint"], kind=stored["kind"], chunks=stored["chunks"], done=True)
+
+
+@dataclass
+class IdempotentRequest:
+    """A keyed request: the user-scoped store key and the fingerprint of what was asked."""
+    key: str
+    fingerprint: str
+
+
+def replay_response(record: IdempotencyRecord):
+    """The response a duplicate gets: the stored reply or the replayed stream."""
+    headers = {REPLAYED_HEADER: "true"}
+    if record.kind == "stream":
+        return StreamingResponse(record.replay(), media_type="text/event-stream", headers=headers)
+    return JSONResponse(content=record.chunks[0], headers=headers)
+
+
+async def idempotent_replay_handler(request: Request, exc: IdempotentReplay):
+    """Exception handler answering duplicates found by the idempotent_request dependency."""
+    return replay_response(exc.record)
+
+
+def build_idempotency_store() -> IdempotencyStore:
+    backend = DatabaseCacheBackend() if settings.IDEMPOTENCY_BACKEND == "database" else None
+    return IdempotencyStore(LRUTTLCache(settings.IDEMPOTENCY_MAX_ENTRIES, settings.IDEMPOTENCY_TTL_SECONDS), backend)
+
+
+idempotency_store = build_idempotency_store()
@@ -0,0 +1,225 @@
+"""
+Exact-match LLM response cache.
+
+Responses are keyed by a hash of (model, temperature, system prompt,
+normalized message list). Lookups go to an in-process LRU with TTL first and
+then to an optional persistent backend shared by all workers. Only
+low-temperature, short conversations are cached, so a hit returns what the
+model would very likely have said anyway.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Optional, Protocol, Sequence
+
+from langchain_core.messages import BaseMessage
+
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedResponse:
+    """A cached LLM answer and the model name the provider reported for it."""
+    content: str
+    model: Optional[str] = None
+
+
+class CacheBackend(Protocol):
+    """Persistent cache tier shared across workers."""
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        ...
+
+    def set(self, key: str, value: CachedResponse, ttl_seconds: int) -> None:
+        ...
+
+
+def normalize_content(content) -> str:
+    """Collapse whitespace in text content; serialize structured content."""
+    if isinstance(content, str):
+        return " ".join(content.split())
+    return json.dumps(content, sort_keys=True, default=str)
+
+
+def make_cache_key(model: str, temperature: float, system_prompt: str, messages: Sequence[BaseMessage]) -> str:
+    """Hash of everything that determines the model's answer."""
+    payload = {
+        "model": model,
+        "temperature": temperature,
+        "system": normalize_content(system_prompt),
+        "messages": [[message.type, normalize_content(message.content)] for message in messages],
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class LRUTTLCache:
+    """Thread-safe in-process LRU cache whose entries expire after a TTL."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: OrderedDict[str, tuple[float, CachedResponse]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at <= self._clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: CachedResponse) -> None:
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class DatabaseCacheBackend:
+    """Cache tier stored in the llm_response_cache table."""
+
+    def __init__(self, session_factory=None):
+        if session_factory is None:
+            from src.db.database import SessionLocal
+            session_factory = SessionLocal
+        self._session_factory = session_factory
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        from src.services.llm_cache_service import get_cached_response
+        db = self._session_factory()
+        try:
+            entry = get_cached_response(db, key)
+            return CachedResponse(content=entry.response, model=entry.model) if entry else None
+        finally:
+            db.close()
+
+    def set(self, key: str, value: CachedResponse, ttl_seconds: int) -> None:
+        from src.services.llm_cache_service import upsert_cached_response
+        db = self._session_factory()
+        try:
+            upsert_cached_response(db, key, value.content, value.model, ttl_seconds)
+        finally:
+            db.close()
+
+    def purge_expired(self) -> int:
+        """Delete expired rows (lookups skip them but leave them in place)."""
+        from src.services.llm_cache_service import delete_expired_cached_responses
+        db = self._session_factory()
+        try:
+            return delete_expired_cached_responses(db)
+        finally:
+            db.close()
+
+
+class ResponseCache:
+    """Two-tier exact-match cache: in-process LRU, then an optional backend."""
+
+    def __init__(
+        self,
+        memory: LRUTTLCache,
+        backend: Optional[CacheBackend] = None,
+        max_temperature: float = 0.0,
+        max_messages: int = 1,
+    ):
+        self.memory = memory
+        self.backend = backend
+        self.max_temperature = max_temperature
+        self.max_messages = max_messages
+        self._hits = {"memory": 0, "backend": 0}
+        self._misses = 0
+
+    def is_cacheable(self, temperature: float, messages: Sequence[BaseMessage]) -> bool:
+        """Only near-deterministic settings on short (typically fresh) threads are cached."""
+        return temperature <= self.max_temperature and len(messages) <= self.max_messages
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        value = self.memory.get(key)
+        if value is not None:
+            self._hits["memory"] += 1
+            return value
+
+        if self.backend is not None:
+            try:
+                # Backends do blocking I/O; keep it off the event loop
+                value = await asyncio.to_thread(self.backend.get, key)
+            except Exception as e:
+                logger.error(f"LLM cache backend lookup failed: {str(e)}")
+                value = None
+            if value is not None:
+                self._hits["backend"] += 1
+                self.memory.set(key, value)
+                return value
+
+        self._misses += 1
+        return None
+
+    async def set(self, key: str, value: CachedResponse) -> None:
+        self.memory.set(key, value)
+        if self.backend is not None:
+            try:
+                await asyncio.to_thread(self.backend.set, key, value, int(self.memory.ttl_seconds))
+            except Exception as e:
+                logger.error(f"LLM cache backend write failed: {str(e)}")
+
+    def stats(self) -> dict:
+        lookups = self._hits["memory"] + self._hits["backend"] + self._misses
+        return {
+            "hits_memory": self._hits["memory"],
+            "hits_backend": self._hits["backend"],
+            "misses": self._misses,
+            "hit_rate": (lookups - self._misses) / lookups if lookups else 0.0,
+            "entries": len(self.memory),
+        }
+
+
+async def purge_expired_entries(interval_seconds: float, backend: Optional[DatabaseCacheBackend] = None) -> None:
+    """
+    Delete expired llm_response_cache rows every interval_seconds until cancelled.
+
+    The table holds cached responses and idempotency records; both expire but
+    are only removed here.
+    """
+    backend = backend or DatabaseCacheBackend()
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            deleted = await asyncio.to_thread(backend.purge_expired)
+        except Exception as e:
+            logger.error(f"LLM cache purge failed: {str(e)}")
+            continue
+        if deleted:
+            logger.info("Deleted %d expired llm_response_cache rows", deleted)
+
+
+def build_response_cache() -> Optional[ResponseCache]:
+    """Build the response cache from settings, or None if caching is disabled."""
+    if not settings.LLM_CACHE_ENABLED:
+        return None
+    backend = DatabaseCacheBackend() if settings.LLM_CACHE_BACKEND == "database" else None
+    return ResponseCache(
+        memory=LRUTTLCache(settings.LLM_CACHE_MAX_ENTRIES, settings.LLM_CACHE_TTL_SECONDS),
+        backend=backend,
+        max_temperature=settings.LLM_CACHE_MAX_TEMPERATURE,
+        max_messages=settings.LLM_CACHE_MAX_MESSAGES,
+    )
+
+
+response_cache = build_response_cache()
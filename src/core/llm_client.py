@@ -0,0 +1,150 @@
+"""
+LLM client factory.
+
+OpenAI-compatible chat models share one tuned httpx.AsyncClient per worker,
+so calls reuse pooled keep-alive connections (and their TLS sessions) instead
+of paying a new handshake each time; other providers keep their own client. Pool size, keep-alive expiry, timeouts and HTTP/2
+come from Settings. The client is warmed up during the app lifespan and
+closed on shutdown. With LLM_FAKE_SERVER enabled, models talk to the local
+fake provider in benchmarks/fake_llm_server.py instead.
+"""
+import logging
+from typing import TYPE_CHECKING, Optional
+
+import httpx
+
+from src.core.config import settings
+
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
+
+logger = logging.getLogger(__name__)
+
+OPENAI_DEFAULT_BASE_URL = "https://api.openai.com/v1"
+
+# init_chat_model providers built on ChatOpenAI, which take its client options
+OPENAI_COMPATIBLE_PROVIDERS = {"openai", "azure_openai", "deepseek", "xai"}
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def build_http_timeout() -> httpx.Timeout:
+    """Connect/read/write/pool timeouts for LLM requests."""
+    return httpx.Timeout(
+        connect=settings.LLM_HTTP_CONNECT_TIMEOUT_SECONDS,
+        read=settings.LLM_HTTP_READ_TIMEOUT_SECONDS,
+        write=settings.LLM_HTTP_WRITE_TIMEOUT_SECONDS,
+        pool=settings.LLM_HTTP_POOL_TIMEOUT_SECONDS,
+    )
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def build_http_client() -> httpx.AsyncClient:
+    """Build an httpx.AsyncClient tuned from Settings."""
+    http2 = settings.LLM_HTTP2
+    if http2 and not _http2_available():
+        logger.warning("LLM_HTTP2 is enabled but the 'h2' package is not installed; using HTTP/1.1")
+        http2 = False
+
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.LLM_HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        timeout=build_http_timeout(),
+        http2=http2,
+    )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared LLM HTTP client, creating it on first use."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = build_http_client()
+    return _http_client
+
+
+def get_llm_base_url() -> str:
+    if settings.LLM_FAKE_SERVER:
+        return settings.LLM_FAKE_SERVER_URL
+    return settings.LLM_BASE_URL or OPENAI_DEFAULT_BASE_URL
+
+
+def model_provider(model: str, provider: Optional[str] = None) -> Optional[str]:
+    """
+    The init_chat_model provider of `model`: the explicit one, the prefix of
+    "provider:model", or inferred from a bare OpenAI model name. None when unknown.
+    """
+    if not provider and ":" in model:
+        provider = model.split(":", 1)[0]
+    if not provider and model.startswith(("gpt-", "o1", "o3", "o4")):
+        provider = "openai"
+    return provider.replace("-", "_").lower() if provider else None
+
+
+def build_chat_model(model: Optional[str] = None, temperature: Optional[float] = None, **kwargs) -> "BaseChatModel":
+    """
+    Create a chat model; OpenAI-compatible ones use the shared HTTP client.
+
+    Args:
+        model: Model identifier (defaults to LLM_MODEL)
+        temperature: Sampling temperature (defaults to LLM_TEMPERATURE)
+        **kwargs: Extra arguments for init_chat_model
+
+    Returns:
+        Configured chat model
+    """
+    model = model or settings.LLM_MODEL
+    options = {"temperature": settings.LLM_TEMPERATURE if temperature is None else temperature}
+    if model_provider(model, kwargs.get("model_provider")) in OPENAI_COMPATIBLE_PROVIDERS:
+        options.update({
+            "http_async_client": get_http_client(),
+            "timeout": build_http_timeout(),
+            # ChatOpenAI only requests streamed usage by default with its own client,
+            # and usage logging depends on it
+            "stream_usage": True,
+        })
+    else:
+        # Other SDKs take a single number of seconds
+        options["timeout"] = settings.LLM_HTTP_READ_TIMEOUT_SECONDS
+    if settings.LLM_FAKE_SERVER:
+        options["base_url"] = settings.LLM_FAKE_SERVER_URL
+        options["api_key"] = "sk-fake"
+    elif settings.LLM_BASE_URL:
+        options["base_url"] = settings.LLM_BASE_URL
+    options.update(kwargs)
+    # Imported here: langchain and the provider SDK take seconds to import
+    from langchain.chat_models import init_chat_model
+    return init_chat_model(model, **options)
+
+
+async def warm_up_http_client() -> None:
+    """
+    Open a pooled connection to the provider ahead of the first chat turn,
+    so the first user does not pay DNS, TCP and TLS setup.
+    """
+    if not settings.LLM_HTTP_WARMUP:
+        return
+    url = f"{get_llm_base_url().rstrip('/')}/models"
+    try:
+        # Any response (even 401) leaves a pooled keep-alive connection behind
+        response = await get_http_client().get(url)
+        logger.info("LLM HTTP client warmed up (%s -> %d)", url, response.status_code)
+    except httpx.HTTPError as e:
+        logger.warning(f"LLM HTTP client warm-up failed: {str(e)}")
+
+
+async def close_http_client() -> None:
+    """Close the shared LLM HTTP client and its pooled connections."""
+    global _http_client
+    if _http_client is not None and not _http_client.is_closed:
+        await _http_client.aclose()
+    _http_client = None
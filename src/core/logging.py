@@ -1,39 +1,183 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import random
 import sys
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import Optional
+
+from src.core.config import settings
+from src.core.tracing import TraceContextFilter
 
 # Create logger instance for use throughout the application
 logger = logging.getLogger(__name__)
 
-def setup_logging():
-    """Configure logging for the application."""
-    log_dir = Path("logs")
-    log_dir.mkdir(exist_ok=True)
-    
-    # Create formatter
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [trace=%(trace_id)s] - %(message)s'
+
+# Attributes every LogRecord has; anything else came from `extra=` and is kept in JSON output
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "trace_id", "span_id"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_installed_handlers: list[logging.Handler] = []
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with `extra=` fields and trace ids as keys."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "timestamp": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "trace_id": getattr(record, "trace_id", None),
+            "span_id": getattr(record, "span_id", None),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload["exc_info"] = record.exc_text
+        return json.dumps(payload, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of DEBUG records from high-volume loggers.
+
+    `rates` maps logger name prefixes to the fraction kept (0.0-1.0); the
+    longest matching prefix wins. INFO and above are never sampled.
+    """
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        self.rates = sorted(rates.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or not self.rates:
+            return True
+        for prefix, rate in self.rates:
+            if record.name == prefix or record.name.startswith(prefix + "."):
+                return rate >= 1.0 or random.random() < rate
+        return True
+
+
+class ContextQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that keeps exception text and `extra=` fields.
+
+    The trace filter runs here, in the logging thread, since the listener
+    thread has no access to the request's context variables.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args into the message so unpicklable/mutable args never cross threads
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def build_formatter(log_format: str) -> logging.Formatter:
+    if log_format == "json":
+        return JsonFormatter()
+    return logging.Formatter(TEXT_FORMAT, datefmt='%Y-%m-%d %H:%M:%S')
+
+
+def log_file_path() -> Path:
+    """
+    LOG_FILE, or with several workers a file per worker (logs/app.1234.log).
+
+    Rotation renames the file, so workers sharing one would rotate it under
+    each other and lose records.
+    """
+    path = Path(settings.LOG_FILE)
+    if settings.WEB_CONCURRENCY > 1:
+        return path.with_name(f"{path.stem}.{os.getpid()}{path.suffix}")
+    return path
+
+
+def build_file_handler(path: Path) -> logging.Handler:
+    if settings.LOG_ROTATION == "time":
+        return logging.handlers.TimedRotatingFileHandler(
+            path, when=settings.LOG_ROTATE_WHEN, backupCount=settings.LOG_BACKUP_COUNT, encoding="utf-8"
+        )
+    return logging.handlers.RotatingFileHandler(
+        path, maxBytes=settings.LOG_MAX_BYTES, backupCount=settings.LOG_BACKUP_COUNT, encoding="utf-8"
     )
-    
+
+
+def shutdown_logging() -> None:
+    """Stop the listener thread after flushing queued records."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def setup_logging():
+    """Configure logging for the application. Safe to call more than once."""
+    global _listener
+    log_file = log_file_path()
+    log_file.parent.mkdir(parents=True, exist_ok=True)
+
+    formatter = build_formatter(settings.LOG_FORMAT)
+
     # Console handler
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(logging.INFO)
     console_handler.setFormatter(formatter)
-    
-    # File handler
-    file_handler = logging.FileHandler(log_dir / 'app.log')
+
+    # File handler, rotated by size or time
+    file_handler = build_file_handler(log_file)
     file_handler.setLevel(logging.DEBUG)
     file_handler.setFormatter(formatter)
-    
+
     # Root logger configuration
     root_logger = logging.getLogger()
-    root_logger.setLevel(logging.DEBUG)
-    root_logger.addHandler(console_handler)
-    root_logger.addHandler(file_handler)
-    
+    root_logger.setLevel(settings.LOG_LEVEL.upper())
+
+    shutdown_logging()
+    for handler in _installed_handlers:
+        root_logger.removeHandler(handler)
+        handler.close()
+    _installed_handlers.clear()
+
+    if settings.LOG_ASYNC:
+        # Request threads only enqueue; formatting and file I/O happen in the listener thread
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        front: list[logging.Handler] = [ContextQueueHandler(log_queue)]
+        _listener = logging.handlers.QueueListener(
+            log_queue, console_handler, file_handler, respect_handler_level=True
+        )
+        _listener.start()
+        back = [console_handler, file_handler]
+    else:
+        front = back = [console_handler, file_handler]
+
+    for handler in front:
+        if settings.LOG_SAMPLING:
+            handler.addFilter(SamplingFilter(settings.LOG_SAMPLING))
+        handler.addFilter(TraceContextFilter())
+        root_logger.addHandler(handler)
+    _installed_handlers.extend(front)
+    if front is not back:
+        _installed_handlers.extend(back)
+
     # Suppress verbose logs from third-party libraries
     logging.getLogger("urllib3").setLevel(logging.WARNING)
     logging.getLogger("sqlalchemy").setLevel(logging.WARNING)
-    
-    return root_logger
\ No newline at end of file
+
+    return root_logger
+
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,163 @@
+"""
+Event-loop lag monitor and blocking-call detector.
+
+A timer task sleeps for LOOP_LAG_INTERVAL_SECONDS and measures how late it
+wakes up. The delay is time the loop spent on other callbacks (or blocked in
+sync code) before it could run the timer, so it bounds the extra latency
+every other coroutine on the loop saw in that interval. Samples go to the
+event_loop_lag_seconds histogram; those above LOOP_LAG_WARN_SECONDS are
+logged.
+
+The lag only says that the loop was blocked, not by what. With
+LOOP_BLOCK_DEBUG a watchdog thread checks whether the timer is overdue by
+LOOP_BLOCK_THRESHOLD_SECONDS and, while the loop is still stuck, captures the
+loop thread's stack, which points at the blocking call (bcrypt, a sync
+SQLAlchemy query, file I/O, ...). It costs a thread waking every few
+milliseconds, so it is meant for diagnosing, not left on.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Optional
+
+from src.core.config import settings
+from src.core.metrics import event_loop_blocked, event_loop_lag
+
+logger = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+    """Samples scheduling delay of the running event loop."""
+
+    def __init__(
+        self,
+        interval: float = 0.25,
+        warn_threshold: float = 0.1,
+        block_threshold: float = 0.2,
+        window: int = 240,
+    ):
+        self.interval = interval
+        self.warn_threshold = warn_threshold
+        self.block_threshold = block_threshold
+        self._samples: deque[float] = deque(maxlen=window)
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        # Loop time the pending timer should fire at; loop.time() is time.monotonic()
+        self._expected_wakeup: Optional[float] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._watchdog_stop = threading.Event()
+        self.blocks: deque[dict] = deque(maxlen=20)
+        self.last_lag = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def debug(self) -> bool:
+        return self._watchdog is not None and self._watchdog.is_alive()
+
+    @property
+    def lag(self) -> float:
+        """
+        Current lag in seconds: the last sample, or how overdue the pending
+        timer already is if that is larger.
+        """
+        if not self.running or self._expected_wakeup is None:
+            return self.last_lag
+        return max(self.last_lag, self._loop.time() - self._expected_wakeup)
+
+    @property
+    def max_lag(self) -> float:
+        """Largest lag in the recent window."""
+        return max(self._samples, default=0.0)
+
+    def start(self, debug: bool = False) -> None:
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._samples.clear()
+        self.last_lag = 0.0
+        self._task = self._loop.create_task(self._run(), name="loop-lag-monitor")
+        self.set_debug(debug)
+
+    def set_debug(self, enabled: bool) -> None:
+        """Start or stop the blocking-call watchdog while the monitor runs."""
+        if enabled and not self.debug:
+            self._watchdog_stop.clear()
+            self._watchdog = threading.Thread(target=self._watch, name="loop-block-watchdog", daemon=True)
+            self._watchdog.start()
+        elif not enabled and self._watchdog is not None:
+            self._watchdog_stop.set()
+            self._watchdog.join()
+            self._watchdog = None
+
+    async def stop(self) -> None:
+        self.set_debug(False)
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._expected_wakeup = None
+
+    async def _run(self) -> None:
+        loop = self._loop
+        while True:
+            self._expected_wakeup = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.record(max(0.0, loop.time() - self._expected_wakeup))
+
+    def record(self, lag: float) -> None:
+        self.last_lag = lag
+        self._samples.append(lag)
+        event_loop_lag.observe(lag)
+        if lag >= self.warn_threshold:
+            logger.warning("Event loop lagged %.3fs", lag)
+
+    def _watch(self) -> None:
+        """Watchdog thread: capture the loop thread's stack once per blocking episode."""
+        poll = max(0.005, self.block_threshold / 4)
+        reported = None
+        while not self._watchdog_stop.wait(poll):
+            expected = self._expected_wakeup
+            if expected is None or expected == reported:
+                continue
+            overdue = time.monotonic() - expected
+            if overdue < self.block_threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            reported = expected
+            stack = "".join(traceback.format_stack(frame))
+            del frame
+            self.blocks.append({"at": time.time(), "blocked_seconds": round(overdue, 3), "stack": stack})
+            event_loop_blocked.inc()
+            logger.warning("Event loop blocked for %.3fs so far in:\n%s", overdue, stack)
+
+    def stats(self) -> dict:
+        return {
+            "lag_seconds": round(self.lag, 6),
+            "max_lag_seconds": round(self.max_lag, 6),
+            "interval_seconds": self.interval,
+            "running": self.running,
+            "debug": self.debug,
+            "blocks_captured": len(self.blocks),
+        }
+
+
+loop_monitor = LoopLagMonitor(
+    interval=settings.LOOP_LAG_INTERVAL_SECONDS,
+    warn_threshold=settings.LOOP_LAG_WARN_SECONDS,
+    block_threshold=settings.LOOP_BLOCK_THRESHOLD_SECONDS,
+)
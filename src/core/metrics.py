@@ -0,0 +1,382 @@
+"""
+Prometheus metrics.
+
+A small in-process registry that renders the Prometheus text exposition
+format at /metrics. The hot path is cheap: label children are looked up in a
+dict (the registry lock is only taken the first time a label set is seen)
+and each child guards its own values with an uncontended lock. Gauges that
+mirror external state (connection pools) are read from callbacks at scrape
+time instead of being updated on every checkout.
+
+Each worker process has its own registry. With more than one worker, every
+sample carries a worker="<pid>" label so the series of different workers
+never collide; sum them in queries (see the README's production server notes).
+"""
+import math
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Optional, Sequence
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0, 120.0)
+LOOP_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], *extra: str) -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    parts.extend(label for label in extra if label)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str):
+        """Return the child for a label set, creating it on first use."""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self, const: str) -> list[str]:
+        """Sample lines; const is a preformatted label added to every sample (or empty)."""
+        raise NotImplementedError
+
+    def render(self, const: str = "") -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples(const))
+        return "\n".join(lines)
+
+
+class _Value:
+    __slots__ = ("value", "lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self.lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(_Metric):
+    """Monotonic counter."""
+    type_name = "counter"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def _samples(self, const: str) -> list[str]:
+        return [
+            f"{self.name}_total{_format_labels(self.labelnames, key, const)} {_format_value(child.value)}"
+            for key, child in list(self._children.items())
+        ]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, or be read from a callback at scrape time."""
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._callback: Optional[Callable[[], dict[tuple[str, ...], float]]] = None
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def set_callback(self, callback: Callable[[], dict[tuple[str, ...], float]]) -> None:
+        """Read values at scrape time; the callback maps label tuples to values."""
+        self._callback = callback
+
+    def _samples(self, const: str) -> list[str]:
+        if self._callback is not None:
+            try:
+                values = self._callback()
+            except Exception:
+                values = {}
+            return [
+                f"{self.name}{_format_labels(self.labelnames, key, const)} {_format_value(value)}"
+                for key, value in values.items()
+            ]
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key, const)} {_format_value(child.value)}"
+            for key, child in list(self._children.items())
+        ]
+
+
+class _HistogramValue:
+    __slots__ = ("upper_bounds", "counts", "sum", "lock")
+
+    def __init__(self, upper_bounds: tuple[float, ...]):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.upper_bounds, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    """Cumulative histogram with fixed buckets."""
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramValue:
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def _samples(self, const: str) -> list[str]:
+        lines = []
+        for key, child in list(self._children.items()):
+            with child.lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, const, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key, const)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key, const)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self, worker: Optional[str] = None) -> str:
+        """Text exposition of every metric, labelled with the worker when one is given."""
+        const = f'worker="{_escape(worker)}"' if worker is not None else ""
+        return "\n".join(metric.render(const) for metric in self._metrics.values()) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+registry = Registry()
+
+http_requests = registry.counter("http_requests", "HTTP requests by route and status", ["method", "route", "status"])
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request duration until the response body is complete", ["method", "route", "status"]
+)
+http_requests_in_flight = registry.gauge("http_requests_in_flight", "HTTP requests currently being served")
+
+llm_requests = registry.counter("llm_requests", "LLM calls by graph node, model and outcome", ["node", "model", "outcome"])
+llm_time_to_first_token = registry.histogram(
+    "llm_time_to_first_token_seconds", "Time until the first token (whole response when not streamed)", ["node", "model"], LLM_BUCKETS
+)
+llm_request_duration = registry.histogram("llm_request_duration_seconds", "LLM call duration", ["node", "model"], LLM_BUCKETS)
+llm_tokens = registry.counter("llm_tokens", "LLM tokens by direction", ["node", "model", "direction"])
+llm_hedged_requests = registry.counter(
+    "llm_hedged_requests", "LLM attempts that sent a hedged duplicate, by model and which copy answered (primary, hedge, none)", ["model", "winner"]
+)
+llm_fallbacks = registry.counter(
+    "llm_fallbacks", "LLM calls moved past a model, by model and reason (error, timeout, circuit_open)", ["model", "reason"]
+)
+llm_routed_turns = registry.counter("llm_routed_turns", "Chat turns by the model the router picked", ["model"])
+llm_circuit_state = registry.gauge("llm_circuit_state", "Circuit breaker state per model (0 closed, 1 half-open, 2 open)", ["model"])
+
+rate_limit_rejections = registry.counter(
+    "rate_limit_rejections", "Requests rejected by a limiter (user, plan_quota, token_budget, admission, overload, thread_busy)", ["limiter"]
+)
+chatbot_streams_in_flight = registry.gauge("chatbot_streams_in_flight", "Open /chatbot/stream responses")
+
+event_loop_lag = registry.histogram(
+    "event_loop_lag_seconds", "Event-loop scheduling delay of the lag monitor's timer", buckets=LOOP_LAG_BUCKETS
+)
+event_loop_blocked = registry.counter(
+    "event_loop_blocked", "Times the blocking-call detector caught the loop stuck past LOOP_BLOCK_THRESHOLD_SECONDS"
+)
+
+db_pool_connections = registry.gauge(
+    "db_pool_connections", "Connection pool state (checked_in, checked_out, overflow, size)", ["pool", "state"]
+)
+checkpointer_pool_connections = registry.gauge(
+    "checkpointer_pool_connections", "Checkpointer connection pool state (psycopg_pool stats)", ["state"]
+)
+
+
+def watch_sqlalchemy_pool(engine, name: str = "sqlalchemy") -> None:
+    """Report the engine's QueuePool state at scrape time."""
+    def collect() -> dict[tuple[str, ...], float]:
+        pool = engine.pool
+        values = {}
+        for state, method in (("size", "size"), ("checked_in", "checkedin"), ("checked_out", "checkedout"), ("overflow", "overflow")):
+            if hasattr(pool, method):
+                values[(name, state)] = getattr(pool, method)()
+        return values
+    db_pool_connections.set_callback(collect)
+
+
+def watch_checkpointer_pool(get_pool: Callable[[], object]) -> None:
+    """Report psycopg_pool.AsyncConnectionPool.get_stats() at scrape time."""
+    def collect() -> dict[tuple[str, ...], float]:
+        pool = get_pool()
+        if pool is None:
+            return {}
+        return {(key,): value for key, value in pool.get_stats().items()}
+    checkpointer_pool_connections.set_callback(collect)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route request counts and latency."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        status_code = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_code[0] = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_flight.dec()
+            # Templated path keeps label cardinality bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            labels = (scope["method"], route, str(status_code[0]))
+            http_requests.labels(*labels).inc()
+            http_request_duration.labels(*labels).observe(time.perf_counter() - start)
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """
+    Records per-node LLM latency, time to first token and token usage.
+
+    Runs inline (no executor hop) and keeps only a start timestamp per
+    in-flight run.
+    """
+    run_inline = True
+
+    def __init__(self):
+        self._runs: dict[UUID, list] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, metadata: Optional[dict] = None, **kwargs) -> None:
+        node = (metadata or {}).get("langgraph_node", "unknown")
+        model = (metadata or {}).get("ls_model_name") or "unknown"
+        # [node, model, start, first token time]
+        self._runs[run_id] = [node, model, time.perf_counter(), None]
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs) -> None:
+        run = self._runs.get(run_id)
+        if run is not None and run[3] is None and token:
+            run[3] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        node, model, start, first_token = run
+        end = time.perf_counter()
+
+        input_tokens = output_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None) or {}
+                input_tokens += usage.get("input_tokens", 0)
+                output_tokens += usage.get("output_tokens", 0)
+                model_name = (getattr(message, "response_metadata", None) or {}).get("model_name")
+                if model_name:
+                    model = model_name
+
+        llm_requests.labels(node, model, "success").inc()
+        llm_request_duration.labels(node, model).observe(end - start)
+        llm_time_to_first_token.labels(node, model).observe((first_token or end) - start)
+        if input_tokens:
+            llm_tokens.labels(node, model, "input").inc(input_tokens)
+        if output_tokens:
+            llm_tokens.labels(node, model, "output").inc(output_tokens)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        node, model, start, _ = run
+        llm_requests.labels(node, model, "error").inc()
+        llm_request_duration.labels(node, model).observe(time.perf_counter() - start)
+
+
+llm_metrics_callback = LLMMetricsCallback()
@@ -0,0 +1,195 @@
+"""
+In-process diagnostics for the running worker.
+
+StackSampler is a statistical CPU profiler: a background thread reads the
+stack of every other thread (sys._current_frames) at a fixed interval and
+counts identical stacks. The result is written in the "collapsed" format
+(`frame;frame;frame count` per line) read by flamegraph.pl, speedscope and
+inferno. Coroutines running on the event loop appear on the loop thread's
+stack, so async handlers and graph nodes are sampled too.
+
+MemoryTracker wraps tracemalloc: start tracing, take snapshots and diff each
+one against the previous, grouped by line or by traceback, which is how
+steady growth (e.g. sessions that are never closed) shows up.
+"""
+import linecache
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Optional
+
+
+class ProfilerBusy(RuntimeError):
+    """Raised when a profile is requested while another one is running."""
+
+
+@dataclass
+class StackProfile:
+    """Aggregated samples of one profiling run."""
+    duration_seconds: float
+    interval_seconds: float
+    samples: int = 0
+    stacks: Counter = field(default_factory=Counter)
+
+    def collapsed(self) -> str:
+        """Flamegraph input: one `frame;frame;... count` line per distinct stack."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top(self, limit: int = 20) -> list[dict]:
+        return [
+            {"stack": stack, "samples": count, "percent": round(100 * count / max(self.samples, 1), 2)}
+            for stack, count in self.stacks.most_common(limit)
+        ]
+
+
+# Innermost Python frames of threads blocked waiting for work (event loop
+# select, thread pool and queue listener gets, condition waits)
+IDLE_LEAVES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("thread.py", "_worker"),
+    ("queue.py", "get"),
+    ("handlers.py", "dequeue"),
+    ("socket.py", "accept"),
+}
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+class StackSampler:
+    """Time-bounded sampling profiler for all threads of this process."""
+
+    def __init__(self, max_depth: int = 128):
+        self.max_depth = max_depth
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def run(self, seconds: float, interval: float = 0.01, include_idle: bool = False) -> StackProfile:
+        """
+        Sample for `seconds` and return the aggregated stacks. Blocks the
+        calling thread, so call it from a worker thread in async code.
+
+        Idle threads (waiting in select/poll, queue gets, sleeps) dominate
+        wall-clock samples; they are skipped unless include_idle is set.
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("A profile is already running")
+        try:
+            profile = StackProfile(duration_seconds=seconds, interval_seconds=interval)
+            own_id = threading.get_ident()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_id:
+                        continue
+                    if not include_idle and self._is_idle(frame):
+                        continue
+                    stack = self._collapse(frame)
+                    name = names.get(thread_id)
+                    if name is None:
+                        names = {thread.ident: thread.name for thread in threading.enumerate()}
+                        name = names.get(thread_id, str(thread_id))
+                    profile.stacks[f"{name};{stack}"] += 1
+                    profile.samples += 1
+                time.sleep(interval)
+            return profile
+        finally:
+            self._lock.release()
+
+    def _collapse(self, frame) -> str:
+        labels = []
+        while frame is not None:
+            labels.append(_frame_label(frame))
+            frame = frame.f_back
+        labels.reverse()
+        if len(labels) > self.max_depth:
+            # Keep the root frames (what the thread is running) and the leaf frames (where the time goes)
+            roots = self.max_depth // 2
+            leaves = self.max_depth - roots
+            cut = len(labels) - self.max_depth
+            labels = labels[:roots] + [f"[{cut} frames truncated]"] + labels[-leaves:]
+        return ";".join(labels)
+
+    @staticmethod
+    def _is_idle(frame) -> bool:
+        code = frame.f_code
+        return (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAVES
+
+
+class MemoryTracker:
+    """tracemalloc snapshots of this process, each diffed against the previous one."""
+
+    # Allocations made by the diagnostics themselves
+    IGNORED = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, linecache.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._previous: Optional[tracemalloc.Snapshot] = None
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 25) -> None:
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+            self._previous = None
+
+    def stop(self) -> None:
+        with self._lock:
+            tracemalloc.stop()
+            self._previous = None
+
+    def snapshot(self, limit: int = 25, key_type: str = "lineno") -> dict:
+        """Take a snapshot, report the top allocation sites and the growth since the last one."""
+        if key_type not in ("lineno", "traceback", "filename"):
+            raise ValueError("key_type must be 'lineno', 'traceback' or 'filename'")
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                raise RuntimeError("tracemalloc is not tracing; start it first")
+            snapshot = tracemalloc.take_snapshot().filter_traces(self.IGNORED)
+            previous, self._previous = self._previous, snapshot
+            current, peak = tracemalloc.get_traced_memory()
+
+        result = {
+            "current_bytes": current,
+            "peak_bytes": peak,
+            "top": [self._stat(stat, key_type) for stat in snapshot.statistics(key_type)[:limit]],
+            "diff": None,
+        }
+        if previous is not None:
+            diff = snapshot.compare_to(previous, key_type)
+            result["diff"] = [self._stat(stat, key_type) for stat in diff[:limit]]
+        return result
+
+    @staticmethod
+    def _stat(stat, key_type: str) -> dict:
+        frames = stat.traceback.format() if key_type == "traceback" else [str(stat.traceback[0])]
+        entry = {"location": frames, "size_bytes": stat.size, "count": stat.count}
+        if hasattr(stat, "size_diff"):
+            entry["size_diff_bytes"] = stat.size_diff
+            entry["count_diff"] = stat.count_diff
+        return entry
+
+
+# Per-worker instances used by the admin router
+stack_sampler = StackSampler()
+memory_tracker = MemoryTracker()
@@ -0,0 +1,147 @@
+"""
+Per-request database query statistics.
+
+SQLAlchemy engine events count statements and time spent in the database for
+the request running in the current context. Statements slower than
+SLOW_QUERY_THRESHOLD_MS are logged with their parameters redacted, and each
+response gets a Server-Timing header (db time and query count, total app
+time) that browser dev tools and load tests can read.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Iterator, Optional
+
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Statement texts kept per request for diagnostics (query budget failures);
+# long-running requests such as batches would otherwise hold every one
+MAX_RECORDED_STATEMENTS = 50
+
+
+@dataclass
+class QueryStats:
+    """Statements executed on behalf of one request; only the first MAX_RECORDED_STATEMENTS texts are kept."""
+    count: int = 0
+    seconds: float = 0.0
+    statements: list[str] = field(default_factory=list)
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.count += 1
+        self.seconds += elapsed
+        if len(self.statements) < MAX_RECORDED_STATEMENTS:
+            self.statements.append(statement)
+
+    def merge(self, other: "QueryStats") -> None:
+        self.count += other.count
+        self.seconds += other.seconds
+        self.statements.extend(other.statements[:MAX_RECORDED_STATEMENTS - len(self.statements)])
+
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def get_query_stats() -> Optional[QueryStats]:
+    return _current_stats.get()
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    """Collect statements executed in this context (and threads/tasks started from it)."""
+    parent = _current_stats.get()
+    stats = QueryStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+        if parent is not None:
+            parent.merge(stats)
+
+
+def redact_parameters(parameters) -> object:
+    """Replace bound values with their type names."""
+    if isinstance(parameters, dict):
+        return {key: f"<{type(value).__name__}>" for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            # executemany: report the shape of the first row and the row count
+            return [redact_parameters(parameters[0]), f"... {len(parameters)} rows"]
+        return [f"<{type(value).__name__}>" for value in parameters]
+    return parameters
+
+
+def install_query_stats(engine) -> None:
+    """Register the counting and slow-query listeners on an engine."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("query_start")
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.record(statement, elapsed)
+
+        if elapsed * 1000 >= settings.SLOW_QUERY_THRESHOLD_MS:
+            logger.warning(
+                "Slow query (%.1f ms): %s | parameters: %s",
+                elapsed * 1000, " ".join(statement.split()), redact_parameters(parameters),
+            )
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        conn = exception_context.connection
+        starts = conn.info.get("query_start") if conn is not None else None
+        if starts:
+            starts.pop()
+
+
+class QueryStatsMiddleware:
+    """
+    ASGI middleware tracking queries per request and adding Server-Timing.
+
+    The header is sent with the response start, so work done while a body is
+    still streaming (e.g. usage logs of /chatbot/stream) is not included.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        parent = _current_stats.get()
+        stats = QueryStats()
+        token = _current_stats.set(stats)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and settings.SERVER_TIMING_ENABLED:
+                app_ms = (time.perf_counter() - start) * 1000
+                value = f'db;dur={stats.seconds * 1000:.1f};desc="{stats.count} queries", app;dur={app_ms:.1f}'
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", value.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_stats.reset(token)
+            if parent is not None:
+                parent.merge(stats)
+            logger.debug(
+                "%s %s: %d queries in %.1f ms",
+                scope["method"], scope.get("path"), stats.count, stats.seconds * 1000,
+            )
@@ -0,0 +1,190 @@
+"""
+Per-user request rate limiting shared across workers.
+
+Implements GCRA (generic cell rate algorithm), the sliding-window
+equivalent of a leaky bucket: each key stores one number, the theoretical
+arrival time (TAT) at which its bucket is empty again. A request is allowed
+if, after adding one emission interval (period / limit), the TAT is at most
+one period ahead of now. That gives a burst of `limit` requests followed by
+an even rate, with no fixed-window edges where 2x the limit gets through.
+
+The database store keeps the TAT in rate_limit_buckets and decides with a
+single upsert on an autocommit connection, so every check is one round trip
+and all workers share one bucket per user. The memory store is a per-process
+stand-in for tests and single-worker development.
+"""
+import logging
+import math
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional, Protocol
+
+from sqlalchemy import text
+
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Tolerance for floating-point drift when a burst exactly fills the window
+EPSILON = 1e-6
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+@dataclass(frozen=True)
+class Rate:
+    """`limit` requests per `period` seconds."""
+    limit: int
+    period: float
+
+    @property
+    def emission_interval(self) -> float:
+        return self.period / self.limit
+
+    @classmethod
+    def parse(cls, value: str) -> "Rate":
+        """Parse "10/minute", "100/hour" or "5/30 seconds"."""
+        match = re.fullmatch(r"\s*(\d+)\s*/\s*(\d+)?\s*(second|minute|hour|day)s?\s*", value)
+        if not match or int(match.group(1)) < 1:
+            raise ValueError(f"Invalid rate {value!r}, expected e.g. '10/minute'")
+        return cls(int(match.group(1)), int(match.group(2) or 1) * PERIODS[match.group(3)])
+
+
+@dataclass(frozen=True)
+class RateLimitResult:
+    """Outcome of one check, with what the X-RateLimit-* headers report."""
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_at: float  # Unix time at which the bucket is completely refilled
+    retry_after: float  # Seconds until the next request would be allowed (0 if allowed)
+
+    @property
+    def headers(self) -> dict[str, str]:
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(math.ceil(self.reset_at)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+
+class RateLimitStore(Protocol):
+    """Applies one GCRA step atomically and returns (tat, allowed)."""
+
+    def hit(self, key: str, rate: Rate, now: float, cost: int = 1) -> tuple[float, bool]:
+        ...
+
+
+def gcra_step(tat: Optional[float], rate: Rate, now: float, cost: int = 1) -> tuple[float, bool]:
+    """One GCRA decision for `cost` requests: the TAT to store and whether they are allowed."""
+    new_tat = max(tat if tat is not None else now, now) + cost * rate.emission_interval
+    if new_tat - now <= rate.period + EPSILON:
+        return new_tat, True
+    return tat, False
+
+
+class MemoryRateLimitStore:
+    """Per-process buckets; each worker enforces its own limit."""
+
+    def __init__(self):
+        self._tats: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._prune_at = 10_000
+
+    def hit(self, key: str, rate: Rate, now: float, cost: int = 1) -> tuple[float, bool]:
+        with self._lock:
+            tat, allowed = gcra_step(self._tats.get(key), rate, now, cost)
+            if allowed:
+                self._tats[key] = tat
+            # Drop buckets that have fully refilled so idle keys do not accumulate
+            if len(self._tats) > self._prune_at:
+                self._tats = {k: v for k, v in self._tats.items() if v > now}
+                self._prune_at = max(10_000, 2 * len(self._tats))
+            return tat, allowed
+
+
+class DatabaseRateLimitStore:
+    """Buckets in the rate_limit_buckets table, shared by all workers."""
+
+    # The row lock taken by ON CONFLICT serializes concurrent checks of one key
+    UPSERT = """
+        INSERT INTO rate_limit_buckets (key, tat, allowed)
+        VALUES (:key, :now + :interval, true)
+        ON CONFLICT (key) DO UPDATE SET
+            allowed = {greatest}(rate_limit_buckets.tat, :now) + :interval - :now <= :period + :epsilon,
+            tat = CASE
+                WHEN {greatest}(rate_limit_buckets.tat, :now) + :interval - :now <= :period + :epsilon
+                THEN {greatest}(rate_limit_buckets.tat, :now) + :interval
+                ELSE rate_limit_buckets.tat
+            END
+        RETURNING tat, allowed
+    """
+
+    def __init__(self, engine=None):
+        if engine is None:
+            from src.db.database import engine
+        self._engine = engine
+        # GREATEST on Postgres; SQLite's scalar MAX (local runs and benchmarks)
+        greatest = "MAX" if engine.dialect.name == "sqlite" else "GREATEST"
+        self._statement = text(self.UPSERT.format(greatest=greatest))
+
+    def hit(self, key: str, rate: Rate, now: float, cost: int = 1) -> tuple[float, bool]:
+        with self._engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            tat, allowed = conn.execute(self._statement, {
+                "key": key,
+                "now": now,
+                "interval": cost * rate.emission_interval,
+                "period": rate.period,
+                "epsilon": EPSILON,
+            }).one()
+        return float(tat), bool(allowed)
+
+
+class RateLimiter:
+    """GCRA limiter over a pluggable store."""
+
+    def __init__(self, store: RateLimitStore, clock: Callable[[], float] = time.time):
+        self.store = store
+        self._clock = clock
+
+    def check(self, key: str, rate: Rate, cost: int = 1) -> RateLimitResult:
+        """
+        Count `cost` requests against `key`. Blocking when the store is the database.
+
+        The cost is capped at the rate's limit: a request worth more than a
+        full burst empties the bucket instead of never fitting.
+        """
+        cost = max(1, min(cost, rate.limit))
+        now = self._clock()
+        tat, allowed = self.store.hit(key, rate, now, cost)
+        # Time until the bucket is empty again; each emission interval of it is one used request
+        backlog = max(0.0, tat - now)
+        if allowed:
+            remaining = int((rate.period - backlog + EPSILON) // rate.emission_interval)
+            retry_after = 0.0
+        else:
+            remaining = 0
+            retry_after = backlog - (rate.period - cost * rate.emission_interval)
+        return RateLimitResult(
+            allowed=allowed,
+            limit=rate.limit,
+            remaining=max(0, remaining),
+            reset_at=now + backlog,
+            retry_after=max(0.0, retry_after),
+        )
+
+
+def build_rate_limiter() -> RateLimiter:
+    """Build the limiter from RATE_LIMIT_BACKEND ("database" or "memory")."""
+    if settings.RATE_LIMIT_BACKEND == "database":
+        return RateLimiter(DatabaseRateLimitStore())
+    return RateLimiter(MemoryRateLimitStore())
+
+
+rate_limiter = build_rate_limiter()
+chatbot_rate = Rate.parse(settings.CHATBOT_RATE_LIMIT)
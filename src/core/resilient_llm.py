@@ -0,0 +1,395 @@
+"""
+Hedged, fallback-capable LLM calls.
+
+One slow provider response used to hold a chat turn for as long as the HTTP
+read timeout allowed. ResilientChatModel wraps the chatbot's chat model(s):
+
+- hedging: once an attempt has waited longer than the model's recent
+  LLM_HEDGE_PERCENTILE latency (time to first token when streamed), a
+  duplicate request is sent to the same model; whichever answers first is
+  used and the other is cancelled
+- fallbacks: when a model fails with a provider error (429, 5xx, timeout,
+  connection) or takes longer than LLM_ATTEMPT_TIMEOUT_SECONDS, the next of
+  LLM_FALLBACK_MODELS is tried
+- deadline: the whole call, fallbacks included, is bounded by
+  LLM_DEADLINE_SECONDS
+- circuit breakers: after LLM_BREAKER_FAILURES consecutive provider failures
+  a model is skipped for LLM_BREAKER_RESET_SECONDS, then one probe call is
+  let through to decide whether it closes again
+
+A streamed reply can only be hedged or moved to a fallback before its first
+token; after that the tokens are already on their way to the client.
+Latency windows and breakers are per worker, shared by every call.
+"""
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from src.core.adaptive_limiter import is_overload_error
+from src.core.config import settings
+from src.core.llm_client import build_chat_model
+from src.core.metrics import llm_circuit_state, llm_fallbacks, llm_hedged_requests
+
+logger = logging.getLogger(__name__)
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+CIRCUIT_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Inner calls run without the graph's callbacks: the wrapper reports one run
+# (tokens, usage, metrics) for whichever attempt wins
+_DETACHED = {"callbacks": []}
+
+
+class LLMUnavailable(Exception):
+    """Raised when every model's circuit is open."""
+
+
+def is_provider_failure(exc: BaseException) -> bool:
+    """Errors that say the model is unhealthy rather than the request being bad."""
+    return is_overload_error(exc) or "Connection" in type(exc).__name__
+
+
+class LatencyWindow:
+    """Recent latencies of one model, each with the time it was recorded."""
+
+    def __init__(self, size: int, clock: Callable[[], float] = time.monotonic):
+        self._samples: deque[tuple[float, float]] = deque(maxlen=size)
+        self._clock = clock
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append((self._clock(), seconds))
+
+    def recent(self, max_age: Optional[float] = None) -> list[float]:
+        """Latencies recorded within max_age seconds (all of them when None), oldest first."""
+        if max_age is None:
+            return [seconds for _, seconds in self._samples]
+        cutoff = self._clock() - max_age
+        return [seconds for recorded_at, seconds in self._samples if recorded_at >= cutoff]
+
+    def percentile(self, q: float, max_age: Optional[float] = None) -> Optional[float]:
+        """Nearest-rank percentile of the samples within max_age, or None without any."""
+        samples = self.recent(max_age)
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker of one model."""
+
+    def __init__(self, failure_threshold: int, reset_seconds: float, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+
+    def allow(self) -> bool:
+        """Whether a call may go to the model. An open circuit lets one probe through per reset period."""
+        if self.state == CLOSED:
+            return True
+        now = self._clock()
+        if now - self._opened_at >= self.reset_seconds:
+            # A probe that never reports back (cancelled) is retried after another reset period
+            self.state = HALF_OPEN
+            self._opened_at = now
+            return True
+        return False
+
+    @property
+    def rejecting(self) -> bool:
+        """Whether calls are refused right now (open and not yet due for a probe)."""
+        return self.state != CLOSED and self._clock() - self._opened_at < self.reset_seconds
+
+    def record_success(self) -> None:
+        if self.state != CLOSED:
+            logger.info("LLM circuit closed again")
+        self.state = CLOSED
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = OPEN
+            self._opened_at = self._clock()
+
+
+class ModelHealth:
+    """Latency windows (plain and streamed calls kept apart) and circuit breakers per model."""
+
+    def __init__(
+        self,
+        window_size: int,
+        failure_threshold: int,
+        reset_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.window_size = window_size
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._clock = clock
+        self._windows: dict[tuple[str, bool], LatencyWindow] = {}
+        self._breakers: dict[str, CircuitBreaker] = {}
+
+    def latency(self, model: str, streamed: bool = False) -> LatencyWindow:
+        window = self._windows.get((model, streamed))
+        if window is None:
+            window = self._windows.setdefault((model, streamed), LatencyWindow(self.window_size, self._clock))
+        return window
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        breaker = self._breakers.get(model)
+        if breaker is None:
+            breaker = self._breakers.setdefault(
+                model, CircuitBreaker(self.failure_threshold, self.reset_seconds, self._clock)
+            )
+        return breaker
+
+    def circuit_states(self) -> dict[tuple[str, ...], float]:
+        return {(model,): CIRCUIT_STATE_VALUES[breaker.state] for model, breaker in list(self._breakers.items())}
+
+    def stats(self) -> dict:
+        models = {}
+        for (model, streamed), window in list(self._windows.items()):
+            entry = models.setdefault(model, {})
+            entry["ttft_p50_seconds" if streamed else "p50_seconds"] = window.percentile(50)
+            entry["ttft_p95_seconds" if streamed else "p95_seconds"] = window.percentile(95)
+        for model, breaker in list(self._breakers.items()):
+            models.setdefault(model, {}).update(circuit=breaker.state, consecutive_failures=breaker.failures)
+        return models
+
+
+class ResilientChatModel(BaseChatModel):
+    """Chat model that hedges slow calls and falls back across `models` in order."""
+
+    models: list[BaseChatModel]
+    model_names: list[str]
+    health: Any
+    deadline_seconds: float = 60.0
+    attempt_timeout_seconds: float = 30.0
+    hedge_percentile: float = 95.0  # 0 disables hedging
+    hedge_min_delay_seconds: float = 0.5
+    hedge_min_samples: int = 20
+
+    @property
+    def _llm_type(self) -> str:
+        return "resilient"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"models": self.model_names}
+
+    def _get_ls_params(self, stop: Optional[list[str]] = None, **kwargs):
+        return self.models[0]._get_ls_params(stop=stop, **kwargs)
+
+    def _generate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        # Blocking callers get the fallbacks and breakers, without hedging or a deadline
+        error: Optional[BaseException] = None
+        for name, model in zip(self.model_names, self.models):
+            breaker = self.health.breaker(name)
+            if not breaker.allow():
+                llm_fallbacks.labels(name, "circuit_open").inc()
+                continue
+            try:
+                message = model.invoke(messages, stop=stop, config=_DETACHED, **kwargs)
+            except Exception as e:
+                if not is_provider_failure(e):
+                    raise
+                breaker.record_failure()
+                llm_fallbacks.labels(name, "error").inc()
+                error = e
+                continue
+            breaker.record_success()
+            return ChatResult(generations=[ChatGeneration(message=message)])
+        raise error or LLMUnavailable("Every LLM model's circuit is open")
+
+    async def _agenerate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        deadline = asyncio.get_running_loop().time() + self.deadline_seconds
+        message = await self._call(
+            lambda model: model.ainvoke(messages, stop=stop, config=_DETACHED, **kwargs), False, deadline
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline_seconds
+        stream, first = await self._call(
+            lambda model: _open_stream(model, messages, stop, kwargs), True, deadline, _close_stream
+        )
+        try:
+            yield ChatGenerationChunk(message=first)
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise TimeoutError(f"LLM call exceeded its {self.deadline_seconds}s deadline")
+                try:
+                    chunk = await asyncio.wait_for(anext(stream), remaining)
+                except StopAsyncIteration:
+                    return
+                yield ChatGenerationChunk(message=chunk)
+        finally:
+            await stream.aclose()
+
+    async def _call(
+        self,
+        start: Callable[[BaseChatModel], Awaitable],
+        streamed: bool,
+        deadline: float,
+        discard: Optional[Callable[[Any], Awaitable[None]]] = None,
+    ):
+        """Try the models in order until one answers within its attempt timeout and the deadline."""
+        loop = asyncio.get_running_loop()
+        error: Optional[BaseException] = None
+        for name, model in zip(self.model_names, self.models):
+            breaker = self.health.breaker(name)
+            if not breaker.allow():
+                llm_fallbacks.labels(name, "circuit_open").inc()
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise TimeoutError(f"LLM call exceeded its {self.deadline_seconds}s deadline") from error
+            try:
+                return await asyncio.wait_for(
+                    self._race(name, lambda: start(model), streamed, breaker, discard),
+                    min(remaining, self.attempt_timeout_seconds),
+                )
+            except Exception as e:
+                if not is_provider_failure(e):
+                    raise
+                breaker.record_failure()
+                reason = "timeout" if isinstance(e, TimeoutError) else "error"
+                llm_fallbacks.labels(name, reason).inc()
+                logger.warning("LLM %s failed (%s: %s), trying the next model", name, type(e).__name__, e)
+                error = e
+        raise error or LLMUnavailable("Every LLM model's circuit is open")
+
+    async def _race(
+        self,
+        name: str,
+        start: Callable[[], Awaitable],
+        streamed: bool,
+        breaker: CircuitBreaker,
+        discard: Optional[Callable[[Any], Awaitable[None]]],
+    ):
+        """One attempt on a model, hedged with a duplicate request once it runs slower than usual."""
+        loop = asyncio.get_running_loop()
+        window = self.health.latency(name, streamed)
+        hedge_at = self._hedge_delay(window)
+        began = loop.time()
+        tasks: dict[asyncio.Future, float] = {asyncio.ensure_future(start()): began}
+        hedged = False
+        try:
+            while True:
+                timeout = None
+                if hedge_at is not None and not hedged:
+                    timeout = max(0.0, began + hedge_at - loop.time())
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    # Do not pile duplicates onto a model that is only being probed
+                    if breaker.state == CLOSED:
+                        tasks[asyncio.ensure_future(start())] = loop.time()
+                    continue
+                error = None
+                for task in done:
+                    started = tasks.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        window.record(loop.time() - started)
+                        breaker.record_success()
+                        if hedged:
+                            llm_hedged_requests.labels(name, "hedge" if started > began else "primary").inc()
+                        return task.result()
+                if not tasks:
+                    if hedged:
+                        llm_hedged_requests.labels(name, "none").inc()
+                    raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            if discard is not None:
+                for result in results:
+                    if not isinstance(result, BaseException):
+                        await discard(result)
+
+    def _hedge_delay(self, window: LatencyWindow) -> Optional[float]:
+        if self.hedge_percentile <= 0 or len(window) < self.hedge_min_samples:
+            return None
+        observed = window.percentile(self.hedge_percentile)
+        return max(self.hedge_min_delay_seconds, observed or 0.0)
+
+
+async def _open_stream(model: BaseChatModel, messages, stop, kwargs) -> tuple[AsyncIterator[AIMessageChunk], AIMessageChunk]:
+    """Start a streamed call and wait for its first chunk."""
+    stream = model.astream(messages, stop=stop, config=_DETACHED, **kwargs)
+    try:
+        first = await anext(stream)
+    except StopAsyncIteration:
+        await stream.aclose()
+        raise RuntimeError("LLM stream ended without output")
+    except BaseException:
+        await stream.aclose()
+        raise
+    return stream, first
+
+
+async def _close_stream(opened: tuple[AsyncIterator[AIMessageChunk], AIMessageChunk]) -> None:
+    await opened[0].aclose()
+
+
+def build_resilient_chat_model(
+    model: Optional[str] = None,
+    temperature: Optional[float] = None,
+    fallbacks: Optional[list[str]] = None,
+    health: Optional[ModelHealth] = None,
+    **kwargs,
+) -> ResilientChatModel:
+    """
+    Wrap the chat model and its fallbacks (defaults to LLM_FALLBACK_MODELS).
+
+    Args:
+        model: Primary model identifier (defaults to LLM_MODEL)
+        temperature: Sampling temperature for every model
+        fallbacks: Models tried in order when the previous one fails
+        health: Latency windows and breakers (defaults to the worker's)
+        **kwargs: Extra arguments for build_chat_model
+
+    Returns:
+        ResilientChatModel configured from Settings
+    """
+    names = []
+    for name in [model or settings.LLM_MODEL, *(settings.LLM_FALLBACK_MODELS if fallbacks is None else fallbacks)]:
+        if name not in names:
+            names.append(name)
+    kwargs.setdefault("max_retries", settings.LLM_MAX_RETRIES)
+    return ResilientChatModel(
+        models=[build_chat_model(name, temperature=temperature, **kwargs) for name in names],
+        model_names=names,
+        health=health or model_health,
+        deadline_seconds=settings.LLM_DEADLINE_SECONDS,
+        attempt_timeout_seconds=settings.LLM_ATTEMPT_TIMEOUT_SECONDS,
+        hedge_percentile=settings.LLM_HEDGE_PERCENTILE,
+        hedge_min_delay_seconds=settings.LLM_HEDGE_MIN_DELAY_SECONDS,
+        hedge_min_samples=settings.LLM_HEDGE_MIN_SAMPLES,
+    )
+
+
+model_health = ModelHealth(
+    window_size=settings.LLM_LATENCY_WINDOW,
+    failure_threshold=settings.LLM_BREAKER_FAILURES,
+    reset_seconds=settings.LLM_BREAKER_RESET_SECONDS,
+)
+llm_circuit_state.set_callback(model_health.circuit_states)
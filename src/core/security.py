@@ -26,7 +26,7 @@ def hash_password(password: str) -> str:
         Lower rounds = faster but less secure.
         Recommended: 10 for dev, 12-14 for production.
     """
-    logger.debug(f"Hashing password with {BCRYPT_ROUNDS} rounds")
+    logger.debug("Hashing password with %d rounds", BCRYPT_ROUNDS)
     password_bytes = password.encode('utf-8')
     salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
     hashed = bcrypt.hashpw(password_bytes, salt)
@@ -53,7 +53,7 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     password_bytes = plain_password.encode('utf-8')
     hashed_bytes = hashed_password.encode('utf-8')
     result = bcrypt.checkpw(password_bytes, hashed_bytes)
-    logger.debug(f"Password verification result: {result}")
+    logger.debug("Password verification result: %s", result)
     return result
 
 
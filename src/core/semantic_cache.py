@@ -0,0 +1,238 @@
+"""
+Semantic response cache.
+
+Embeds the user's question and looks up the most similar previously answered
+question in an in-memory NumPy index (cosine similarity, top-1). Answers are
+reused when the similarity clears SEMANTIC_CACHE_THRESHOLD. Entries are
+evicted least-recently-used once the index exceeds its memory budget.
+"""
+import hashlib
+import logging
+import re
+import time
+from collections import deque
+from typing import Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.core.config import settings
+from src.core.llm_cache import CachedResponse
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+class HashingEmbedder(Embeddings):
+    """
+    Deterministic local embedder based on the hashing trick.
+
+    Words and word bigrams are hashed into a fixed number of signed buckets,
+    so texts sharing vocabulary get a high cosine similarity. Needs no network
+    or model download, which makes it suitable for tests and as a cheap default.
+    """
+
+    def __init__(self, dimensions: int = 256):
+        self.dimensions = dimensions
+
+    def _embed(self, text: str) -> list[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        tokens = _TOKEN_PATTERN.findall(text.lower())
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            sign = 1.0 if value & 1 else -1.0
+            vector[(value >> 1) % self.dimensions] += sign
+        return vector.tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed(text)
+
+
+class VectorIndex:
+    """
+    In-memory cosine-similarity index with LRU eviction by memory budget.
+
+    Vectors are stored L2-normalized in one contiguous float32 matrix so a
+    lookup is a single matrix-vector product.
+    """
+
+    def __init__(self, dimensions: int, memory_budget_bytes: int, initial_capacity: int = 64):
+        self.dimensions = dimensions
+        self.memory_budget_bytes = memory_budget_bytes
+        self._vectors = np.zeros((initial_capacity, dimensions), dtype=np.float32)
+        self._last_used = np.zeros(initial_capacity, dtype=np.int64)
+        self._values: list[CachedResponse] = []
+        self._sizes: list[int] = []
+        self._bytes = 0
+        self._tick = 0
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    @property
+    def memory_bytes(self) -> int:
+        return self._bytes
+
+    def search(self, vector) -> Optional[tuple[CachedResponse, float]]:
+        """Return the most similar entry and its cosine similarity."""
+        if not self._values:
+            return None
+        query = _normalize(vector)
+        if query is None:
+            return None
+        scores = self._vectors[:len(self._values)] @ query
+        index = int(np.argmax(scores))
+        self._touch(index)
+        return self._values[index], float(scores[index])
+
+    def add(self, vector, value: CachedResponse) -> None:
+        normalized = _normalize(vector)
+        if normalized is None:
+            return
+        size = self._entry_size(value)
+        if size > self.memory_budget_bytes:
+            return
+        while self._values and self._bytes + size > self.memory_budget_bytes:
+            self._evict_lru()
+
+        index = len(self._values)
+        if index == self._vectors.shape[0]:
+            self._grow()
+        self._vectors[index] = normalized
+        self._values.append(value)
+        self._sizes.append(size)
+        self._bytes += size
+        self._touch(index)
+
+    def _entry_size(self, value: CachedResponse) -> int:
+        # Vector row plus the cached text; object overhead is ignored
+        return self.dimensions * 4 + len(value.content.encode("utf-8"))
+
+    def _touch(self, index: int) -> None:
+        self._tick += 1
+        self._last_used[index] = self._tick
+
+    def _evict_lru(self) -> None:
+        count = len(self._values)
+        victim = int(np.argmin(self._last_used[:count]))
+        last = count - 1
+        self._bytes -= self._sizes[victim]
+        if victim != last:
+            # Keep storage dense by moving the last entry into the hole
+            self._vectors[victim] = self._vectors[last]
+            self._last_used[victim] = self._last_used[last]
+            self._values[victim] = self._values[last]
+            self._sizes[victim] = self._sizes[last]
+        self._values.pop()
+        self._sizes.pop()
+
+    def _grow(self) -> None:
+        capacity = self._vectors.shape[0] * 2
+        vectors = np.zeros((capacity, self.dimensions), dtype=np.float32)
+        vectors[:self._vectors.shape[0]] = self._vectors
+        last_used = np.zeros(capacity, dtype=np.int64)
+        last_used[:self._last_used.shape[0]] = self._last_used
+        self._vectors, self._last_used = vectors, last_used
+
+
+def _normalize(vector) -> Optional[np.ndarray]:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(array))
+    if norm == 0.0:
+        return None
+    return array / norm
+
+
+class SemanticCache:
+    """Embedder + vector index with hit-rate and lookup-latency accounting."""
+
+    def __init__(self, embedder: Embeddings, index: VectorIndex, threshold: float):
+        self.embedder = embedder
+        self.index = index
+        self.threshold = threshold
+
+        self._lookups = 0
+        self._hits = 0
+        self._lookup_seconds_total = 0.0
+        self._recent_lookup_seconds: deque[float] = deque(maxlen=1000)
+        self._miss_path_seconds_total = 0.0
+        self._miss_path_count = 0
+
+    async def embed(self, text: str) -> list[float]:
+        return await self.embedder.aembed_query(text)
+
+    async def lookup(self, text: str) -> tuple[Optional[CachedResponse], list[float]]:
+        """
+        Find a cached answer for a similar question.
+
+        Returns:
+            (cached response or None, query embedding for a later store)
+        """
+        start = time.perf_counter()
+        vector = await self.embed(text)
+        match = self.index.search(vector)
+        elapsed = time.perf_counter() - start
+
+        self._lookups += 1
+        self._lookup_seconds_total += elapsed
+        self._recent_lookup_seconds.append(elapsed)
+
+        if match is not None and match[1] >= self.threshold:
+            self._hits += 1
+            logger.debug("Semantic cache hit (similarity %.3f)", match[1])
+            return match[0], vector
+        return None, vector
+
+    def store(self, vector: list[float], value: CachedResponse, miss_path_seconds: Optional[float] = None) -> None:
+        """Index an answer; miss_path_seconds is the time the uncached path took."""
+        self.index.add(vector, value)
+        if miss_path_seconds is not None:
+            self._miss_path_seconds_total += miss_path_seconds
+            self._miss_path_count += 1
+
+    def stats(self) -> dict:
+        recent = sorted(self._recent_lookup_seconds)
+        avg_miss_path = self._miss_path_seconds_total / self._miss_path_count if self._miss_path_count else 0.0
+        return {
+            "lookups": self._lookups,
+            "hits": self._hits,
+            "hit_rate": self._hits / self._lookups if self._lookups else 0.0,
+            "entries": len(self.index),
+            "memory_bytes": self.index.memory_bytes,
+            "lookup_seconds_total": self._lookup_seconds_total,
+            "lookup_seconds_p95": recent[int(len(recent) * 0.95)] if recent else 0.0,
+            "avg_miss_path_seconds": avg_miss_path,
+            # Time hits saved on the uncached path minus time spent on every lookup
+            "estimated_net_seconds_saved": self._hits * avg_miss_path - self._lookup_seconds_total,
+        }
+
+
+def build_embedder() -> Embeddings:
+    """Build the embedder named by SEMANTIC_CACHE_EMBEDDER."""
+    name = settings.SEMANTIC_CACHE_EMBEDDER
+    if name == "hashing":
+        return HashingEmbedder(settings.SEMANTIC_CACHE_DIMENSIONS)
+    if name.startswith("openai:"):
+        from langchain_openai import OpenAIEmbeddings
+        return OpenAIEmbeddings(model=name.split(":", 1)[1], dimensions=settings.SEMANTIC_CACHE_DIMENSIONS)
+    raise ValueError(f"Unknown SEMANTIC_CACHE_EMBEDDER: {name}")
+
+
+def build_semantic_cache() -> Optional[SemanticCache]:
+    """Build the semantic cache from settings, or None if it is disabled."""
+    if not settings.SEMANTIC_CACHE_ENABLED:
+        return None
+    return SemanticCache(
+        embedder=build_embedder(),
+        index=VectorIndex(settings.SEMANTIC_CACHE_DIMENSIONS, settings.SEMANTIC_CACHE_MEMORY_BUDGET_MB * 1024 * 1024),
+        threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+    )
+
+
+semantic_cache = build_semantic_cache()
@@ -0,0 +1,129 @@
+"""
+Production server settings.
+
+gunicorn.conf.py runs the app under gunicorn with uvicorn workers; this
+module holds what that file and the workers share: the worker count, the
+event loop and HTTP parser, and the database pool sizes each worker gets
+when a total connection budget is configured. Without gunicorn (Windows,
+minimal images), `python -m src.core.server` starts uvicorn's own process
+manager with the same settings, minus preloading.
+"""
+import importlib.util
+import os
+from dataclasses import dataclass
+
+from src.core.config import settings
+
+
+@dataclass(frozen=True)
+class PoolSizes:
+    """Connections one worker may open."""
+    pool_size: int
+    max_overflow: int
+    checkpoint_max_size: int
+
+    @property
+    def total(self) -> int:
+        return self.pool_size + self.max_overflow + self.checkpoint_max_size
+
+
+def resolve_workers() -> int:
+    """WEB_CONCURRENCY, or one worker per CPU (async workers do not block on I/O)."""
+    return settings.WEB_CONCURRENCY or os.cpu_count() or 1
+
+
+def resolve_loop() -> str:
+    if settings.SERVER_LOOP == "auto":
+        return "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    return settings.SERVER_LOOP
+
+
+def resolve_http() -> str:
+    if settings.SERVER_HTTP == "auto":
+        return "httptools" if importlib.util.find_spec("httptools") else "h11"
+    return settings.SERVER_HTTP
+
+
+def db_pool_sizes(workers: int | None = None) -> PoolSizes:
+    """
+    Pool sizes for one worker.
+
+    Without DB_MAX_CONNECTIONS, DB_POOL_SIZE/DB_MAX_OVERFLOW and
+    CHECKPOINT_POOL_MAX_SIZE apply as configured, so N workers open up to N
+    times their sum. With it, the budget is split evenly across workers; a
+    third of each share goes to the checkpointer pool (none with the memory
+    checkpointer) and the rest to SQLAlchemy, half kept open and half as
+    overflow.
+
+    `workers` defaults to WEB_CONCURRENCY, which the launchers set to the
+    resolved worker count; a lone uvicorn process counts as one worker.
+    """
+    if settings.DB_MAX_CONNECTIONS <= 0:
+        return PoolSizes(settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW, settings.CHECKPOINT_POOL_MAX_SIZE)
+
+    workers = workers or settings.WEB_CONCURRENCY or 1
+    per_worker = settings.DB_MAX_CONNECTIONS // workers
+    uses_checkpoint_pool = settings.CHECKPOINT_BACKEND == "postgres"
+    minimum = 2 if uses_checkpoint_pool else 1
+    if per_worker < minimum:
+        raise ValueError(
+            f"DB_MAX_CONNECTIONS={settings.DB_MAX_CONNECTIONS} leaves {per_worker} connections for each of "
+            f"{workers} workers; at least {minimum} are needed. Raise it or lower WEB_CONCURRENCY."
+        )
+
+    checkpoint_max = max(1, per_worker // 3) if uses_checkpoint_pool else 0
+    sqlalchemy_total = per_worker - checkpoint_max
+    pool_size = max(1, sqlalchemy_total // 2)
+    return PoolSizes(pool_size, sqlalchemy_total - pool_size, checkpoint_max)
+
+
+def request_graceful_timeout() -> float:
+    """
+    How long uvicorn waits for open connections on shutdown.
+
+    SERVER_GRACEFUL_TIMEOUT_SECONDS bounds the whole shutdown: gunicorn kills
+    a worker once it passes. uvicorn first waits for open requests and
+    streams, and only then runs the lifespan drain (SHUTDOWN_DRAIN_SECONDS),
+    so the requests get what the drain leaves over.
+    """
+    remaining = settings.SERVER_GRACEFUL_TIMEOUT_SECONDS - settings.SHUTDOWN_DRAIN_SECONDS
+    if remaining < 1:
+        raise ValueError(
+            f"SHUTDOWN_DRAIN_SECONDS={settings.SHUTDOWN_DRAIN_SECONDS} leaves no time for in-flight requests within "
+            f"SERVER_GRACEFUL_TIMEOUT_SECONDS={settings.SERVER_GRACEFUL_TIMEOUT_SECONDS}; lower it or raise the latter."
+        )
+    return remaining
+
+
+def use_worker_count(workers: int) -> None:
+    """Publish the worker count to this process and the workers it starts."""
+    settings.WEB_CONCURRENCY = workers
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+
+
+def main() -> None:
+    """Multi-process uvicorn with the production settings (no preloading)."""
+    import uvicorn
+
+    workers = resolve_workers()
+    use_worker_count(workers)
+    db_pool_sizes()  # fail before starting workers if the budget is too small
+    graceful_timeout = request_graceful_timeout()
+    uvicorn.run(
+        "src.main:app",
+        host=settings.SERVER_HOST,
+        port=settings.SERVER_PORT,
+        workers=workers,
+        loop=resolve_loop(),
+        http=resolve_http(),
+        backlog=settings.SERVER_BACKLOG,
+        timeout_keep_alive=settings.SERVER_KEEPALIVE_SECONDS,
+        timeout_graceful_shutdown=graceful_timeout,
+        limit_max_requests=settings.SERVER_MAX_REQUESTS or None,
+        forwarded_allow_ips=settings.SERVER_FORWARDED_ALLOW_IPS,
+        proxy_headers=True,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""
+Per-thread turn serialization.
+
+Every chat turn of a user runs on the same LangGraph thread. Two turns
+running at once both load the same parent checkpoint and fork the history,
+so turns on a thread are serialized here. A second turn is, depending on
+THREAD_TURN_POLICY:
+
+- "queue": run after the current one (waiting at most THREAD_LOCK_WAIT_SECONDS)
+- "reject": refused with 409 and Retry-After
+- "merge": folded together with any other turns that arrive meanwhile into
+  one follow-up turn, whose reply is returned to all of them
+
+Locks are per worker (an asyncio.Lock per thread, removed once nobody holds
+or waits for it). With THREAD_LOCK_BACKEND=postgres a session advisory lock
+is taken as well, so turns are serialized across workers and hosts.
+"""
+import asyncio
+import logging
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from fastapi import Request, status
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+
+from src.core.config import settings
+from src.core.metrics import rate_limit_rejections
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+POLICIES = ("queue", "reject", "merge")
+ADVISORY_POLL_SECONDS = 0.05
+
+
+class ThreadBusy(Exception):
+    """Raised when a turn cannot start because another turn holds the thread."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdvisoryLocks:
+    """
+    Postgres session advisory locks keyed by thread id. Each held lock keeps
+    one pooled connection checked out for the duration of the turn; if the
+    worker dies, the connection closes and Postgres releases the lock.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def try_acquire(self, thread_id: str):
+        """A connection holding the lock, or None if another session has it. Blocking."""
+        connection = self.engine.connect()
+        try:
+            acquired = connection.execute(
+                text("SELECT pg_try_advisory_lock(hashtextextended(:key, 0))"), {"key": thread_id}
+            ).scalar()
+            # Session locks live outside transactions; end the implicit one so the connection is not left idle in it
+            connection.commit()
+        except Exception:
+            connection.close()
+            raise
+        if not acquired:
+            connection.close()
+            return None
+        return connection
+
+    def release(self, connection, thread_id: str) -> None:
+        """Blocking."""
+        try:
+            connection.execute(text("SELECT pg_advisory_unlock(hashtextextended(:key, 0))"), {"key": thread_id})
+            connection.commit()
+        finally:
+            connection.close()
+
+
+@dataclass
+class _PendingTurn:
+    """Turns merged into one follow-up run (merge policy)."""
+    messages: list[str]
+    result: asyncio.Future
+
+
+@dataclass
+class _ThreadEntry:
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    users: int = 0  # Holders plus waiters; the entry is dropped when it reaches zero
+    pending: Optional[_PendingTurn] = None
+
+
+class TurnLease:
+    """Handle for a held thread. Releasing it more than once is a no-op."""
+
+    def __init__(self, locks: "ThreadLocks", thread_id: str, connection=None):
+        self._locks = locks
+        self._thread_id = thread_id
+        self._connection = connection
+        self._released = False
+
+    async def release(self) -> None:
+        if self._released:
+            return
+        self._released = True
+        try:
+            if self._connection is not None:
+                await asyncio.to_thread(self._locks.advisory.release, self._connection, self._thread_id)
+        except Exception as e:
+            logger.error("Releasing the advisory lock of %s failed: %s", self._thread_id, e)
+        finally:
+            self._locks._release(self._thread_id)
+
+
+class ThreadLocks:
+    """Serializes turns per conversation thread."""
+
+    def __init__(self, policy: str, wait_seconds: float, advisory: Optional[AdvisoryLocks] = None):
+        if policy not in POLICIES:
+            raise ValueError(f"THREAD_TURN_POLICY must be one of {POLICIES}, got {policy!r}")
+        self.policy = policy
+        self.wait_seconds = wait_seconds
+        self.advisory = advisory
+        self._entries: dict[str, _ThreadEntry] = {}
+        self._merged = 0
+        self._rejected = 0
+
+    @property
+    def threads(self) -> int:
+        """Threads with a turn running or waiting in this worker."""
+        return len(self._entries)
+
+    async def acquire(self, thread_id: str, policy: Optional[str] = None) -> TurnLease:
+        """
+        Wait for the thread under `policy` ("merge" waits like "queue").
+
+        Raises:
+            ThreadBusy: If the policy rejects the turn or the wait times out
+        """
+        reject = (policy or self.policy) == "reject"
+        deadline = time.monotonic() + self.wait_seconds
+        entry = self._entries.setdefault(thread_id, _ThreadEntry())
+        entry.users += 1
+        try:
+            if reject and entry.lock.locked():
+                raise self._busy(thread_id)
+            try:
+                await asyncio.wait_for(entry.lock.acquire(), timeout=self.wait_seconds)
+            except asyncio.TimeoutError:
+                raise self._busy(thread_id)
+        except BaseException:
+            self._drop(thread_id, entry)
+            raise
+
+        connection = None
+        if self.advisory is not None:
+            try:
+                connection = await self._acquire_advisory(thread_id, None if reject else deadline)
+            except BaseException:
+                entry.lock.release()
+                self._drop(thread_id, entry)
+                raise
+        return TurnLease(self, thread_id, connection)
+
+    async def run_turn(self, thread_id: str, message: str, run: Callable[[list[str]], Awaitable[T]]) -> T:
+        """
+        Run `run(messages)` holding the thread. Under the merge policy, turns
+        that arrive while the thread is busy share one follow-up run.
+        """
+        if self.policy != "merge":
+            lease = await self.acquire(thread_id)
+            try:
+                return await run([message])
+            finally:
+                await lease.release()
+
+        entry = self._entries.get(thread_id)
+        pending = entry.pending if entry is not None else None
+        if pending is not None:
+            # A follow-up turn is already waiting: add this message to it and share its reply
+            pending.messages.append(message)
+            self._merged += 1
+            return await asyncio.shield(pending.result)
+
+        entry = self._entries.setdefault(thread_id, _ThreadEntry())
+        pending = _PendingTurn(messages=[message], result=asyncio.get_running_loop().create_future())
+        if entry.lock.locked():
+            entry.pending = pending
+        try:
+            lease = await self.acquire(thread_id)
+        except BaseException as e:
+            self._settle(entry, pending, error=e)
+            raise
+        # Nothing can join once the run starts
+        if entry.pending is pending:
+            entry.pending = None
+        try:
+            result = await run(pending.messages)
+        except BaseException as e:
+            self._settle(entry, pending, error=e)
+            raise
+        else:
+            self._settle(entry, pending, result=result)
+            return result
+        finally:
+            await lease.release()
+
+    def stats(self) -> dict:
+        return {
+            "policy": self.policy,
+            "backend": "postgres" if self.advisory is not None else "memory",
+            "threads": self.threads,
+            "merged_total": self._merged,
+            "rejected_total": self._rejected,
+        }
+
+    async def _acquire_advisory(self, thread_id: str, deadline: Optional[float]):
+        # Polled with try-lock so neither a worker thread nor the event loop blocks on the database
+        while True:
+            connection = await asyncio.to_thread(self.advisory.try_acquire, thread_id)
+            if connection is not None:
+                return connection
+            if deadline is None or time.monotonic() >= deadline:
+                raise self._busy(thread_id)
+            await asyncio.sleep(ADVISORY_POLL_SECONDS)
+
+    def _busy(self, thread_id: str) -> ThreadBusy:
+        self._rejected += 1
+        logger.info("Turn rejected: thread %s is busy", thread_id)
+        return ThreadBusy(
+            "Another message in this conversation is still being answered, please retry shortly",
+            max(1, math.ceil(min(self.wait_seconds, 5))),
+        )
+
+    def _settle(self, entry: _ThreadEntry, pending: _PendingTurn, result=None, error: Optional[BaseException] = None) -> None:
+        if entry.pending is pending:
+            entry.pending = None
+        if pending.result.done():
+            return
+        if isinstance(error, asyncio.CancelledError):
+            pending.result.cancel()
+        elif error is not None:
+            pending.result.set_exception(error)
+            # Merged callers may all be gone; do not warn about an unretrieved exception
+            pending.result.exception()
+        else:
+            pending.result.set_result(result)
+
+    def _release(self, thread_id: str) -> None:
+        entry = self._entries.get(thread_id)
+        if entry is None:
+            return
+        entry.lock.release()
+        self._drop(thread_id, entry)
+
+    def _drop(self, thread_id: str, entry: _ThreadEntry) -> None:
+        entry.users -= 1
+        if entry.users <= 0 and self._entries.get(thread_id) is entry:
+            del self._entries[thread_id]
+
+
+async def thread_busy_handler(request: Request, exc: ThreadBusy) -> JSONResponse:
+    """Exception handler answering turns on a busy thread with 409 and Retry-After."""
+    rate_limit_rejections.labels("thread_busy").inc()
+    return JSONResponse(
+        status_code=status.HTTP_409_CONFLICT,
+        content={"detail": exc.reason},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+def build_thread_locks() -> ThreadLocks:
+    advisory = None
+    if settings.THREAD_LOCK_BACKEND == "postgres":
+        from src.db.database import engine
+
+        if engine.dialect.name == "postgresql":
+            advisory = AdvisoryLocks(engine)
+        else:
+            logger.warning("THREAD_LOCK_BACKEND=postgres needs PostgreSQL; serializing turns per worker only")
+    return ThreadLocks(settings.THREAD_TURN_POLICY, settings.THREAD_LOCK_WAIT_SECONDS, advisory)
+
+
+thread_locks = build_thread_locks()
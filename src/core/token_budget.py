@@ -0,0 +1,98 @@
+"""
+Token budgets per plan.
+
+A plan may cap prompt (input), completion (output) and total tokens per
+query window on top of its query count. Usage is read from the hourly
+usage_counters, so a budget check is one small aggregate query. Exhausted
+budgets are rejected before the graph runs; the chatbot node additionally
+estimates the prompt of each turn and rejects it before calling the LLM when
+the estimate would overrun what is left.
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import Request, status
+from fastapi.responses import JSONResponse
+
+from src.core.metrics import rate_limit_rejections
+
+KINDS = ("input", "output", "total")
+
+
+@dataclass(frozen=True)
+class TokenBudget:
+    """Token limits of a plan and what the user used in the current window."""
+    window_hours: int
+    input_limit: Optional[int] = None
+    output_limit: Optional[int] = None
+    total_limit: Optional[int] = None
+    input_used: int = 0
+    output_used: int = 0
+    total_used: int = 0
+
+    @property
+    def limited(self) -> bool:
+        return any(self.limit(kind) is not None for kind in KINDS)
+
+    def limit(self, kind: str) -> Optional[int]:
+        return getattr(self, f"{kind}_limit")
+
+    def used(self, kind: str) -> int:
+        return getattr(self, f"{kind}_used")
+
+    def remaining(self, kind: str) -> Optional[int]:
+        """Tokens left of one kind, or None if unlimited."""
+        limit = self.limit(kind)
+        return None if limit is None else max(0, limit - self.used(kind))
+
+    def exhausted(self) -> list[str]:
+        """Kinds with nothing left."""
+        return [kind for kind in KINDS if self.remaining(kind) == 0]
+
+    def check_prompt(self, estimated_input_tokens: int) -> None:
+        """
+        Reject a turn whose estimated prompt does not fit the input or total budget.
+
+        Raises:
+            TokenBudgetExceeded: If the estimate exceeds what is left
+        """
+        for kind in ("input", "total"):
+            remaining = self.remaining(kind)
+            if remaining is not None and estimated_input_tokens > remaining:
+                raise TokenBudgetExceeded(self, kind, estimated_input_tokens)
+
+    def as_dict(self) -> dict:
+        return {
+            "window_hours": self.window_hours,
+            **{
+                kind: {"used": self.used(kind), "limit": self.limit(kind), "remaining": self.remaining(kind)}
+                for kind in KINDS
+            },
+        }
+
+
+class TokenBudgetExceeded(Exception):
+    """Raised when a turn would exceed the plan's token budget."""
+
+    def __init__(self, budget: TokenBudget, kind: str, requested: int = 0):
+        self.budget = budget
+        self.kind = kind
+        self.requested = requested
+        if requested:
+            reason = (
+                f"This message needs about {requested} {kind} tokens but only {budget.remaining(kind)} "
+                f"of {budget.limit(kind)} are left in the last {budget.window_hours} hours."
+            )
+        else:
+            reason = f"Token budget exceeded: {budget.used(kind)} of {budget.limit(kind)} {kind} tokens used in the last {budget.window_hours} hours."
+        super().__init__(reason)
+        self.reason = reason
+
+
+async def token_budget_exceeded_handler(request: Request, exc: TokenBudgetExceeded) -> JSONResponse:
+    """Exception handler answering over-budget turns with 429."""
+    rate_limit_rejections.labels("token_budget").inc()
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        content={"detail": {"message": exc.reason, "limit": exc.kind, "tokens": exc.budget.as_dict()}},
+    )
@@ -0,0 +1,511 @@
+"""
+Request tracing.
+
+Lightweight OpenTelemetry-style spans for one chat turn: the HTTP request,
+each auth/rate-limit dependency, the LangGraph run and its nodes and LLM
+calls, checkpointer reads/writes and every SQL statement. The active span
+lives in a contextvar, so it follows the request into threadpool
+dependencies, asyncio.to_thread calls and graph tasks. Finished spans go to
+an exporter: in-memory for tests, JSON lines on disk otherwise. The current
+trace id is added to every log record.
+
+Incoming W3C `traceparent` headers are honoured and the trace id is returned
+in the X-Trace-Id response header.
+"""
+import functools
+import inspect
+import json
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Iterator, Optional, Sequence
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langgraph.checkpoint.base import BaseCheckpointSaver
+
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+TRACE_ID_HEADER = "X-Trace-Id"
+_TRACEPARENT = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+_HIDDEN_TAG = "langsmith:hidden"
+MAX_STATEMENT_LENGTH = 500
+
+
+@dataclass
+class Span:
+    """A timed operation within a trace."""
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    start_ns: int = field(default_factory=time.time_ns)
+    end_ns: Optional[int] = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+    status: str = "ok"
+    error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_exception(self, exc: BaseException) -> None:
+        self.status = "error"
+        self.error = f"{type(exc).__name__}: {exc}"
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        if self.end_ns is None:
+            return None
+        return (self.end_ns - self.start_ns) / 1_000_000
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": self.duration_ms,
+            "attributes": self.attributes,
+            "status": self.status,
+            "error": self.error,
+        }
+
+
+class _NoopSpan(Span):
+    """Returned when tracing is disabled; attribute writes are dropped."""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def record_exception(self, exc: BaseException) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan(name="noop", trace_id="0" * 32, span_id="0" * 16)
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def get_current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def _new_trace_id() -> str:
+    return secrets.token_hex(16)
+
+
+def _new_span_id() -> str:
+    return secrets.token_hex(8)
+
+
+class InMemorySpanExporter:
+    """Keeps finished spans in a list (for tests)."""
+
+    def __init__(self):
+        self.spans: list[Span] = []
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.spans.clear()
+
+    def by_name(self, prefix: str) -> list[Span]:
+        return [span for span in self.spans if span.name.startswith(prefix)]
+
+    def flush(self) -> None:
+        pass
+
+
+class FileSpanExporter:
+    """Appends finished spans to a JSON lines file."""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def flush(self) -> None:
+        with self._lock:
+            self._file.flush()
+
+
+class Tracer:
+    """Creates spans and hands finished ones to the exporters."""
+
+    def __init__(self, exporters: Sequence = (), enabled: bool = True):
+        self.exporters = list(exporters)
+        self.enabled = enabled
+
+    def start_span(self, name: str, parent: Optional[Span] = None, trace_id: Optional[str] = None,
+                   parent_id: Optional[str] = None, attributes: Optional[dict] = None) -> Span:
+        """Start a span without making it current; the caller must end it."""
+        if parent is None and trace_id is None:
+            parent = _current_span.get()
+        if parent is not None and parent is not NOOP_SPAN:
+            trace_id, parent_id = parent.trace_id, parent.span_id
+        return Span(
+            name=name,
+            trace_id=trace_id or _new_trace_id(),
+            span_id=_new_span_id(),
+            parent_id=parent_id,
+            attributes=dict(attributes or {}),
+        )
+
+    def end_span(self, span: Span) -> None:
+        span.end_ns = time.time_ns()
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception as e:
+                logger.error(f"Span export failed: {str(e)}")
+
+    def flush(self) -> None:
+        for exporter in self.exporters:
+            exporter.flush()
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        """Run a block inside a new current span."""
+        if not self.enabled:
+            yield NOOP_SPAN
+            return
+        span = self.start_span(name, attributes=attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as exc:
+            span.record_exception(exc)
+            raise
+        finally:
+            _current_span.reset(token)
+            self.end_span(span)
+
+
+def build_tracer() -> Tracer:
+    """Build the tracer named by TRACING_ENABLED / TRACING_EXPORTER."""
+    if not settings.TRACING_ENABLED:
+        return Tracer(enabled=False)
+    if settings.TRACING_EXPORTER == "memory":
+        return Tracer([InMemorySpanExporter()])
+    if settings.TRACING_EXPORTER == "file":
+        return Tracer([FileSpanExporter(settings.TRACING_FILE)])
+    raise ValueError(f"Unknown TRACING_EXPORTER: {settings.TRACING_EXPORTER}")
+
+
+tracer = build_tracer()
+
+
+def span(name: str, **attributes):
+    """Context manager for a span on the global tracer."""
+    return tracer.span(name, **attributes)
+
+
+def traced(name: Optional[str] = None):
+    """
+    Decorator wrapping a sync or async function in a span.
+
+    The signature is preserved (functools.wraps), so FastAPI still resolves
+    the parameters of decorated dependencies.
+    """
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.span(span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TracingMiddleware:
+    """ASGI middleware opening the root span of every HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not tracer.enabled:
+            return await self.app(scope, receive, send)
+
+        trace_id = parent_id = None
+        headers = dict(scope.get("headers") or [])
+        match = _TRACEPARENT.match(headers.get(b"traceparent", b"").decode("latin-1").strip())
+        if match:
+            trace_id, parent_id = match.groups()
+
+        span = tracer.start_span(f"HTTP {scope['method']}", trace_id=trace_id, parent_id=parent_id)
+        span.set_attribute("http.method", scope["method"])
+        span.set_attribute("http.target", scope.get("path"))
+        token = _current_span.set(span)
+        callback_token = _tracing_callback.set(graph_tracing_callback)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                span.set_attribute("http.status_code", message["status"])
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(TRACE_ID_HEADER.lower().encode(), span.trace_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as exc:
+            span.record_exception(exc)
+            raise
+        finally:
+            route = getattr(scope.get("route"), "path", None)
+            if route:
+                span.name = f"HTTP {scope['method']} {route}"
+                span.set_attribute("http.route", route)
+            _tracing_callback.reset(callback_token)
+            _current_span.reset(token)
+            tracer.end_span(span)
+
+
+class GraphTracingCallback(BaseCallbackHandler):
+    """
+    LangChain callback turning graph, node and LLM runs into spans.
+
+    Node spans are made current while the node runs (callbacks run inline in
+    the node's task), so SQL and checkpoint spans inside a node nest under it.
+    Internal LangGraph runnables (tagged hidden) are not traced.
+    """
+    run_inline = True
+
+    def __init__(self):
+        self._runs: dict[UUID, tuple[Span, Any]] = {}
+
+    def _parent(self, parent_run_id: Optional[UUID]) -> Optional[Span]:
+        if parent_run_id is not None and parent_run_id in self._runs:
+            return self._runs[parent_run_id][0]
+        return _current_span.get()
+
+    def _start(self, name: str, run_id: UUID, parent_run_id: Optional[UUID], attributes: dict, make_current: bool) -> None:
+        if not tracer.enabled:
+            return
+        span = tracer.start_span(name, parent=self._parent(parent_run_id), attributes=attributes)
+        token = _current_span.set(span) if make_current else None
+        self._runs[run_id] = (span, token)
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None, **attributes) -> None:
+        entry = self._runs.pop(run_id, None)
+        if entry is None:
+            return
+        span, token = entry
+        for key, value in attributes.items():
+            span.set_attribute(key, value)
+        if error is not None:
+            span.record_exception(error)
+        if token is not None:
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                # Ended from another context; that context's value is not ours to restore
+                pass
+        tracer.end_span(span)
+
+    def on_chain_start(self, serialized, inputs, *, run_id: UUID, parent_run_id: Optional[UUID] = None,
+                       tags: Optional[list[str]] = None, metadata: Optional[dict] = None, **kwargs) -> None:
+        if _HIDDEN_TAG in (tags or []):
+            return
+        name = kwargs.get("name") or "chain"
+        node = (metadata or {}).get("langgraph_node")
+        if parent_run_id is None:
+            self._start(f"graph {name}", run_id, parent_run_id, {"graph.thread_id": (metadata or {}).get("thread_id")}, True)
+        elif node == name:
+            self._start(f"node {name}", run_id, parent_run_id, {"graph.node": node, "graph.step": (metadata or {}).get("langgraph_step")}, True)
+
+    def on_chain_end(self, outputs, *, run_id: UUID, **kwargs) -> None:
+        self._end(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs) -> None:
+        self._end(run_id, error)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, parent_run_id: Optional[UUID] = None,
+                            metadata: Optional[dict] = None, **kwargs) -> None:
+        model = (metadata or {}).get("ls_model_name") or kwargs.get("name") or "chat_model"
+        self._start(f"llm {model}", run_id, parent_run_id, {"llm.model": model, "llm.messages": len(messages[0]) if messages else 0}, False)
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs) -> None:
+        usage = {}
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or usage
+        self._end(run_id, **{f"llm.{key}": usage.get(key) for key in ("input_tokens", "output_tokens") if key in usage})
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs) -> None:
+        self._end(run_id, error)
+
+
+graph_tracing_callback = GraphTracingCallback()
+
+# Any runnable configured while this var is set gets the callback, like the LangSmith tracer
+_tracing_callback: ContextVar[Optional[GraphTracingCallback]] = ContextVar("graph_tracing_callback", default=None)
+_hook_registered = False
+
+
+def register_graph_tracing_hook() -> None:
+    """
+    Register the callback var with langchain. Called when the agent stack is
+    loaded rather than at import, since langchain_core.tracers pulls in langsmith.
+    """
+    global _hook_registered
+    if not _hook_registered:
+        from langchain_core.tracers.context import register_configure_hook
+        register_configure_hook(_tracing_callback, inheritable=True)
+        _hook_registered = True
+
+
+@contextmanager
+def trace_graph_runs() -> Iterator[None]:
+    """Trace graph runs started in this block outside an HTTP request (scripts, tests)."""
+    register_graph_tracing_hook()
+    token = _tracing_callback.set(graph_tracing_callback)
+    try:
+        yield
+    finally:
+        _tracing_callback.reset(token)
+
+
+_instrumented_engines: "weakref.WeakSet" = weakref.WeakSet()
+
+
+def instrument_engine(engine) -> None:
+    """Open a span for every SQL statement executed inside a trace (idempotent)."""
+    from sqlalchemy import event
+
+    if engine in _instrumented_engines:
+        return
+    _instrumented_engines.add(engine)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not tracer.enabled or _current_span.get() is None:
+            return
+        # Parameters are never recorded; they may hold credentials or personal data
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "SQL"
+        db_span = tracer.start_span(f"db {operation}", attributes={
+            "db.system": engine.dialect.name,
+            "db.statement": statement[:MAX_STATEMENT_LENGTH],
+            "db.executemany": executemany,
+        })
+        conn.info.setdefault("trace_spans", []).append(db_span)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get("trace_spans")
+        if spans:
+            db_span = spans.pop()
+            if cursor.rowcount is not None and cursor.rowcount >= 0:
+                db_span.set_attribute("db.rowcount", cursor.rowcount)
+            tracer.end_span(db_span)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        conn = exception_context.connection
+        spans = conn.info.get("trace_spans") if conn is not None else None
+        if spans:
+            db_span = spans.pop()
+            db_span.record_exception(exception_context.original_exception)
+            tracer.end_span(db_span)
+
+
+class TracingCheckpointer(BaseCheckpointSaver):
+    """Checkpointer wrapper recording a span around every read and write."""
+
+    def __init__(self, inner: BaseCheckpointSaver):
+        super().__init__(serde=inner.serde)
+        self.inner = inner
+
+    @property
+    def config_specs(self):
+        return self.inner.config_specs
+
+    def get_next_version(self, current, channel):
+        return self.inner.get_next_version(current, channel)
+
+    def _span(self, operation: str, config: Optional[dict]):
+        thread_id = ((config or {}).get("configurable") or {}).get("thread_id")
+        return tracer.span(f"checkpoint {operation}", **{"checkpoint.thread_id": thread_id})
+
+    def get_tuple(self, config):
+        with self._span("get_tuple", config):
+            return self.inner.get_tuple(config)
+
+    def list(self, config, **kwargs) -> Iterator:
+        with self._span("list", config):
+            yield from self.inner.list(config, **kwargs)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        with self._span("put", config):
+            return self.inner.put(config, checkpoint, metadata, new_versions)
+
+    def put_writes(self, config, writes, task_id, task_path: str = ""):
+        with self._span("put_writes", config) as write_span:
+            write_span.set_attribute("checkpoint.writes", len(writes))
+            return self.inner.put_writes(config, writes, task_id, task_path)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with tracer.span("checkpoint delete_thread", **{"checkpoint.thread_id": thread_id}):
+            return self.inner.delete_thread(thread_id)
+
+    async def aget_tuple(self, config):
+        with self._span("aget_tuple", config):
+            return await self.inner.aget_tuple(config)
+
+    async def alist(self, config, **kwargs) -> AsyncIterator:
+        with self._span("alist", config):
+            async for item in self.inner.alist(config, **kwargs):
+                yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        with self._span("aput", config):
+            return await self.inner.aput(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path: str = ""):
+        with self._span("aput_writes", config) as write_span:
+            write_span.set_attribute("checkpoint.writes", len(writes))
+            return await self.inner.aput_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        with tracer.span("checkpoint adelete_thread", **{"checkpoint.thread_id": thread_id}):
+            return await self.inner.adelete_thread(thread_id)
+
+
+class TraceContextFilter(logging.Filter):
+    """Adds trace_id and span_id of the current span to log records."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        current = _current_span.get()
+        record.trace_id = current.trace_id if current is not None else "-"
+        record.span_id = current.span_id if current is not None else "-"
+        return True
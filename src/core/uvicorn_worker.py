@@ -0,0 +1,19 @@
+"""
+Gunicorn worker class running the app on uvicorn with the server settings.
+
+Imported by gunicorn only (uvicorn.workers requires gunicorn).
+"""
+from uvicorn.workers import UvicornWorker
+
+from src.core.server import request_graceful_timeout, resolve_http, resolve_loop
+
+
+class TunedUvicornWorker(UvicornWorker):
+    """UvicornWorker with the loop, HTTP parser and graceful shutdown from Settings."""
+
+    CONFIG_KWARGS = {
+        "loop": resolve_loop(),
+        "http": resolve_http(),
+        "timeout_graceful_shutdown": request_graceful_timeout(),
+        "proxy_headers": True,
+    }
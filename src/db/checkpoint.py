@@ -4,25 +4,69 @@ from fastapi import FastAPI
 from fastapi import Depends
 from typing import Annotated
 from src.core.config import settings
+from src.core.server import db_pool_sizes
 
-from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+from langgraph.checkpoint.base import BaseCheckpointSaver
+
+from src.core.metrics import watch_checkpointer_pool
+from src.core.tracing import TracingCheckpointer, tracer
 
 DB_URI  = settings.DATABASE_URL
 
 # Global checkpointer instance
-_checkpointer: AsyncPostgresSaver | None = None
+_checkpointer: BaseCheckpointSaver | None = None
+_pool = None  # psycopg_pool.AsyncConnectionPool while the Postgres lifespan runs
+
+def _instrument(checkpointer: BaseCheckpointSaver) -> BaseCheckpointSaver:
+    return TracingCheckpointer(checkpointer) if tracer.enabled else checkpointer
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     global _checkpointer
-    async with AsyncPostgresSaver.from_conn_string(DB_URI) as checkpointer:
-        _checkpointer = checkpointer
-        await _checkpointer.setup()
-        yield
+    if settings.CHECKPOINT_BACKEND == "memory":
+        from langgraph.checkpoint.memory import InMemorySaver
+
+        # Per-process and lost on restart; for local runs and benchmarks (e.g. on SQLite)
+        _checkpointer = _instrument(InMemorySaver())
+        try:
+            yield
+        finally:
+            _checkpointer = None
+        return
+    global _pool
+    # Imported here so starting with the memory backend (or importing this module) stays cheap
+    from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+    from psycopg.rows import dict_row
+    from psycopg_pool import AsyncConnectionPool
+
+    # Concurrent graph runs share a pool instead of one serialized connection
+    max_size = db_pool_sizes().checkpoint_max_size
+    async with AsyncConnectionPool(
+        conninfo=DB_URI,
+        min_size=min(settings.CHECKPOINT_POOL_MIN_SIZE, max_size),
+        max_size=max_size,
+        kwargs={"autocommit": True, "prepare_threshold": 0, "row_factory": dict_row},
+        open=False,
+    ) as pool:
+        _pool = pool
+        saver = AsyncPostgresSaver(pool)
+        await saver.setup()
+        _checkpointer = _instrument(saver)
+        try:
+            yield
+        finally:
+            # Graph runs were drained first; the pool closes when this block exits
+            _checkpointer = None
+            _pool = None
+
+def get_checkpointer_pool():
+    return _pool
+
+watch_checkpointer_pool(get_checkpointer_pool)
 
-def get_checkpointer() -> AsyncPostgresSaver:
+def get_checkpointer() -> BaseCheckpointSaver:
     if _checkpointer is None:
         raise RuntimeError("Checkpointer not initialized. Make sure lifespan is running.")
     return _checkpointer
 
-CheckpointerDep = Annotated[AsyncPostgresSaver, Depends(get_checkpointer)]
\ No newline at end of file
+CheckpointerDep = Annotated[BaseCheckpointSaver, Depends(get_checkpointer)]
\ No newline at end of file
@@ -1,6 +1,18 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from src.core.config import settings
+from src.core.server import db_pool_sizes
 
-engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
+if settings.DATABASE_URL.startswith("sqlite"):
+    engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
+else:
+    # Sized per worker so all workers together stay within DB_MAX_CONNECTIONS when it is set
+    pool_sizes = db_pool_sizes()
+    engine = create_engine(
+        settings.DATABASE_URL,
+        pool_pre_ping=True,
+        pool_size=pool_sizes.pool_size,
+        max_overflow=pool_sizes.max_overflow,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+    )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
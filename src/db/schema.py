@@ -0,0 +1,101 @@
+"""
+Schema management.
+
+Tables are created and changed by Alembic migrations (`alembic upgrade head`),
+never at import. At startup the app compares the revision stamped in the
+database with the head of alembic/versions: one single-row query, instead of
+create_all's catalogue lookups for every table on every worker boot.
+
+The migration head is read from the revision files directly, which avoids
+importing alembic (and its script machinery) in the serving process.
+"""
+import ast
+import logging
+from functools import lru_cache
+from pathlib import Path
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+VERSIONS_DIR = Path(__file__).resolve().parents[2] / "alembic" / "versions"
+
+
+class SchemaOutOfDate(RuntimeError):
+    """The database is not at the migration head."""
+
+
+def _read_revision(path: Path) -> tuple[str, tuple[str, ...]]:
+    """(revision, down_revisions) from the module-level assignments of a migration file."""
+    values = {}
+    for node in ast.parse(path.read_text(encoding="utf-8")).body:
+        target = node.target if isinstance(node, ast.AnnAssign) else (
+            node.targets[0] if isinstance(node, ast.Assign) and len(node.targets) == 1 else None
+        )
+        if isinstance(target, ast.Name) and target.id in ("revision", "down_revision") and node.value is not None:
+            values[target.id] = ast.literal_eval(node.value)
+    down = values.get("down_revision")
+    if down is None:
+        down = ()
+    elif isinstance(down, str):
+        down = (down,)
+    return values["revision"], tuple(down)
+
+
+@lru_cache
+def get_head_revisions(versions_dir: Path = VERSIONS_DIR) -> frozenset[str]:
+    """Revisions no other migration builds on."""
+    revisions, parents = set(), set()
+    for path in versions_dir.glob("*.py"):
+        if path.name == "__init__.py":
+            continue
+        revision, down = _read_revision(path)
+        revisions.add(revision)
+        parents.update(down)
+    return frozenset(revisions - parents)
+
+
+def get_current_revisions(engine) -> frozenset[str]:
+    """Revisions stamped in alembic_version (empty if the table does not exist)."""
+    try:
+        with engine.connect() as conn:
+            return frozenset(conn.execute(text("SELECT version_num FROM alembic_version")).scalars())
+    except SQLAlchemyError:
+        return frozenset()
+
+
+def check_schema(engine) -> bool:
+    """
+    Compare the database revision with the migration head.
+
+    SCHEMA_CHECK="error" refuses to start on a mismatch, "warn" logs it and
+    "off" skips the query. Returns whether the schema is current.
+    """
+    if settings.SCHEMA_CHECK == "off":
+        return True
+    heads, current = get_head_revisions(), get_current_revisions(engine)
+    if current == heads:
+        return True
+
+    message = (
+        f"Database schema is at {', '.join(sorted(current)) or 'no revision'} but the migration head is "
+        f"{', '.join(sorted(heads))}; run `alembic upgrade head`"
+    )
+    if settings.SCHEMA_CHECK == "error":
+        raise SchemaOutOfDate(message)
+    logger.warning(message)
+    return False
+
+
+def create_tables(engine) -> None:
+    """
+    Create missing tables straight from the models, without migrations. For
+    throwaway databases only (tests, benchmarks, DB_CREATE_TABLES=true).
+    """
+    import src.models  # noqa: F401 - registers every model on Base.metadata
+    from src.models.base import Base
+
+    Base.metadata.create_all(bind=engine)
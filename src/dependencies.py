@@ -1,17 +1,30 @@
-from fastapi import Depends, HTTPException, status
+import hashlib
+import logging
+from typing import Optional
+
+from fastapi import Depends, Header, HTTPException, Request, Response, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from sqlalchemy.orm import Session
 from src.core.config import settings
+from src.core.drain import drain_controller
+from src.core.idempotency import IdempotencyKeyReused, IdempotentReplay, IdempotentRequest, idempotency_store
+from src.core.metrics import rate_limit_rejections
+from src.core.rate_limit import RateLimitResult, chatbot_rate, rate_limiter
+from src.core.token_budget import TokenBudget, TokenBudgetExceeded
+from src.core.tracing import traced
 from src.db.session import get_db
 from src.models.user import User
 from src.services.user_service import get_user_by_email
-from src.services.usage_log_service import check_chatbot_rate_limit
+from src.services.usage_log_service import check_chatbot_rate_limit, get_token_budget
 from src.schemas.token import TokenData
 
+logger = logging.getLogger(__name__)
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
+@traced("dependency get_current_user")
 def get_current_user(
     db: Session = Depends(get_db),
     token: str = Depends(oauth2_scheme)
@@ -35,7 +48,8 @@ def get_current_user(
     except JWTError:
         raise credentials_exception
 
-    user = get_user_by_email(db, email=token_data.email)
+    # The plan is needed by rate limiting and admission on most routes; load it with the user
+    user = get_user_by_email(db, email=token_data.email, with_plan=True)
     if user is None:
         raise credentials_exception
 
@@ -48,6 +62,7 @@ def get_current_user(
     return user
 
 
+@traced("dependency get_current_active_user")
 def get_current_active_user(
     current_user: User = Depends(get_current_user)
 ) -> User:
@@ -62,6 +77,7 @@ def get_current_active_user(
     return current_user
 
 
+@traced("dependency get_current_staff_user")
 def get_current_staff_user(
     current_user: User = Depends(get_current_user)
 ) -> User:
@@ -76,6 +92,7 @@ def get_current_staff_user(
     return current_user
 
 
+@traced("dependency get_current_superuser")
 def get_current_superuser(
     current_user: User = Depends(get_current_user)
 ) -> User:
@@ -90,6 +107,7 @@ def get_current_superuser(
     return current_user
 
 
+@traced("dependency verify_chatbot_rate_limit")
 def verify_chatbot_rate_limit(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -104,6 +122,7 @@ def verify_chatbot_rate_limit(
     can_query, queries_used, queries_remaining, query_limit, query_window_hours = check_chatbot_rate_limit(db, current_user.id)
     
     if not can_query:
+        rate_limit_rejections.labels("plan_quota").inc()
         plan_name = current_user.plan.name if current_user.plan else "Unknown"
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
@@ -123,3 +142,110 @@ def verify_chatbot_rate_limit(
         )
     
     return current_user
+
+
+@traced("dependency verify_token_budget")
+def verify_token_budget(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(verify_chatbot_rate_limit)
+) -> Optional[TokenBudget]:
+    """
+    Dependency rejecting users who used up any token limit of their plan
+    (429 via the TokenBudgetExceeded handler). Returns the budget so the
+    chatbot node can check each prompt against what is left.
+    """
+    budget = get_token_budget(db, current_user)
+    if budget is not None:
+        exhausted = budget.exhausted()
+        if exhausted:
+            raise TokenBudgetExceeded(budget, exhausted[0])
+    return budget
+
+
+@traced("dependency enforce_chatbot_rate_limit")
+def enforce_chatbot_rate_limit(
+    response: Response,
+    current_user: User = Depends(get_current_user)
+) -> Optional[RateLimitResult]:
+    """
+    Dependency applying the per-user CHATBOT_RATE_LIMIT shared by all workers.
+    Sets X-RateLimit-* headers on the response and raises 429 with
+    Retry-After when the user is over the limit. Returns None when disabled.
+    """
+    result = charge_chatbot_rate_limit(current_user)
+    if result is not None:
+        response.headers.update(result.headers)
+    return result
+
+
+def charge_chatbot_rate_limit(user: User, cost: int = 1) -> Optional[RateLimitResult]:
+    """
+    Count `cost` chatbot requests (a batch's items) against the user's
+    CHATBOT_RATE_LIMIT. Raises 429 with Retry-After when the user is over the
+    limit. Returns None when disabled.
+    """
+    if not settings.RATE_LIMIT_ENABLED:
+        return None
+    try:
+        result = rate_limiter.check(f"chatbot:{user.id}", chatbot_rate, cost)
+    except Exception as e:
+        # Fail open: a limiter outage should not take the chatbot down with it
+        logger.error("Rate limit check failed: %s", e)
+        return None
+
+    if not result.allowed:
+        rate_limit_rejections.labels("user").inc()
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Rate limit exceeded: {settings.CHATBOT_RATE_LIMIT}. Retry in {result.headers['Retry-After']} seconds.",
+            headers=result.headers
+        )
+    return result
+
+
+@traced("dependency reject_when_draining")
+def reject_when_draining() -> None:
+    """
+    Dependency refusing new chat turns while the worker shuts down.
+    """
+    if drain_controller.draining:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is shutting down, retry shortly",
+            headers={"Retry-After": "1"}
+        )
+
+
+@traced("dependency idempotent_request")
+async def idempotent_request(
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
+    current_user: User = Depends(get_current_user)
+) -> Optional[IdempotentRequest]:
+    """
+    Dependency reading the Idempotency-Key header. Listed before the rate and
+    quota checks, so a duplicate of a running or completed turn is answered
+    from it (IdempotentReplay) without being charged again.
+    Returns None when the request carries no key.
+    """
+    if idempotency_key is None:
+        return None
+    scoped = f"{current_user.id}:{idempotency_key}"
+    keyed = IdempotentRequest(
+        # Hashed to fit the cache table's key column
+        key=hashlib.sha256(scoped.encode("utf-8")).hexdigest(),
+        fingerprint=hashlib.sha256(request.url.path.encode("utf-8") + b"\n" + await request.body()).hexdigest(),
+    )
+    try:
+        record = await idempotency_store.lookup(keyed.key, keyed.fingerprint)
+    except IdempotencyKeyReused:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used for a different request"
+        )
+    if record is not None:
+        if record.kind == "json":
+            # Answer once the original turn has; its error, if any, goes to the usual handler
+            await record.result()
+        raise IdempotentReplay(record)
+    return keyed
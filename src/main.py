@@ -1,30 +1,98 @@
 import asyncio
+import logging
+import os
 import sys
+from contextlib import asynccontextmanager, suppress
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from slowapi import _rate_limit_exceeded_handler
-from slowapi.errors import RateLimitExceeded
+from fastapi.responses import JSONResponse, Response
 
-from src.routers import auth, users, profiles, chatbot
+from src.routers import auth, users, profiles, chatbot, admin
 from src.db.database import engine
-from src.models.base import Base
+from src.db.schema import check_schema, create_tables
 from src.models import user, profile  # Import models to ensure they're registered
 from src.core.logging import setup_logging
-from src.db.checkpoint import lifespan
+from src.db.checkpoint import get_checkpointer, lifespan
+from src.core.config import settings
+from src.core.admission import AdmissionRejected, admission_rejected_handler
+from src.core.token_budget import TokenBudgetExceeded, token_budget_exceeded_handler
+from src.core.thread_lock import ThreadBusy, thread_busy_handler
+from src.core.idempotency import IdempotentReplay, idempotent_replay_handler
+from src.core.drain import drain_controller, install_signal_handlers
+from src.core.health import LoadSheddingMiddleware, readiness
+from src.core.loop_monitor import loop_monitor
+from src.core.llm_client import warm_up_http_client, close_http_client
+from src.core.llm_cache import purge_expired_entries
+from src.core.metrics import CONTENT_TYPE, MetricsMiddleware, registry, watch_sqlalchemy_pool
+from src.core.tracing import TracingMiddleware, instrument_engine, tracer
+from src.core.query_stats import QueryStatsMiddleware, install_query_stats
 
 # Fix for Windows: psycopg requires SelectorEventLoop instead of ProactorEventLoop
 if sys.platform == 'win32':
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
 setup_logging()
-# Create database tables
-Base.metadata.create_all(bind=engine)
+logger = logging.getLogger(__name__)
+
+
+async def preload_agent() -> None:
+    """Import the agent stack and compile the graph off the event loop."""
+    from agents.basic.loader import get_graph
+
+    try:
+        await asyncio.to_thread(get_graph, get_checkpointer())
+    except Exception as e:
+        # The first chat request retries and reports the error
+        logger.warning("Agent preload failed: %s", e)
+
+
+@asynccontextmanager
+async def app_lifespan(app: FastAPI):
+    """
+    Schema check, checkpointer lifespan, agent preload, the shared LLM HTTP
+    client and the purge of expired llm_response_cache rows.
+
+    Shutdown drains first: new chat turns are refused, in-flight graph runs,
+    streams and buffered writes get SHUTDOWN_DRAIN_SECONDS to finish, then the
+    HTTP client, checkpointer pool and database pool are closed in that order.
+    """
+    # Tables come from Alembic migrations; this is a single revision lookup
+    if settings.DB_CREATE_TABLES:
+        await asyncio.to_thread(create_tables, engine)
+    await asyncio.to_thread(check_schema, engine)
+
+    drain_controller.reset()
+    install_signal_handlers(drain_controller)
+    loop_monitor.start(debug=settings.LOOP_BLOCK_DEBUG)
+
+    async with lifespan(app):
+        # Warm-up and preload run in the background so neither delays startup
+        background = [asyncio.create_task(warm_up_http_client())]
+        if settings.AGENT_PRELOAD:
+            background.append(asyncio.create_task(preload_agent()))
+        uses_cache_table = "database" in (settings.LLM_CACHE_BACKEND, settings.IDEMPOTENCY_BACKEND)
+        if uses_cache_table and settings.LLM_CACHE_PURGE_INTERVAL_SECONDS > 0:
+            background.append(asyncio.create_task(purge_expired_entries(settings.LLM_CACHE_PURGE_INTERVAL_SECONDS)))
+        try:
+            yield
+        finally:
+            await drain_controller.drain(settings.SHUTDOWN_DRAIN_SECONDS)
+            for task in background:
+                task.cancel()
+            for task in background:
+                with suppress(asyncio.CancelledError):
+                    await task
+            await close_http_client()
+            await loop_monitor.stop()
+    engine.dispose()
+    tracer.flush()
+
 
 app = FastAPI(
     title="FastAPI Base Project",
     description="A modular FastAPI project with JWT authentication and SQLAlchemy",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=app_lifespan
 )
 
 # CORS middleware configuration
@@ -36,15 +104,40 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Configure rate limiter
-app.state.limiter = chatbot.limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+# Shed new chat requests with 503 + Retry-After while pools, the LLM limiter or the loop are saturated
+app.add_middleware(LoadSheddingMiddleware, engine=engine)
+
+# Per-route request metrics
+app.add_middleware(MetricsMiddleware)
+watch_sqlalchemy_pool(engine)
+
+# Per-request query count/time, slow-query log and Server-Timing header
+app.add_middleware(QueryStatsMiddleware)
+install_query_stats(engine)
+
+# Request tracing (no-op unless TRACING_ENABLED); outermost so the root span covers everything
+app.add_middleware(TracingMiddleware)
+instrument_engine(engine)
+
+
+# Shed graph runs that cannot be admitted with 503 + Retry-After
+app.add_exception_handler(AdmissionRejected, admission_rejected_handler)
+
+# Reject turns over the plan's token budget with 429
+app.add_exception_handler(TokenBudgetExceeded, token_budget_exceeded_handler)
+
+# Turns on a conversation that is already answering another one (THREAD_TURN_POLICY=reject or wait timeout) get 409
+app.add_exception_handler(ThreadBusy, thread_busy_handler)
+
+# Duplicates of a keyed chat turn (Idempotency-Key) are answered with the original's reply
+app.add_exception_handler(IdempotentReplay, idempotent_replay_handler)
 
 # Include routers
 app.include_router(auth.router)
 app.include_router(users.router)
 app.include_router(profiles.router)
 app.include_router(chatbot.router)
+app.include_router(admin.router)
 
 @app.get("/", tags=["Root"])
 def root():
@@ -58,5 +151,27 @@ def root():
 
 @app.get("/health", tags=["Root"])
 def health_check():
-    """Health check endpoint."""
+    """Health check endpoint; fails while the worker drains so traffic moves elsewhere."""
+    if not drain_controller.ready:
+        return JSONResponse(status_code=503, content={"status": "draining"})
     return {"status": "healthy"}
+
+
+@app.get("/health/live", tags=["Root"])
+async def liveness():
+    """Liveness probe: the process and its event loop respond."""
+    return {"status": "alive", "loop_lag_seconds": round(loop_monitor.lag, 6)}
+
+
+@app.get("/health/ready", tags=["Root"])
+async def readiness_check():
+    """Readiness probe: database and checkpointer reachable, not draining and not overloaded."""
+    ready, report = await readiness(engine)
+    return JSONResponse(status_code=200 if ready else 503, content=report)
+
+
+@app.get("/metrics", tags=["Root"], include_in_schema=False)
+def metrics():
+    """Prometheus metrics endpoint. Each worker reports its own metrics, labelled with its pid."""
+    worker = str(os.getpid()) if settings.WEB_CONCURRENCY > 1 else None
+    return Response(content=registry.render(worker), media_type=CONTENT_TYPE)
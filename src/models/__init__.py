@@ -3,5 +3,8 @@ from src.models.user import User
 from src.models.profile import Profile
 from src.models.usage_log import UsageLog
 from src.models.plan import Plan
+from src.models.llm_cache import LLMCacheEntry
+from src.models.rate_limit import RateLimitBucket
+from src.models.usage_counter import UsageCounter
 
-__all__ = ["Base", "User", "Profile", "UsageLog", "Plan"]
+__all__ = ["Base", "User", "Profile", "UsageLog", "Plan", "LLMCacheEntry", "RateLimitBucket", "UsageCounter"]
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, String, Text, DateTime
+from sqlalchemy.sql import func
+from src.models.base import Base
+
+
+class LLMCacheEntry(Base):
+    """
+    Persistent tier of the exact-match LLM response cache.
+    Keyed by a hash of (model, temperature, system prompt, normalized messages).
+    """
+    __tablename__ = 'llm_response_cache'
+
+    key = Column(String(64), primary_key=True)
+    model = Column(String(200), nullable=True, comment="Model name reported by the provider")
+    response = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
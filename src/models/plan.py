@@ -7,7 +7,7 @@ from src.models.base import Base
 class Plan(Base):
     """
     Plan model representing subscription plans with rate limiting configurations.
-    Each user is associated with a plan that defines their query limits.
+    Each user is associated with a plan that defines their query and token limits.
     """
     __tablename__ = 'plans'
 
@@ -16,6 +16,9 @@ class Plan(Base):
     description = Column(String(500), nullable=True)
     query_limit = Column(Integer, nullable=False, comment="Maximum number of queries allowed")
     query_window_hours = Column(Integer, nullable=False, comment="Time window in hours for query limit")
+    input_token_limit = Column(Integer, nullable=True, comment="Prompt tokens allowed per query window (NULL = unlimited)")
+    output_token_limit = Column(Integer, nullable=True, comment="Completion tokens allowed per query window (NULL = unlimited)")
+    total_token_limit = Column(Integer, nullable=True, comment="Total tokens allowed per query window (NULL = unlimited)")
     is_active = Column(Boolean, default=True, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,14 @@
+from sqlalchemy import Boolean, Column, Float, String
+from src.models.base import Base
+
+
+class RateLimitBucket(Base):
+    """
+    GCRA state of one rate-limited key, shared by every worker.
+    Updated with a single upsert per check (see src/core/rate_limit.py).
+    """
+    __tablename__ = 'rate_limit_buckets'
+
+    key = Column(String(255), primary_key=True)
+    tat = Column(Float(precision=53), nullable=False, comment="Theoretical arrival time (unix seconds)")
+    allowed = Column(Boolean, nullable=False, comment="Outcome of the last check")
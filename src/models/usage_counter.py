@@ -0,0 +1,17 @@
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Integer
+from src.models.base import Base
+
+
+class UsageCounter(Base):
+    """
+    Running token totals of a user per hour (UTC), incremented whenever usage
+    logs are recorded. Token budgets sum the buckets inside the plan's window
+    instead of scanning usage_logs.
+    """
+    __tablename__ = 'usage_counters'
+
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True, comment="Start of the hour (UTC)")
+    input_tokens = Column(BigInteger, nullable=False, default=0)
+    output_tokens = Column(BigInteger, nullable=False, default=0)
+    total_tokens = Column(BigInteger, nullable=False, default=0)
@@ -0,0 +1,104 @@
+import asyncio
+import os
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+
+from src.core.loop_monitor import loop_monitor
+from src.core.profiling import ProfilerBusy, memory_tracker, stack_sampler
+from src.dependencies import get_current_superuser
+
+# Diagnostics apply to the worker process that serves the request
+router = APIRouter(prefix="/admin", tags=["Admin"], dependencies=[Depends(get_current_superuser)])
+
+
+@router.post("/profile/cpu")
+async def profile_cpu(
+    seconds: float = Query(10.0, gt=0, le=60, description="Sampling duration"),
+    interval_ms: float = Query(10.0, ge=1, le=1000, description="Time between samples"),
+    format: Literal["collapsed", "json"] = Query("collapsed"),
+    include_idle: bool = Query(False, description="Keep samples of threads waiting for work"),
+    limit: int = Query(20, ge=1, le=500, description="Stacks returned by the json format"),
+):
+    """
+    Sample the stacks of this worker for a bounded time.
+
+    `collapsed` returns a flamegraph-ready file (flamegraph.pl, speedscope,
+    inferno); `json` returns the most frequent stacks.
+    """
+    try:
+        # The sampler sleeps between samples in a worker thread, so the event loop keeps serving
+        profile = await asyncio.to_thread(stack_sampler.run, seconds, interval_ms / 1000, include_idle)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+    if format == "json":
+        return {
+            "pid": os.getpid(),
+            "duration_seconds": profile.duration_seconds,
+            "interval_seconds": profile.interval_seconds,
+            "samples": profile.samples,
+            "stacks": profile.top(limit),
+        }
+    return PlainTextResponse(
+        profile.collapsed(),
+        headers={"Content-Disposition": f'attachment; filename="profile-{os.getpid()}.collapsed"'},
+    )
+
+
+@router.post("/memory/start")
+def start_memory_tracing(
+    frames: int = Query(25, ge=1, le=100, description="Traceback depth stored per allocation")
+):
+    """
+    Start tracemalloc. Tracing slows allocations down; stop it when done.
+    """
+    memory_tracker.start(frames)
+    return {"pid": os.getpid(), "tracing": True}
+
+
+@router.post("/memory/snapshot")
+def take_memory_snapshot(
+    limit: int = Query(25, ge=1, le=500),
+    key_type: Literal["lineno", "traceback", "filename"] = Query("lineno"),
+):
+    """
+    Take a tracemalloc snapshot. Returns the top allocation sites and, from
+    the second snapshot on, the growth since the previous one.
+    """
+    if not memory_tracker.tracing:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Memory tracing is not running; POST /admin/memory/start first"
+        )
+    return {"pid": os.getpid(), **memory_tracker.snapshot(limit, key_type)}
+
+
+@router.post("/memory/stop")
+def stop_memory_tracing():
+    """
+    Stop tracemalloc and discard stored snapshots.
+    """
+    memory_tracker.stop()
+    return {"pid": os.getpid(), "tracing": False}
+
+
+@router.get("/event-loop")
+def get_event_loop_stats(limit: int = Query(5, ge=0, le=20, description="Most recent blocking stacks returned")):
+    """
+    Event-loop lag and, when the blocking-call detector runs, the stacks it captured.
+    """
+    blocks = list(loop_monitor.blocks)[-limit:] if limit else []
+    return {"pid": os.getpid(), **loop_monitor.stats(), "blocks": blocks[::-1]}
+
+
+@router.post("/event-loop/debug")
+def set_event_loop_debug(enabled: bool = Query(True, description="Run the blocking-call detector")):
+    """
+    Start or stop the blocking-call detector without restarting the worker.
+    """
+    if enabled and not loop_monitor.running:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Event-loop monitor is not running")
+    loop_monitor.set_debug(enabled)
+    return {"pid": os.getpid(), "debug": loop_monitor.debug}
@@ -1,32 +1,67 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
-from slowapi import Limiter
-from slowapi.util import get_remote_address
-
 from src.db.session import get_db
 from src.models.user import User
 from src.schemas.profile import ProfileRead, ProfileUpdate
 from src.services.profile_service import get_profile_by_user_id, update_profile
-from src.dependencies import get_current_user, verify_chatbot_rate_limit
-from src.db.checkpoint import lifespan, CheckpointerDep
+from src.dependencies import (
+    charge_chatbot_rate_limit, enforce_chatbot_rate_limit, get_current_user, get_current_staff_user, idempotent_request,
+    reject_when_draining, verify_chatbot_rate_limit, verify_token_budget
+)
+from src.db.checkpoint import CheckpointerDep
 from src.db.database import SessionLocal
 
-from src.services.usage_log_service import create_usage_log, check_chatbot_rate_limit
+from src.services.usage_log_service import (
+    create_usage_log, create_usage_logs_bulk, check_chatbot_rate_limit, get_token_budget, release_query_reservations,
+    reserve_chatbot_queries
+)
 from src.schemas.usage_log import UsageLogCreate
 from src.core.config import settings
+from src.core.admission import admission_controller, plan_priority
+from src.core.drain import drain_controller
+from src.core.idempotency import IdempotentRequest, idempotency_store, replay_response
+from src.core.rate_limit import RateLimitResult
+from src.core.thread_lock import thread_locks
+from src.core.token_budget import TokenBudget, TokenBudgetExceeded
+from src.core.llm_cache import response_cache
+from src.core.semantic_cache import semantic_cache
+from src.core.metrics import chatbot_streams_in_flight, rate_limit_rejections
 
-from agents.basic.agent import make_graph
-from langchain_core.messages import HumanMessage
+from agents.basic.loader import aget_ephemeral_graph, aget_graph
 from pydantic import BaseModel, Field
 from fastapi.responses import StreamingResponse
+from typing import Optional
 
+import asyncio
+import json
+import logging
 import uuid
 
-router = APIRouter(prefix="/chatbot", tags=["Chatbot"], lifespan=lifespan)
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/chatbot", tags=["Chatbot"])
+
+class StreamingResponseWithCleanup(StreamingResponse):
+    """
+    StreamingResponse that always runs `cleanup` once it is done, also when
+    the client disconnects before the body iterator is first advanced (the
+    iterator's own finally never runs then), and then closes the iterator
+    (a disconnect during a send leaves it suspended until garbage collection).
+    """
 
-# Create limiter instance (will be configured in main.py)
-limiter = Limiter(key_func=get_remote_address)
+    def __init__(self, content, cleanup, **kwargs):
+        super().__init__(content, **kwargs)
+        self.cleanup = cleanup
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            try:
+                await self.cleanup()
+            finally:
+                await self.body_iterator.aclose()
 
 class Message(BaseModel):
     message: str = Field(
@@ -35,47 +70,96 @@ class Message(BaseModel):
         description="Query message for the chatbot"
     )
 
-@router.post("/")
-@limiter.limit("10/minute")
+class BatchItem(Message):
+    thread: Optional[str] = Field(
+        None,
+        max_length=100,
+        description="Items sharing a thread label run in order on the same ephemeral thread"
+    )
+
+class BatchRequest(BaseModel):
+    items: list[BatchItem] = Field(
+        min_length=1,
+        max_length=settings.CHATBOT_BATCH_MAX_ITEMS,
+        description="Messages to run through the agent"
+    )
+    concurrency: Optional[int] = Field(
+        None,
+        ge=1,
+        description="Maximum graph runs in flight (capped by CHATBOT_BATCH_CONCURRENCY)"
+    )
+
+@router.post(
+    "/", dependencies=[Depends(reject_when_draining), Depends(idempotent_request), Depends(enforce_chatbot_rate_limit)]
+)
 async def chat(
-    request: Request, 
     item: Message, 
     checkpointer: CheckpointerDep, 
-    current_user: User = Depends(verify_chatbot_rate_limit)
+    current_user: User = Depends(verify_chatbot_rate_limit),
+    token_budget: Optional[TokenBudget] = Depends(verify_token_budget),
+    idempotency: Optional[IdempotentRequest] = Depends(idempotent_request)
 ):
     """Endpoint de chat con rate limiting de 5 consultas cada 24 horas por usuario."""
     
     user_id = current_user.id
-    agent = make_graph(config={"checkpointer": checkpointer})
+    agent = await aget_graph(checkpointer)
+    thread_id = f"thread-{user_id}"
 
-    state = {
-        "messages": [HumanMessage(content=item.message)],
-        "input_tokens": 0,
-        "output_tokens": 0,
-        "total_tokens": 0
-    }
+    async def run_turn(messages: list[str]):
+        state = {
+            # Converted to HumanMessages by the messages reducer; more than one when turns were merged
+            "messages": [{"role": "user", "content": message} for message in messages],
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "total_tokens": 0
+        }
 
-    config = {
-        "configurable": {
-            "thread_id": f"thread-{user_id}",
-        },
-        "user_id": user_id,
-        "main_call_tid": f"parent-{uuid.uuid4()}",
-    }
+        config = {
+            "configurable": {
+                "thread_id": thread_id,
+                "token_budget": token_budget,
+                "plan": current_user.plan.name if current_user.plan else None,
+            },
+            "user_id": user_id,
+            "main_call_tid": f"parent-{uuid.uuid4()}",
+        }
+
+        async with admission_controller.slot(plan_priority(current_user.plan)):
+            return await agent.ainvoke(state, config=config)
+
+    record = None
+    if idempotency is not None:
+        record, owner = idempotency_store.begin(idempotency.key, idempotency.fingerprint, "json")
+        if not owner:
+            # A duplicate that got past the dependency while the original was starting
+            await record.result()
+            return replay_response(record)
 
-    response = await agent.ainvoke(state, config=config)
+    try:
+        # Tracked so a shutdown waits for the turn (and its usage log) to finish
+        async with drain_controller.track():
+            response = await thread_locks.run_turn(thread_id, item.message, run_turn)
+    except BaseException as e:
+        if record is not None:
+            idempotency_store.fail(idempotency.key, record, e)
+        raise
 
     message = response["messages"][-1]
 
+    if record is not None:
+        record.append(message.content)
+        await idempotency_store.complete(idempotency.key, record)
+
     return message.content
 
-@router.post("/stream")
-@limiter.limit("10/minute")
+@router.post("/stream", dependencies=[Depends(reject_when_draining), Depends(idempotent_request)])
 async def stream_chat(
-    request: Request, 
     item: Message, 
     checkpointer: CheckpointerDep, 
-    current_user: User = Depends(verify_chatbot_rate_limit)
+    rate_limit: Optional[RateLimitResult] = Depends(enforce_chatbot_rate_limit),
+    current_user: User = Depends(verify_chatbot_rate_limit),
+    token_budget: Optional[TokenBudget] = Depends(verify_token_budget),
+    idempotency: Optional[IdempotentRequest] = Depends(idempotent_request)
 ):
     """Endpoint de chat streaming con rate limiting de 5 consultas cada 24 horas por usuario."""
     
@@ -84,21 +168,269 @@ async def stream_chat(
     config = {
         "configurable": {
             "thread_id": f"thread-{user_id}",
+            "token_budget": token_budget,
+            "plan": current_user.plan.name if current_user.plan else None,
         },
         "user_id": user_id,
         "main_call_tid": f"parent-{uuid.uuid4()}",
     }
 
-    human_message = HumanMessage(content=item.message)
+    human_message = {"role": "user", "content": item.message}
+
+    record = None
+    if idempotency is not None:
+        record, owner = idempotency_store.begin(idempotency.key, idempotency.fingerprint, "stream")
+        if not owner:
+            return replay_response(record)
+
+    # Take the thread and admit before responding so a busy thread (409) or saturation (503) is still reported.
+    # Streams cannot share a reply, so the merge policy queues them
+    try:
+        lease = await thread_locks.acquire(config["configurable"]["thread_id"])
+        try:
+            slot = await admission_controller.acquire(plan_priority(current_user.plan))
+        except BaseException:
+            await lease.release()
+            raise
+    except BaseException as e:
+        if record is not None:
+            idempotency_store.fail(idempotency.key, record, e)
+        raise
+
+    chatbot_streams_in_flight.inc()
+    finished = False
+
+    async def finish(error: Optional[BaseException]) -> None:
+        # Runs from the generator when it ends and from the response when it is done; the first call wins
+        nonlocal finished
+        if finished:
+            return
+        finished = True
+        chatbot_streams_in_flight.dec()
+        slot.release()
+        await lease.release()
+        if record is not None:
+            # Duplicates replay what was streamed; only complete turns are kept for later retries
+            if error is None:
+                await idempotency_store.complete(idempotency.key, record)
+            else:
+                idempotency_store.fail(idempotency.key, record, error)
 
     async def generate_response():
-        agent = make_graph(config={"checkpointer": checkpointer})
+        error = None
+        try:
+            async with drain_controller.track():
+                agent = await aget_graph(checkpointer)
+
+                async for message_chunk, metadata in agent.astream({"messages": [human_message]}, stream_mode="messages", config=config):
+                    if message_chunk.content:
+                        chunk = f"data: {message_chunk.content}\n\n"
+                        if record is not None:
+                            record.append(chunk)
+                        yield chunk
+        except TokenBudgetExceeded as e:
+            # Headers are already sent, so the rejection is reported in-band
+            error = e
+            chunk = f"event: error\ndata: {json.dumps({'detail': e.reason, 'limit': e.kind})}\n\n"
+            if record is not None:
+                record.append(chunk)
+            yield chunk
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            await finish(error)
+
+    async def cleanup() -> None:
+        # Only does anything when the stream never ran to its end (e.g. the client left before the first chunk)
+        await finish(ConnectionAbortedError("Client disconnected before the stream finished"))
+
+    # Returned directly, so the limiter's headers are not merged in by FastAPI
+    headers = rate_limit.headers if rate_limit else None
+    return StreamingResponseWithCleanup(generate_response(), cleanup, media_type="text/event-stream", headers=headers)
+
+
+@router.post("/batch", dependencies=[Depends(reject_when_draining)])
+async def batch_chat(
+    batch: BatchRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Run many independent messages through the agent with bounded concurrency.
+
+    Items without a thread label run on their own ephemeral thread; items sharing
+    a label run in order on one ephemeral thread. Nothing is persisted to the
+    user's conversation. Results stream back as NDJSON in completion order and
+    usage logs are written in a single bulk insert once the batch finishes. Every
+    item's query is reserved against the plan's quota up front, so concurrent
+    batches cannot exceed it while their usage logs are still buffered. Each item
+    also counts as one request against CHATBOT_RATE_LIMIT (at most a full burst).
+    """
+    user_id = current_user.id
+    main_call_tids = [f"parent-{uuid.uuid4()}" for _ in batch.items]
+    # Rate limit, token budget and quota reservation are blocking database work; keep it off the event loop
+    rate_limit, token_budget = await asyncio.to_thread(_admit_batch, db, current_user, main_call_tids)
+
+    # Group items by thread label, keeping submission order inside each group
+    groups: dict[str, list[tuple[int, BatchItem]]] = {}
+    for index, item in enumerate(batch.items):
+        label = item.thread if item.thread is not None else f"item-{index}"
+        groups.setdefault(label, []).append((index, item))
+
+    concurrency = min(batch.concurrency or settings.CHATBOT_BATCH_CONCURRENCY, settings.CHATBOT_BATCH_CONCURRENCY)
+    priority = plan_priority(current_user.plan)
+    plan_name = current_user.plan.name if current_user.plan else None
+    batch_id = uuid.uuid4()
+    usage_log_buffer: list[UsageLogCreate] = []
+    tasks: list[asyncio.Task] = []
+    finishing: Optional[asyncio.Task] = None
+
+    async def finish_batch() -> None:
+        async with drain_controller.track():
+            # Items still running are stopped and settle first: every entry they record is in the buffer before it is written
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await drain_controller.defer_write(_write_usage_logs, user_id, list(usage_log_buffer), main_call_tids)
+
+    async def write_usage_logs() -> None:
+        # Called by the generator when it ends and by the response when it is done; the first call starts the write
+        nonlocal finishing
+        if finishing is None:
+            finishing = asyncio.create_task(finish_batch())
+        # Outlives a disconnect or shutdown cancel; the lifespan drain waits for it
+        await asyncio.shield(finishing)
 
-        async for message_chunk, metadata in agent.astream({"messages": [human_message]}, stream_mode="messages", config=config):
-            if message_chunk.content:
-                yield f"data: {message_chunk.content}\n\n"
+    async def generate_results():
+        # Ephemeral threads live in memory for the duration of the batch only
+        agent = await aget_ephemeral_graph()
+        semaphore = asyncio.Semaphore(concurrency)
+        results: asyncio.Queue = asyncio.Queue()
 
-    return StreamingResponse(generate_response(), media_type="text/event-stream")
+        async def run_group(label: str, entries: list[tuple[int, BatchItem]]):
+            for index, item in entries:
+                config = {
+                    "configurable": {
+                        "thread_id": f"batch-{user_id}-{batch_id}-{label}",
+                        # Passed via configurable so the shared list is not dropped while empty
+                        "usage_log_buffer": usage_log_buffer,
+                        "token_budget": token_budget,
+                        "plan": plan_name,
+                    },
+                    "user_id": user_id,
+                    "main_call_tid": main_call_tids[index],
+                }
+                state = {
+                    "messages": [{"role": "user", "content": item.message}],
+                    "input_tokens": 0,
+                    "output_tokens": 0,
+                    "total_tokens": 0
+                }
+                try:
+                    async with semaphore, admission_controller.slot(priority):
+                        response = await agent.ainvoke(state, config=config)
+                    result = {
+                        "index": index,
+                        "thread": item.thread,
+                        "status": "ok",
+                        "response": response["messages"][-1].content,
+                        "input_tokens": response.get("input_tokens", 0),
+                        "output_tokens": response.get("output_tokens", 0),
+                        "total_tokens": response.get("total_tokens", 0)
+                    }
+                except Exception as e:
+                    logger.error(f"Batch item {index} failed: {str(e)}")
+                    result = {"index": index, "thread": item.thread, "status": "error", "error": str(e)}
+                await results.put(result)
+
+        tasks.extend(asyncio.create_task(run_group(label, entries)) for label, entries in groups.items())
+        try:
+            async with drain_controller.track():
+                for _ in range(len(batch.items)):
+                    result = await results.get()
+                    yield json.dumps(result) + "\n"
+        finally:
+            await write_usage_logs()
+
+    # The cleanup stops the items and writes their usage also when the client leaves mid-stream (or before
+    # the first result), where the generator's own finally may run late or not at all
+    headers = rate_limit.headers if rate_limit else None
+    return StreamingResponseWithCleanup(
+        generate_results(), write_usage_logs, media_type="application/x-ndjson", headers=headers
+    )
+
+
+def _admit_batch(
+    db: Session, user: User, main_call_tids: list[str]
+) -> tuple[Optional[RateLimitResult], Optional[TokenBudget]]:
+    """
+    Charge the batch's items to the rate limit, check the token budget and
+    reserve one query per item. Blocking.
+
+    Raises:
+        HTTPException: 429 when the rate limit or the plan's query quota is exceeded
+        TokenBudgetExceeded: When the plan's token budget is used up
+    """
+    rate_limit = charge_chatbot_rate_limit(user, len(main_call_tids))
+    token_budget = get_token_budget(db, user)
+    if token_budget is not None and token_budget.exhausted():
+        raise TokenBudgetExceeded(token_budget, token_budget.exhausted()[0])
+
+    reserved, queries_used, queries_remaining, query_limit, query_window_hours = reserve_chatbot_queries(
+        db, user.id, main_call_tids
+    )
+    if not reserved:
+        rate_limit_rejections.labels("plan_quota").inc()
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail={
+                "message": f"Batch of {len(main_call_tids)} queries exceeds the {queries_remaining} remaining of {query_limit} in the last {query_window_hours} hours.",
+                "queries_used": queries_used,
+                "queries_limit": query_limit,
+                "window_hours": query_window_hours,
+                "queries_remaining": queries_remaining
+            }
+        )
+    return rate_limit, token_budget
+
+
+def _write_usage_logs(user_id: int, usage_data_list: list[UsageLogCreate], main_call_tids: list[str]) -> None:
+    """Persist buffered batch usage logs in place of the batch's query reservations, with a dedicated session."""
+    db = SessionLocal()
+    try:
+        release_query_reservations(db, user_id, main_call_tids)
+        create_usage_logs_bulk(db, user_id, usage_data_list)
+        db.commit()
+    except Exception as e:
+        logger.error(f"Error writing batch usage logs: {str(e)}")
+    finally:
+        db.close()
+
+
+@router.get("/admission")
+async def get_admission_stats(
+    current_user: User = Depends(get_current_staff_user)
+):
+    """
+    Admission controller metrics: in-flight runs, queue length, wait times
+    and rejection counts for this worker, plus per-thread turn serialization. Staff only.
+    """
+    return {**admission_controller.stats(), "thread_turns": thread_locks.stats()}
+
+
+@router.get("/cache")
+async def get_cache_stats(
+    current_user: User = Depends(get_current_staff_user)
+):
+    """
+    Hit rates and lookup costs of the exact-match and semantic response
+    caches for this worker. Staff only.
+    """
+    return {
+        "exact": response_cache.stats() if response_cache is not None else None,
+        "semantic": semantic_cache.stats() if semantic_cache is not None else None
+    }
 
 
 @router.get("/usage")
@@ -114,13 +446,16 @@ async def get_usage(
     - remaining: Número de consultas restantes
     - limit: Límite total de consultas por ventana de tiempo
     - window_hours: Ventana de tiempo en horas
+    - tokens: Uso, límite y restante de tokens (input, output, total) si el plan los limita
     """
-    can_query, used, remaining = check_chatbot_rate_limit(db, current_user.id)
+    can_query, used, remaining, query_limit, query_window_hours = check_chatbot_rate_limit(db, current_user.id)
+    token_budget = get_token_budget(db, current_user)
     
     return {
         "used": used,
         "remaining": remaining,
-        "limit": settings.CHATBOT_QUERY_LIMIT,
-        "window_hours": settings.CHATBOT_QUERY_WINDOW_HOURS,
-        "can_query": can_query
+        "limit": query_limit,
+        "window_hours": query_window_hours,
+        "can_query": can_query and not (token_budget and token_budget.exhausted()),
+        "tokens": token_budget.as_dict() if token_budget is not None and token_budget.limited else None
     }
\ No newline at end of file
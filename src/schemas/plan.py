@@ -9,6 +9,9 @@ class PlanBase(BaseModel):
     description: Optional[str] = Field(None, max_length=500, description="Plan description")
     query_limit: int = Field(..., gt=0, description="Maximum number of queries allowed")
     query_window_hours: int = Field(..., gt=0, description="Time window in hours for query limit")
+    input_token_limit: Optional[int] = Field(None, gt=0, description="Prompt tokens allowed per window (None = unlimited)")
+    output_token_limit: Optional[int] = Field(None, gt=0, description="Completion tokens allowed per window (None = unlimited)")
+    total_token_limit: Optional[int] = Field(None, gt=0, description="Total tokens allowed per window (None = unlimited)")
 
 
 class PlanCreate(PlanBase):
@@ -22,6 +25,9 @@ class PlanUpdate(BaseModel):
     description: Optional[str] = Field(None, max_length=500)
     query_limit: Optional[int] = Field(None, gt=0)
     query_window_hours: Optional[int] = Field(None, gt=0)
+    input_token_limit: Optional[int] = Field(None, gt=0)
+    output_token_limit: Optional[int] = Field(None, gt=0)
+    total_token_limit: Optional[int] = Field(None, gt=0)
     is_active: Optional[bool] = None
 
 
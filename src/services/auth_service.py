@@ -27,36 +27,36 @@ def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
         Typical time: 100-300ms for password hashing.
     """
     start_time = time.time()
-    logger.info(f"Authentication attempt for email: {email}")
+    logger.info("Authentication attempt for email: %s", email)
     
     # Get user from database
     user = get_user_by_email(db, email)
     if not user:
-        logger.warning(f"Authentication failed: User not found - {email}")
+        logger.warning("Authentication failed: User not found - %s", email)
         return None
     
-    logger.debug(f"User found: {email}, verifying password...")
+    logger.debug("User found: %s, verifying password...", email)
     
     # Verify password (this is the slow part - bcrypt by design)
     password_start = time.time()
     if not verify_password(password, user.password):
         password_time = time.time() - password_start
-        logger.warning(f"Authentication failed: Invalid password - {email} (took {password_time:.2f}s)")
+        logger.warning("Authentication failed: Invalid password - %s (took %.2fs)", email, password_time)
         return None
     password_time = time.time() - password_start
-    logger.debug(f"Password verified successfully (took {password_time:.2f}s)")
+    logger.debug("Password verified successfully (took %.2fs)", password_time)
     
     # Check if user is active
     if not user.is_active:
-        logger.warning(f"Authentication failed: User inactive - {email}")
+        logger.warning("Authentication failed: User inactive - %s", email)
         return None
 
     # Update last login
-    logger.debug(f"Updating last login for user: {email}")
+    logger.debug("Updating last login for user: %s", email)
     update_last_login(db, user.id)
 
     total_time = time.time() - start_time
-    logger.info(f"Authentication successful for {email} (total time: {total_time:.2f}s)")
+    logger.info("Authentication successful for %s (total time: %.2fs)", email, total_time)
     return user
 
 
@@ -0,0 +1,62 @@
+from typing import Optional
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.orm import Session
+from src.models.llm_cache import LLMCacheEntry
+
+
+def get_cached_response(db: Session, key: str) -> Optional[LLMCacheEntry]:
+    """
+    Get a non-expired cache entry by key.
+    
+    Args:
+        db: Database session
+        key: Cache key
+        
+    Returns:
+        LLMCacheEntry object or None if missing or expired
+    """
+    return db.query(LLMCacheEntry).filter(
+        LLMCacheEntry.key == key,
+        LLMCacheEntry.expires_at > datetime.now(timezone.utc)
+    ).first()
+
+
+def upsert_cached_response(db: Session, key: str, response: str, model: Optional[str], ttl_seconds: int) -> LLMCacheEntry:
+    """
+    Create or replace a cache entry.
+    
+    Args:
+        db: Database session
+        key: Cache key
+        response: Response content to cache
+        model: Model name reported by the provider
+        ttl_seconds: Time to live in seconds
+        
+    Returns:
+        Stored LLMCacheEntry object
+    """
+    entry = db.merge(LLMCacheEntry(
+        key=key,
+        model=model,
+        response=response,
+        expires_at=datetime.now(timezone.utc) + timedelta(seconds=ttl_seconds)
+    ))
+    db.commit()
+    return entry
+
+
+def delete_expired_cached_responses(db: Session) -> int:
+    """
+    Delete expired cache entries.
+    
+    Args:
+        db: Database session
+        
+    Returns:
+        Number of deleted records
+    """
+    count = db.query(LLMCacheEntry).filter(
+        LLMCacheEntry.expires_at <= datetime.now(timezone.utc)
+    ).delete()
+    db.commit()
+    return count
@@ -78,6 +78,9 @@ def create_plan(db: Session, plan_data: PlanCreate) -> Plan:
         description=plan_data.description,
         query_limit=plan_data.query_limit,
         query_window_hours=plan_data.query_window_hours,
+        input_token_limit=plan_data.input_token_limit,
+        output_token_limit=plan_data.output_token_limit,
+        total_token_limit=plan_data.total_token_limit,
         is_active=plan_data.is_active
     )
     db.add(db_plan)
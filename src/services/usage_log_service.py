@@ -1,11 +1,14 @@
+from dataclasses import replace
 from typing import Optional, List, Tuple
 from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
-from sqlalchemy import desc, func
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import desc, func, insert
 from src.models.usage_log import UsageLog
+from src.models.usage_counter import UsageCounter
 from src.schemas.usage_log import UsageLogCreate, UsageLogUpdate
 from src.core.config import settings
 from src.core.logging import logger
+from src.core.token_budget import TokenBudget
 
 
 def create_usage_log(db: Session, user_id: int, usage_data: UsageLogCreate) -> UsageLog:
@@ -31,11 +34,194 @@ def create_usage_log(db: Session, user_id: int, usage_data: UsageLogCreate) -> U
         total=usage_data.total
     )
     db.add(db_usage_log)
+    increment_usage_counter(db, user_id, usage_data.inputs or 0, usage_data.outputs or 0, usage_data.total or 0)
     db.commit()
     db.refresh(db_usage_log)
     return db_usage_log
 
 
+def create_usage_logs_bulk(db: Session, user_id: int, usage_data_list: List[UsageLogCreate]) -> int:
+    """
+    Create many usage log entries in a single round trip and transaction.
+    
+    Args:
+        db: Database session
+        user_id: ID of the user
+        usage_data_list: UsageLogCreate schemas with token usage data
+        
+    Returns:
+        Number of inserted records
+    """
+    if not usage_data_list:
+        return 0
+
+    rows = [
+        {"user_id": user_id, **usage_data.model_dump()}
+        for usage_data in usage_data_list
+    ]
+    db.execute(insert(UsageLog), rows)
+    increment_usage_counter(
+        db,
+        user_id,
+        sum(row["inputs"] or 0 for row in rows),
+        sum(row["outputs"] or 0 for row in rows),
+        sum(row["total"] or 0 for row in rows),
+    )
+    db.commit()
+    return len(rows)
+
+
+RESERVED_NODE_CALL_TID = "reserved"
+
+
+def reserve_chatbot_queries(db: Session, user_id: int, main_call_tids: List[str]) -> Tuple[bool, int, int, int, int]:
+    """
+    Reserve queries of the user's plan before running them.
+
+    One placeholder usage log per main_call_tid is committed first and the
+    limit is checked afterwards, so concurrent requests see each other's
+    reservations and cannot overspend together. When the limit is exceeded
+    the placeholders are deleted again. The real usage logs of a query share
+    its main_call_tid, so the query keeps counting once; release the
+    placeholders with release_query_reservations when they are written.
+    
+    Args:
+        db: Database session
+        user_id: ID of the user
+        main_call_tids: main_call_tid of each query to reserve
+        
+    Returns:
+        Tuple[bool, int, int, int, int]: (reserved, queries_used, queries_remaining, query_limit, query_window_hours),
+        the counts excluding this reservation when it failed
+    """
+    db.execute(insert(UsageLog), [
+        {
+            "user_id": user_id,
+            "main_call_tid": main_call_tid,
+            "node_call_tid": RESERVED_NODE_CALL_TID,
+            "description": "Reserved query",
+            "inputs": 0,
+            "outputs": 0,
+            "total": 0,
+        }
+        for main_call_tid in main_call_tids
+    ])
+    db.commit()
+
+    _, queries_used, _, query_limit, query_window_hours = check_chatbot_rate_limit(db, user_id)
+    if queries_used <= query_limit:
+        return True, queries_used, query_limit - queries_used, query_limit, query_window_hours
+
+    release_query_reservations(db, user_id, main_call_tids)
+    db.commit()
+    queries_used -= len(main_call_tids)
+    return False, queries_used, max(0, query_limit - queries_used), query_limit, query_window_hours
+
+
+def release_query_reservations(db: Session, user_id: int, main_call_tids: List[str]) -> None:
+    """
+    Delete the placeholder usage logs of reserved queries.
+    Runs in the caller's transaction; the caller commits.
+    """
+    db.query(UsageLog).filter(
+        UsageLog.user_id == user_id,
+        UsageLog.main_call_tid.in_(main_call_tids),
+        UsageLog.node_call_tid == RESERVED_NODE_CALL_TID
+    ).delete(synchronize_session=False)
+
+
+def _hour_bucket(at: datetime) -> datetime:
+    return at.replace(minute=0, second=0, microsecond=0)
+
+
+def increment_usage_counter(db: Session, user_id: int, inputs: int, outputs: int, total: int) -> None:
+    """
+    Add tokens to the user's counter for the current hour (UTC).
+    Runs in the caller's transaction; the caller commits.
+    
+    Args:
+        db: Database session
+        user_id: ID of the user
+        inputs: Prompt tokens
+        outputs: Completion tokens
+        total: Total tokens
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as upsert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as upsert
+
+    statement = upsert(UsageCounter).values(
+        user_id=user_id,
+        bucket_start=_hour_bucket(datetime.utcnow()),
+        input_tokens=inputs,
+        output_tokens=outputs,
+        total_tokens=total,
+    )
+    # One statement, atomic under concurrent writers of the same bucket
+    db.execute(statement.on_conflict_do_update(
+        index_elements=[UsageCounter.user_id, UsageCounter.bucket_start],
+        set_={
+            "input_tokens": UsageCounter.input_tokens + statement.excluded.input_tokens,
+            "output_tokens": UsageCounter.output_tokens + statement.excluded.output_tokens,
+            "total_tokens": UsageCounter.total_tokens + statement.excluded.total_tokens,
+        },
+    ))
+
+
+def get_token_usage(db: Session, user_id: int, window_hours: int) -> Tuple[int, int, int]:
+    """
+    Get the tokens a user consumed in the last window_hours.
+    Whole hourly buckets are counted, so up to one extra hour may be included.
+    
+    Args:
+        db: Database session
+        user_id: ID of the user
+        window_hours: Window length in hours
+        
+    Returns:
+        Tuple[int, int, int]: (input_tokens, output_tokens, total_tokens)
+    """
+    window_start = _hour_bucket(datetime.utcnow() - timedelta(hours=window_hours))
+    inputs, outputs, total = db.query(
+        func.coalesce(func.sum(UsageCounter.input_tokens), 0),
+        func.coalesce(func.sum(UsageCounter.output_tokens), 0),
+        func.coalesce(func.sum(UsageCounter.total_tokens), 0),
+    ).filter(
+        UsageCounter.user_id == user_id,
+        UsageCounter.bucket_start >= window_start
+    ).one()
+    return int(inputs), int(outputs), int(total)
+
+
+def get_token_budget(db: Session, user) -> Optional[TokenBudget]:
+    """
+    Get the token budget of a user's plan with the usage of the current window.
+    
+    Args:
+        db: Database session
+        user: User with its plan loaded
+        
+    Returns:
+        TokenBudget, or None if the user has no plan
+    """
+    plan = user.plan
+    if plan is None:
+        return None
+    budget = TokenBudget(
+        window_hours=plan.query_window_hours,
+        input_limit=plan.input_token_limit,
+        output_limit=plan.output_token_limit,
+        total_limit=plan.total_token_limit,
+    )
+    if not budget.limited:
+        # Unlimited plans skip the usage query on the chat hot path
+        return budget
+    inputs, outputs, total = get_token_usage(db, user.id, plan.query_window_hours)
+    return replace(budget, input_used=inputs, output_used=outputs, total_used=total)
+
+
 def get_usage_log_by_id(db: Session, usage_log_id: int) -> Optional[UsageLog]:
     """Get usage log by ID."""
     return db.query(UsageLog).filter(UsageLog.id == usage_log_id).first()
@@ -262,9 +448,10 @@ def check_chatbot_rate_limit(db: Session, user_id: int) -> Tuple[bool, int, int,
     from src.models.user import User
     
     # Obtener usuario con su plan
-    user = db.query(User).filter(User.id == user_id).first()
+    # Usually already in the session (loaded with its plan by get_current_user), so no query
+    user = db.get(User, user_id, options=[joinedload(User.plan)])
     if not user or not user.plan:
-        logger.error(f"User {user_id} or their plan not found")
+        logger.error("User %s or their plan not found", user_id)
         # Fallback a valores por defecto si hay error
         return False, 0, 0, settings.CHATBOT_QUERY_LIMIT, settings.CHATBOT_QUERY_WINDOW_HOURS
     
@@ -286,9 +473,8 @@ def check_chatbot_rate_limit(db: Session, user_id: int) -> Tuple[bool, int, int,
     can_query = queries_used < query_limit
     
     logger.info(
-        f"Chatbot rate limit check for user {user_id} (plan: {user.plan.name}): "
-        f"used={queries_used}/{query_limit}, "
-        f"remaining={queries_remaining}, window={query_window_hours}h, can_query={can_query}"
+        "Chatbot rate limit check for user %s (plan: %s): used=%d/%d, remaining=%d, window=%sh, can_query=%s",
+        user_id, user.plan.name, queries_used, query_limit, queries_remaining, query_window_hours, can_query
     )
     
     return can_query, queries_used, queries_remaining, query_limit, query_window_hours
@@ -1,6 +1,6 @@
 from datetime import datetime
 from typing import Optional
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from src.models.user import User
 from src.models.profile import Profile
 from src.schemas.user import UserCreate, UserUpdate
@@ -10,13 +10,16 @@ from src.core.logging import logger
 
 
 def get_user_by_id(db: Session, user_id: int) -> Optional[User]:
-    """Get user by ID."""
-    return db.query(User).filter(User.id == user_id).first()
+    """Get user by ID (served from the session's identity map when already loaded)."""
+    return db.get(User, user_id)
 
 
-def get_user_by_email(db: Session, email: str) -> Optional[User]:
-    """Get user by email."""
-    return db.query(User).filter(User.email == email).first()
+def get_user_by_email(db: Session, email: str, with_plan: bool = False) -> Optional[User]:
+    """Get user by email, optionally loading the plan in the same query."""
+    query = db.query(User)
+    if with_plan:
+        query = query.options(joinedload(User.plan))
+    return query.filter(User.email == email).first()
 
 
 def get_user_by_username(db: Session, username: str) -> Optional[User]:
@@ -45,10 +48,9 @@ def create_user(db: Session, user_data: UserCreate) -> User:
         plan_id=default_plan.id
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    db.flush()
 
-    # Create default profile
+    # Create default profile in the same transaction
     db_profile = Profile(
         user_id=db_user.id,
         language="en"
@@ -1,6 +1,7 @@
 import pytest
 import asyncio
 import sys
+from contextlib import contextmanager
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
@@ -8,6 +9,12 @@ from src.main import app
 from src.db.session import get_db
 from src.models.base import Base
 from src.models.plan import Plan
+from src.core.config import settings
+from src.core.query_stats import install_query_stats, track_queries
+from src.db.schema import create_tables
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
 
 # Use SelectorEventLoop on Windows for psycopg compatibility
 if sys.platform == "win32":
@@ -18,6 +25,7 @@ SQLALCHEMY_DATABASE_URL = "postgresql://postgres:zUBMRKsAxGvyImaTOkvJgvcEVduPWJj
 
 engine = create_engine(SQLALCHEMY_DATABASE_URL)
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+install_query_stats(engine)
 
 
 @pytest.fixture(scope="session")
@@ -28,6 +36,14 @@ def event_loop():
     loop.close()
 
 
+@pytest.fixture(scope="session", autouse=True)
+def database_schema():
+    """Create the tables from the models; the test database is not migrated with Alembic."""
+    create_tables(engine)
+    settings.SCHEMA_CHECK = "off"
+    yield
+
+
 @pytest.fixture(scope="function")
 def db_session():
     """Create a fresh database session for each test with transaction rollback."""
@@ -84,6 +100,23 @@ def test_plan(db_session):
     return plan
 
 
+@pytest.fixture
+def assert_max_queries():
+    """
+    Fail if a block runs more SQL statements than its budget.
+
+    Usage: ``with assert_max_queries(3): client.get("/users/me", headers=headers)``
+    """
+    @contextmanager
+    def check(limit: int):
+        with track_queries() as stats:
+            yield stats
+        assert stats.count <= limit, (
+            f"Expected at most {limit} queries, got {stats.count}:\n" + "\n".join(stats.statements)
+        )
+    return check
+
+
 @pytest.fixture
 def test_user_data():
     """Sample user data for testing."""
@@ -94,3 +127,33 @@ def test_user_data():
         "first_name": "Test",
         "last_name": "User"
     }
+
+
+class FakeChatModel(BaseChatModel):
+    """Minimal stand-in for the chatbot LLM that reports token usage."""
+
+    content: str = "Hello from the fake model"
+    model_name: str = "fake-model"
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        message = AIMessage(
+            content=self.content,
+            response_metadata={"model_name": self.model_name},
+            usage_metadata={"input_tokens": 10, "output_tokens": 5, "total_tokens": 15},
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """Replace the chatbot node LLM with a FakeChatModel."""
+    from agents.basic.nodes.chatbot import node
+    llm = FakeChatModel()
+    monkeypatch.setattr(node, "llm", llm)
+    return llm
@@ -0,0 +1,163 @@
+import asyncio
+import time
+import pytest
+from src.core.adaptive_limiter import AdaptiveLimiter, is_overload_error
+
+
+class FakeOverloadError(Exception):
+    """Stand-in for a provider 429 response."""
+    status_code = 429
+
+
+class LoadSensitiveLLM:
+    """
+    Fake LLM whose latency degrades under load.
+
+    Each call takes base_latency, plus penalty x base_latency for every
+    concurrent call above capacity. Calls above hard_limit fail with a 429.
+    """
+
+    def __init__(self, base_latency=0.01, capacity=8, penalty=0.5, hard_limit=None):
+        self.base_latency = base_latency
+        self.capacity = capacity
+        self.penalty = penalty
+        self.hard_limit = hard_limit
+        self.active = 0
+        self.max_active = 0
+
+    async def ainvoke(self):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            if self.hard_limit is not None and self.active > self.hard_limit:
+                raise FakeOverloadError("rate limited")
+            overload = max(0, self.active - self.capacity)
+            await asyncio.sleep(self.base_latency * (1 + overload * self.penalty))
+        finally:
+            self.active -= 1
+
+
+async def simulate(llm, limiter, clients, calls_per_client):
+    """Drive the fake LLM from concurrent clients and collect latency and errors."""
+    service_times = []
+    errors = 0
+
+    async def call():
+        start = time.perf_counter()
+        await llm.ainvoke()
+        service_times.append(time.perf_counter() - start)
+
+    async def client():
+        nonlocal errors
+        for _ in range(calls_per_client):
+            try:
+                if limiter is None:
+                    await call()
+                else:
+                    async with limiter.slot():
+                        await call()
+            except FakeOverloadError:
+                errors += 1
+
+    await asyncio.gather(*(client() for _ in range(clients)))
+    service_times.sort()
+    return {
+        "p50": service_times[len(service_times) // 2] if service_times else 0.0,
+        "errors": errors,
+        "calls": clients * calls_per_client,
+        "max_active": llm.max_active,
+    }
+
+
+def make_limiter(**overrides):
+    options = dict(initial_limit=4, min_limit=1, max_limit=64, latency_tolerance=2.0, backoff_ratio=0.7)
+    options.update(overrides)
+    return AdaptiveLimiter(**options)
+
+
+def test_limit_converges_near_provider_capacity():
+    """Test that the limit settles around the point where latency starts degrading."""
+    llm = LoadSensitiveLLM(capacity=8)
+    limiter = make_limiter()
+
+    result = asyncio.run(simulate(llm, limiter, clients=32, calls_per_client=20))
+
+    assert 4 <= limiter.limit <= 14
+    assert limiter.stats()["decreases_total"] >= 1
+    assert result["max_active"] < 32
+
+
+def test_limited_latency_beats_unlimited_under_load():
+    """Test that limiting keeps per-call latency close to the no-load baseline."""
+    limited = asyncio.run(simulate(LoadSensitiveLLM(capacity=8), make_limiter(), clients=32, calls_per_client=10))
+    unlimited = asyncio.run(simulate(LoadSensitiveLLM(capacity=8), None, clients=32, calls_per_client=3))
+
+    assert limited["p50"] < unlimited["p50"] / 2
+
+
+def test_backs_off_on_provider_rate_limits():
+    """Test that 429s shrink the limit below the provider's hard cap."""
+    llm = LoadSensitiveLLM(capacity=100, hard_limit=6)
+    limiter = make_limiter(initial_limit=16)
+
+    result = asyncio.run(simulate(llm, limiter, clients=24, calls_per_client=15))
+
+    assert limiter.stats()["overload_errors_total"] == result["errors"]
+    assert result["errors"] < result["calls"] * 0.15
+    assert limiter.limit <= 8
+
+
+def test_release_updates_limit():
+    """Test additive increase on fast saturated calls and multiplicative decrease on overload."""
+    now = [0.0]
+    limiter = make_limiter(initial_limit=2, clock=lambda: now[0])
+
+    async def scenario():
+        await limiter.acquire()
+        await limiter.acquire()
+        limiter.release(0.1)
+        limiter.release(0.1)
+        assert limiter.stats()["increases_total"] == 1
+
+        await limiter.acquire()
+        now[0] += 1.0
+        limiter.release(0.1, overloaded=True)
+        assert limiter.limit == 1
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_calls_do_not_move_the_limit():
+    """Test that a call cancelled mid-flight frees its slot without counting as a latency sample."""
+    now = [0.0]
+    limiter = make_limiter(initial_limit=2, clock=lambda: now[0])
+
+    async def scenario():
+        async with limiter.slot():
+            now[0] += 0.1
+        started = asyncio.Event()
+
+        async def abandoned():
+            async with limiter.slot():
+                started.set()
+                await asyncio.sleep(60)
+
+        task = asyncio.create_task(abandoned())
+        await started.wait()
+        now[0] += 5.0  # Far over the baseline had it completed
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(scenario())
+    stats = limiter.stats()
+    assert stats["in_flight"] == 0
+    assert stats["decreases_total"] == 0
+    assert stats["baseline_latency_seconds"] == pytest.approx(0.1)
+    assert stats["last_latency_seconds"] == pytest.approx(0.1)
+
+
+def test_is_overload_error():
+    """Test that only overload-type failures count against the limit."""
+    assert is_overload_error(FakeOverloadError())
+    assert is_overload_error(asyncio.TimeoutError())
+    assert not is_overload_error(ValueError("bad request"))
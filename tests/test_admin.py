@@ -0,0 +1,187 @@
+import sys
+import threading
+
+from fastapi import status
+
+from src.core.profiling import ProfilerBusy, StackSampler
+from src.models.user import User
+
+
+def get_auth_headers(client, test_user_data):
+    """Helper function to register and login a user."""
+    client.post("/auth/register", json=test_user_data)
+    login_data = {
+        "username": test_user_data["email"],
+        "password": test_user_data["password"]
+    }
+    response = client.post("/auth/token", data=login_data)
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def get_superuser_headers(client, db_session, test_user_data):
+    """Register a user and promote it to superuser."""
+    headers = get_auth_headers(client, test_user_data)
+    user = db_session.query(User).filter(User.email == test_user_data["email"]).first()
+    user.is_superuser = True
+    db_session.commit()
+    return headers
+
+
+def test_admin_requires_superuser(client, test_user_data, test_plan):
+    """Test that regular users cannot use the diagnostics endpoints."""
+    headers = get_auth_headers(client, test_user_data)
+    response = client.post("/admin/profile/cpu?seconds=0.1", headers=headers)
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+    response = client.post("/admin/memory/start", headers=headers)
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+def test_cpu_profile_collapsed(client, db_session, test_user_data, test_plan):
+    """Test that the CPU profile is returned in collapsed-stack format."""
+    headers = get_superuser_headers(client, db_session, test_user_data)
+    response = client.post("/admin/profile/cpu?seconds=0.2&interval_ms=5&include_idle=true", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert "attachment" in response.headers["content-disposition"]
+    lines = response.text.strip().splitlines()
+    assert lines
+    stack, count = lines[0].rsplit(" ", 1)
+    assert ";" in stack
+    assert int(count) > 0
+
+
+def test_cpu_profile_json(client, db_session, test_user_data, test_plan):
+    """Test that the json format reports sample counts and top stacks."""
+    headers = get_superuser_headers(client, db_session, test_user_data)
+    response = client.post(
+        "/admin/profile/cpu?seconds=0.2&interval_ms=5&include_idle=true&format=json&limit=5", headers=headers
+    )
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["samples"] > 0
+    assert 0 < len(data["stacks"]) <= 5
+
+
+def test_sampler_finds_busy_function():
+    """Test that a CPU-bound function dominates the samples of its thread."""
+    stop = threading.Event()
+
+    def spin_for_profile():
+        while not stop.is_set():
+            sum(range(1000))
+
+    worker = threading.Thread(target=spin_for_profile, name="spinner")
+    worker.start()
+    try:
+        profile = StackSampler().run(0.3, 0.005)
+    finally:
+        stop.set()
+        worker.join()
+
+    spinner = sum(count for stack, count in profile.stacks.items() if stack.startswith("spinner;"))
+    busy = sum(count for stack, count in profile.stacks.items() if "spin_for_profile" in stack)
+    assert busy > 0
+    assert busy == spinner
+
+
+def test_sampler_rejects_concurrent_runs():
+    """Test that only one profile runs at a time."""
+    sampler = StackSampler()
+    started = threading.Event()
+    errors = []
+
+    def second_run():
+        started.wait()
+        try:
+            sampler.run(0.01)
+        except ProfilerBusy as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=second_run)
+    thread.start()
+    sampler._lock.acquire()
+    started.set()
+    thread.join()
+    sampler._lock.release()
+    assert errors
+
+
+def test_memory_snapshots_diff(client, db_session, test_user_data, test_plan):
+    """Test that the second snapshot reports growth since the first."""
+    headers = get_superuser_headers(client, db_session, test_user_data)
+    response = client.post("/admin/memory/snapshot", headers=headers)
+    assert response.status_code == status.HTTP_409_CONFLICT
+
+    try:
+        assert client.post("/admin/memory/start", headers=headers).status_code == status.HTTP_200_OK
+        first = client.post("/admin/memory/snapshot", headers=headers).json()
+        assert first["diff"] is None
+        assert first["top"]
+
+        retained = [bytearray(1024) for _ in range(1000)]
+        second = client.post("/admin/memory/snapshot?key_type=traceback&limit=50", headers=headers).json()
+        assert second["diff"] is not None
+        assert any("test_admin.py" in " ".join(entry["location"]) for entry in second["diff"])
+        assert len(retained) == 1000
+    finally:
+        response = client.post("/admin/memory/stop", headers=headers)
+    assert response.json()["tracing"] is False
+
+
+def test_process_usage_logs_closes_session(monkeypatch):
+    """Test that the usage-log session is closed even when a write fails."""
+    from agents.basic import usage
+
+    class FakeSession:
+        closed = False
+        rolled_back = False
+
+        def rollback(self):
+            self.rolled_back = True
+
+        def close(self):
+            self.closed = True
+
+    session = FakeSession()
+
+    def failing_create(db, user_id, usage_data):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(usage, "SessionLocal", lambda: session)
+    monkeypatch.setattr(usage, "create_usage_log", failing_create)
+
+    totals = usage.process_usage_logs(
+        {"fake-model": {"input_tokens": 1, "output_tokens": 2, "total_tokens": 3}}, 1, "call-1"
+    )
+    assert totals["total_tokens"] == 3
+    assert session.rolled_back
+    assert session.closed
+
+
+def test_event_loop_stats(client, db_session, test_user_data, test_plan):
+    """Test that the event-loop endpoints report lag and toggle the blocking-call detector."""
+    headers = get_superuser_headers(client, db_session, test_user_data)
+
+    response = client.post("/admin/event-loop/debug?enabled=true", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["debug"] is True
+
+    response = client.get("/admin/event-loop", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["running"] is True and data["debug"] is True
+    assert isinstance(data["blocks"], list)
+
+    response = client.post("/admin/event-loop/debug?enabled=false", headers=headers)
+    assert response.json()["debug"] is False
+
+
+def test_deep_stacks_keep_root_and_leaf_frames():
+    """Test that stacks deeper than max_depth lose middle frames, marked in the stack."""
+    def recurse(depth):
+        return recurse(depth - 1) if depth else sys._getframe()
+
+    stack = StackSampler(max_depth=10)._collapse(recurse(30)).split(";")
+    assert len(stack) == 11
+    assert "recurse" not in stack[0]  # The thread's entry point is still the root
+    assert stack[5].endswith("frames truncated]")
+    assert all("recurse" in label for label in stack[6:])
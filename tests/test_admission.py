@@ -0,0 +1,89 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from src.core.admission import AdmissionController, AdmissionRejected, plan_priority
+
+
+def test_admits_immediately_under_cap():
+    """Test that runs below the concurrency cap are admitted without queueing."""
+    async def scenario():
+        controller = AdmissionController(max_concurrency=2, max_queue_size=10, max_wait_seconds=1)
+        first = await controller.acquire(priority=3)
+        second = await controller.acquire(priority=3)
+        assert controller.in_flight == 2
+        first.release()
+        second.release()
+        second.release()  # Releasing twice is a no-op
+        assert controller.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_higher_priority_plan_is_admitted_first():
+    """Test that queued waiters are admitted by priority, then arrival order."""
+    async def scenario():
+        controller = AdmissionController(max_concurrency=1, max_queue_size=10, max_wait_seconds=5)
+        holder = await controller.acquire(priority=3)
+        order = []
+
+        async def waiter(name, priority):
+            async with controller.slot(priority):
+                order.append(name)
+
+        tasks = [
+            asyncio.create_task(waiter("free-1", 3)),
+            asyncio.create_task(waiter("free-2", 3)),
+            asyncio.create_task(waiter("enterprise", 0)),
+        ]
+        await asyncio.sleep(0.01)
+        assert controller.stats()["queue_length"] == 3
+
+        holder.release()
+        await asyncio.gather(*tasks)
+        assert order == ["enterprise", "free-1", "free-2"]
+        assert controller.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_sheds_when_queue_is_full():
+    """Test that a full queue rejects new runs immediately."""
+    async def scenario():
+        controller = AdmissionController(max_concurrency=1, max_queue_size=1, max_wait_seconds=5)
+        holder = await controller.acquire(priority=0)
+        queued = asyncio.create_task(controller.acquire(priority=0))
+        await asyncio.sleep(0.01)
+
+        with pytest.raises(AdmissionRejected):
+            await controller.acquire(priority=0)
+        assert controller.stats()["rejected_total"]["queue_full"] == 1
+
+        holder.release()
+        (await queued).release()
+
+    asyncio.run(scenario())
+
+
+def test_sheds_after_max_wait():
+    """Test that waiters are rejected once the maximum queue wait elapses."""
+    async def scenario():
+        controller = AdmissionController(max_concurrency=1, max_queue_size=10, max_wait_seconds=0.05)
+        holder = await controller.acquire(priority=0)
+
+        with pytest.raises(AdmissionRejected) as exc_info:
+            await controller.acquire(priority=0)
+        assert exc_info.value.retry_after >= 1
+        assert controller.stats()["rejected_total"]["timeout"] == 1
+        assert controller.stats()["queue_length"] == 0
+
+        # The abandoned wait must not swallow the released slot
+        holder.release()
+        assert controller.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_plan_priority_mapping():
+    """Test that plans map to configured priorities with a default for unknown plans."""
+    assert plan_priority(SimpleNamespace(name="Enterprise")) < plan_priority(SimpleNamespace(name="Free"))
+    assert plan_priority(SimpleNamespace(name="Unknown")) == plan_priority(None)
@@ -0,0 +1,26 @@
+from fastapi import status
+
+
+def get_auth_headers(client, test_user_data):
+    """Helper function to register and login a user."""
+    client.post("/auth/register", json=test_user_data)
+    login_data = {
+        "username": test_user_data["email"],
+        "password": test_user_data["password"]
+    }
+    response = client.post("/auth/token", data=login_data)
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def test_usage_reports_plan_limits(client, test_user_data, test_plan):
+    """Test that /chatbot/usage reports the limits of the user's plan."""
+    headers = get_auth_headers(client, test_user_data)
+
+    response = client.get("/chatbot/usage", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["used"] == 0
+    assert data["remaining"] == test_plan.query_limit
+    assert data["limit"] == test_plan.query_limit
+    assert data["window_hours"] == test_plan.query_window_hours
+    assert data["can_query"] is True
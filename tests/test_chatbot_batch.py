@@ -0,0 +1,150 @@
+import asyncio
+import json
+import pytest
+from fastapi import status
+from src.models.usage_log import UsageLog
+from src.models.user import User
+from tests.conftest import FakeChatModel
+
+
+def get_auth_headers(client, test_user_data):
+    """Helper function to register and login a user."""
+    client.post("/auth/register", json=test_user_data)
+    login_data = {
+        "username": test_user_data["email"],
+        "password": test_user_data["password"]
+    }
+    response = client.post("/auth/token", data=login_data)
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture
+def batch_session(monkeypatch, db_session):
+    """Route the bulk usage-log write through the test transaction."""
+    from src.routers import chatbot
+    monkeypatch.setattr(chatbot, "SessionLocal", lambda: db_session)
+    return db_session
+
+
+def test_batch_streams_ndjson_results(client, test_user_data, test_plan, fake_llm, batch_session):
+    """Test that every batch item produces one NDJSON result line."""
+    headers = get_auth_headers(client, test_user_data)
+    payload = {
+        "items": [
+            {"message": "hi"},
+            {"message": "first", "thread": "a"},
+            {"message": "second", "thread": "a"},
+        ],
+        "concurrency": 2
+    }
+
+    response = client.post("/chatbot/batch", json=payload, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    results = [json.loads(line) for line in response.text.splitlines() if line]
+    assert sorted(result["index"] for result in results) == [0, 1, 2]
+    assert all(result["status"] == "ok" for result in results)
+    assert all(result["response"] == fake_llm.content for result in results)
+    assert fake_llm.calls == 3
+
+    user = batch_session.query(User).filter(User.email == test_user_data["email"]).first()
+    logs = batch_session.query(UsageLog).filter(UsageLog.user_id == user.id).all()
+    assert len(logs) == 3
+    assert len({log.main_call_tid for log in logs}) == 3
+
+
+def test_batch_rejected_when_over_quota(client, test_user_data, test_plan, fake_llm):
+    """Test that a batch larger than the remaining quota is rejected up front."""
+    headers = get_auth_headers(client, test_user_data)
+    payload = {"items": [{"message": f"q{i}"} for i in range(test_plan.query_limit + 1)]}
+
+    response = client.post("/chatbot/batch", json=payload, headers=headers)
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert fake_llm.calls == 0
+
+
+def test_batch_counts_queries_reserved_by_running_batches(client, test_user_data, test_plan, fake_llm, batch_session):
+    """Test that queries reserved by a batch still running count against the quota of the next one."""
+    from src.services.usage_log_service import reserve_chatbot_queries
+
+    headers = get_auth_headers(client, test_user_data)
+    user_id = batch_session.query(User.id).filter(User.email == test_user_data["email"]).scalar()
+    in_flight = [f"parent-running-{i}" for i in range(test_plan.query_limit - 1)]
+    assert reserve_chatbot_queries(batch_session, user_id, in_flight)[0]
+
+    response = client.post("/chatbot/batch", json={"items": [{"message": "a"}, {"message": "b"}]}, headers=headers)
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert response.json()["detail"]["queries_remaining"] == 1
+
+    response = client.post("/chatbot/batch", json={"items": [{"message": "a"}]}, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert fake_llm.calls == 1
+    # The finished batch's reservation was replaced by its usage log
+    logs = batch_session.query(UsageLog).filter(UsageLog.user_id == user_id).all()
+    assert len(logs) == test_plan.query_limit
+    assert sum(log.node_call_tid == "reserved" for log in logs) == len(in_flight)
+
+
+class SlowChatModel(FakeChatModel):
+    """FakeChatModel whose calls take a while; `calls` counts the calls that finished."""
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(0.05)
+        return self._generate(messages, stop, run_manager, **kwargs)
+
+
+def test_batch_abandoned_mid_stream_logs_every_item_that_ran(
+    client, test_user_data, test_plan, batch_session, monkeypatch
+):
+    """Test that a client leaving after the first result stops the batch and still logs the usage of every finished item."""
+    from agents.basic.nodes.chatbot import node
+    from src.core.drain import drain_controller
+
+    llm = SlowChatModel()
+    monkeypatch.setattr(node, "llm", llm)
+    headers = get_auth_headers(client, test_user_data)
+    items = test_plan.query_limit
+
+    async def abandoned_batch():
+        body = json.dumps({"items": [{"message": f"q{i}"} for i in range(items)], "concurrency": 1}).encode()
+        messages = [{"type": "http.request", "body": body, "more_body": False}]
+        first_line = asyncio.Event()
+        sent = []
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            # The client reads the first result and leaves
+            await first_line.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+            if message.get("body"):
+                first_line.set()
+            await asyncio.sleep(0)
+
+        scope = {
+            "type": "http", "asgi": {"version": "3.0", "spec_version": "2.3"}, "http_version": "1.1",
+            "method": "POST", "scheme": "http", "path": "/chatbot/batch", "raw_path": b"/chatbot/batch",
+            "root_path": "", "query_string": b"", "server": ("testserver", 80), "client": ("testclient", 50000),
+            "headers": [
+                (b"host", b"testserver"),
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"authorization", headers["Authorization"].encode()),
+            ],
+        }
+        await client.app(scope, receive, send)
+        return sent
+
+    sent = client.portal.call(abandoned_batch)
+    assert sent[0]["status"] == status.HTTP_200_OK
+    assert 1 <= llm.calls < items  # Stopped early
+    assert (drain_controller.active, drain_controller.pending_writes) == (0, 0)
+
+    user_id = batch_session.query(User.id).filter(User.email == test_user_data["email"]).scalar()
+    logs = batch_session.query(UsageLog).filter(UsageLog.user_id == user_id).all()
+    assert sorted(log.node_call_tid == "reserved" for log in logs) == [False] * llm.calls
+    assert sum(log.total for log in logs) == 15 * llm.calls
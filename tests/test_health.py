@@ -0,0 +1,84 @@
+import asyncio
+import time
+
+from fastapi import status
+from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool
+
+from src.core.config import settings
+from src.core.drain import drain_controller
+from src.core.health import db_pool_state, overload_reasons
+from src.core.loop_monitor import LoopLagMonitor
+
+
+def test_liveness(client):
+    """Test that the liveness probe answers without touching dependencies."""
+    response = client.get("/health/live")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["status"] == "alive"
+
+
+def test_readiness_reports_dependencies(client):
+    """Test that readiness pings the database and checkpointer and reports limiter and loop state."""
+    response = client.get("/health/ready")
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["status"] == "ready"
+    assert data["overloaded"] == []
+    checks = data["checks"]
+    assert checks["database"]["ok"] is True
+    assert checks["checkpointer"]["ok"] is True
+    assert {"limit", "in_flight", "waiting"} <= checks["llm_limiter"].keys()
+    assert checks["event_loop"]["running"] is True
+
+
+def test_readiness_fails_while_draining(client):
+    """Test that a draining worker reports not ready."""
+    drain_controller.start()
+    try:
+        response = client.get("/health/ready")
+    finally:
+        drain_controller.reset()
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.json()["status"] == "draining"
+
+
+def test_chat_requests_shed_when_overloaded(client, monkeypatch):
+    """Test that chat POSTs get 503 with Retry-After while a threshold is crossed, and reads do not."""
+    monkeypatch.setattr(settings, "SHED_LLM_WAITING", 0)
+
+    response = client.post("/chatbot/", json={"message": "hi"})
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.headers["retry-after"] == str(settings.SHED_RETRY_AFTER_SECONDS)
+    assert response.json()["reasons"] == ["llm_limiter"]
+
+    assert client.get("/chatbot/usage").status_code == status.HTTP_401_UNAUTHORIZED
+    assert client.get("/health/ready").status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+
+    monkeypatch.setattr(settings, "LOAD_SHEDDING_ENABLED", False)
+    assert client.post("/chatbot/", json={"message": "hi"}).status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_saturated_db_pool_is_an_overload_reason():
+    """Test that a QueuePool with every connection checked out counts as overloaded."""
+    engine = create_engine("sqlite://", poolclass=QueuePool, pool_size=1, max_overflow=0)
+    assert overload_reasons(engine) == []
+    with engine.connect():
+        assert db_pool_state(engine)["utilization"] == 1.0
+        assert overload_reasons(engine) == ["db_pool"]
+
+
+def test_loop_lag_monitor_measures_blocking():
+    """Test that a blocking call shows up as scheduling delay."""
+    monitor = LoopLagMonitor(interval=0.01)
+
+    async def scenario():
+        monitor.start()
+        await asyncio.sleep(0.05)
+        time.sleep(0.2)
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+
+    asyncio.run(scenario())
+    assert monitor.max_lag >= 0.15
+    assert not monitor.running
@@ -0,0 +1,163 @@
+import asyncio
+
+import pytest
+from fastapi import status
+
+from src.core import idempotency
+from src.core.idempotency import IdempotencyKeyReused, IdempotencyStore
+from src.core.llm_cache import LRUTTLCache
+
+
+class DictBackend:
+    """In-memory stand-in for the shared llm_response_cache tier."""
+
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, value, ttl_seconds):
+        self.entries[key] = value
+
+
+def make_store(backend=None) -> IdempotencyStore:
+    return IdempotencyStore(LRUTTLCache(100, 60), backend)
+
+
+@pytest.fixture
+def store(monkeypatch):
+    """A fresh store in place of the process-wide one."""
+    fresh = make_store()
+    monkeypatch.setattr(idempotency, "idempotency_store", fresh)
+    monkeypatch.setattr("src.dependencies.idempotency_store", fresh)
+    monkeypatch.setattr("src.routers.chatbot.idempotency_store", fresh)
+    return fresh
+
+
+@pytest.fixture
+def usage_writes(monkeypatch):
+    """Record the usage log writes of the chatbot node."""
+    from agents.basic.nodes.chatbot import node
+    calls = []
+
+    async def record(usage_metadata, user_id, main_call_tid, *args):
+        calls.append(main_call_tid)
+        return {}
+
+    monkeypatch.setattr(node, "record_usage", record)
+    return calls
+
+
+def auth_headers(client, test_user_data, **extra):
+    client.post("/auth/register", json=test_user_data)
+    token = client.post(
+        "/auth/token", data={"username": test_user_data["email"], "password": test_user_data["password"]}
+    ).json()["access_token"]
+    return {"Authorization": f"Bearer {token}", **extra}
+
+
+def test_duplicates_attach_to_the_running_turn():
+    """Test that a duplicate of a running stream replays it from the first chunk and follows it live."""
+    async def scenario():
+        store = make_store()
+        record, owner = store.begin("k", "fp", "stream")
+        duplicate, duplicate_owns = store.begin("k", "fp", "stream")
+        assert owner and not duplicate_owns and duplicate is record
+
+        record.append("data: a\n\n")
+        replay = asyncio.create_task(_collect(duplicate.replay()))
+        await asyncio.sleep(0)
+        record.append("data: b\n\n")
+        await store.complete("k", record)
+
+        assert await replay == ["data: a\n\n", "data: b\n\n"]
+        assert (await store.lookup("k", "fp")).chunks == ["data: a\n\n", "data: b\n\n"]
+        with pytest.raises(IdempotencyKeyReused):
+            await store.lookup("k", "other")
+
+    asyncio.run(scenario())
+
+
+def test_failed_turns_are_not_kept():
+    """Test that waiting duplicates see the failure and a later retry runs again."""
+    async def scenario():
+        store = make_store()
+        record, _ = store.begin("k", "fp", "json")
+        waiter = asyncio.create_task(record.result())
+        await asyncio.sleep(0)
+        store.fail("k", record, RuntimeError("provider down"))
+
+        with pytest.raises(RuntimeError):
+            await waiter
+        assert await store.lookup("k", "fp") is None
+        assert store.begin("k", "fp", "json")[1]
+
+    asyncio.run(scenario())
+
+
+def test_completed_turns_shared_through_the_backend():
+    """Test that another worker replays a turn completed elsewhere from the shared backend."""
+    async def scenario():
+        backend = DictBackend()
+        worker_a, worker_b = make_store(backend), make_store(backend)
+        record, _ = worker_a.begin("k", "fp", "json")
+        record.append("Hello")
+        await worker_a.complete("k", record)
+
+        replayed = await worker_b.lookup("k", "fp")
+        assert replayed.done
+        assert await replayed.result() == "Hello"
+
+    asyncio.run(scenario())
+
+
+def test_retry_with_same_key_does_not_run_the_turn_again(client, test_user_data, test_plan, fake_llm, store, usage_writes):
+    """Test that a retried chat turn gets the stored reply without another LLM call or usage log."""
+    headers = auth_headers(client, test_user_data, **{"Idempotency-Key": "retry-1"})
+
+    first = client.post("/chatbot/", json={"message": "hi"}, headers=headers)
+    second = client.post("/chatbot/", json={"message": "hi"}, headers=headers)
+
+    assert first.status_code == second.status_code == status.HTTP_200_OK
+    assert second.json() == first.json() == fake_llm.content
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in first.headers
+    assert fake_llm.calls == 1
+    assert len(usage_writes) == 1
+
+    # A new key is a new turn
+    headers["Idempotency-Key"] = "retry-2"
+    assert client.post("/chatbot/", json={"message": "hi"}, headers=headers).status_code == status.HTTP_200_OK
+    assert fake_llm.calls == 2
+
+
+def test_reused_key_with_another_message_is_rejected(client, test_user_data, test_plan, fake_llm, store):
+    """Test that a key is bound to the request it was first used with."""
+    headers = auth_headers(client, test_user_data, **{"Idempotency-Key": "k"})
+    client.post("/chatbot/", json={"message": "hi"}, headers=headers)
+
+    response = client.post("/chatbot/", json={"message": "something else"}, headers=headers)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    response = client.post("/chatbot/stream", json={"message": "hi"}, headers=headers)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert fake_llm.calls == 1
+
+
+def test_retried_stream_is_replayed(client, test_user_data, test_plan, fake_llm, store, usage_writes):
+    """Test that a retried stream replays the original chunks."""
+    headers = auth_headers(client, test_user_data, **{"Idempotency-Key": "stream-1"})
+
+    first = client.post("/chatbot/stream", json={"message": "hi"}, headers=headers)
+    second = client.post("/chatbot/stream", json={"message": "hi"}, headers=headers)
+
+    assert first.status_code == second.status_code == status.HTTP_200_OK
+    assert fake_llm.content in first.text
+    assert second.text == first.text
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert fake_llm.calls == 1
+    assert len(usage_writes) == 1
+
+
+async def _collect(iterator):
+    return [chunk async for chunk in iterator]
@@ -0,0 +1,127 @@
+import asyncio
+import pytest
+from langchain_core.messages import HumanMessage, AIMessage
+from datetime import datetime, timedelta, timezone
+from src.core.llm_cache import (
+    CachedResponse,
+    DatabaseCacheBackend,
+    LRUTTLCache,
+    ResponseCache,
+    make_cache_key,
+    purge_expired_entries,
+)
+from src.models.llm_cache import LLMCacheEntry
+
+
+class DictBackend:
+    """In-memory stand-in for the shared cache tier."""
+
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, value, ttl_seconds):
+        self.entries[key] = value
+
+
+def test_cache_key_normalizes_whitespace():
+    """Test that equivalent prompts share a key and different settings do not."""
+    key = make_cache_key("openai:gpt-4o-mini", 0.0, "system", [HumanMessage(content="hi  there")])
+
+    assert key == make_cache_key("openai:gpt-4o-mini", 0.0, "system", [HumanMessage(content=" hi there\n")])
+    assert key != make_cache_key("openai:gpt-4o-mini", 0.5, "system", [HumanMessage(content="hi there")])
+    assert key != make_cache_key("openai:gpt-4o", 0.0, "system", [HumanMessage(content="hi there")])
+    assert key != make_cache_key("openai:gpt-4o-mini", 0.0, "system", [AIMessage(content="hi there")])
+
+
+def test_lru_ttl_cache_evicts_oldest_and_expired():
+    """Test LRU eviction by size and expiry by TTL."""
+    now = [0.0]
+    cache = LRUTTLCache(max_entries=2, ttl_seconds=10, clock=lambda: now[0])
+    cache.set("a", CachedResponse("A"))
+    cache.set("b", CachedResponse("B"))
+    cache.get("a")
+    cache.set("c", CachedResponse("C"))
+
+    assert cache.get("b") is None
+    assert cache.get("a").content == "A"
+
+    now[0] = 11
+    assert cache.get("a") is None
+    assert cache.get("c") is None
+
+
+def test_response_cache_tiers():
+    """Test that backend hits are promoted to memory and counted."""
+    async def scenario():
+        backend = DictBackend()
+        cache = ResponseCache(LRUTTLCache(10, 60), backend=backend)
+
+        assert await cache.get("k") is None
+        backend.entries["k"] = CachedResponse("shared", model="gpt-4o-mini")
+        assert (await cache.get("k")).content == "shared"
+        assert (await cache.get("k")).model == "gpt-4o-mini"
+
+        stats = cache.stats()
+        assert stats["misses"] == 1
+        assert stats["hits_backend"] == 1
+        assert stats["hits_memory"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_expired_rows_are_purged(db_session):
+    """Test that the periodic purge deletes expired rows and keeps live ones."""
+    now = datetime.now(timezone.utc)
+    db_session.add_all([
+        LLMCacheEntry(key="old", response="stale", expires_at=now - timedelta(seconds=1)),
+        LLMCacheEntry(key="live", response="fresh", expires_at=now + timedelta(hours=1)),
+    ])
+    db_session.commit()
+    backend = DatabaseCacheBackend(session_factory=lambda: db_session)
+
+    async def scenario():
+        task = asyncio.create_task(purge_expired_entries(0.01, backend))
+        await asyncio.sleep(0.1)
+        task.cancel()
+
+    asyncio.run(scenario())
+    assert [entry.key for entry in db_session.query(LLMCacheEntry).all()] == ["live"]
+
+
+def test_only_deterministic_short_conversations_are_cacheable():
+    """Test the cacheability rules for temperature and history length."""
+    cache = ResponseCache(LRUTTLCache(10, 60), max_temperature=0.2, max_messages=1)
+    fresh = [HumanMessage(content="hi")]
+
+    assert cache.is_cacheable(0.0, fresh)
+    assert not cache.is_cacheable(1.0, fresh)
+    assert not cache.is_cacheable(0.0, fresh + [AIMessage(content="hello"), HumanMessage(content="again")])
+
+
+def test_chatbot_node_serves_hits_with_zero_token_usage(monkeypatch, fake_llm):
+    """Test that a repeated prompt skips the LLM and logs a zero-token usage entry."""
+    from agents.basic.agent import make_graph
+    from agents.basic.nodes.chatbot import node
+
+    monkeypatch.setattr(node, "llm_temperature", 0.0)
+    monkeypatch.setattr(node, "response_cache", ResponseCache(LRUTTLCache(10, 60), max_temperature=0.2))
+
+    async def run_turn(buffer):
+        agent = make_graph(config={"checkpointer": None})
+        config = {"configurable": {"usage_log_buffer": buffer}, "user_id": 1, "main_call_tid": "parent-test"}
+        return await agent.ainvoke({"messages": [HumanMessage(content="hi")]}, config=config)
+
+    first_buffer, second_buffer = [], []
+    first = asyncio.run(run_turn(first_buffer))
+    second = asyncio.run(run_turn(second_buffer))
+
+    assert fake_llm.calls == 1
+    assert second["messages"][-1].content == first["messages"][-1].content
+    assert second["total_tokens"] == 0
+    assert len(second_buffer) == 1
+    assert second_buffer[0].total == 0
+    assert second_buffer[0].model == fake_llm.model_name
+    assert second_buffer[0].description == "Node chatbot (cache hit)"
@@ -0,0 +1,114 @@
+import asyncio
+import time
+import httpx
+import openai
+import pytest
+from langchain_core.messages import HumanMessage
+from langchain_openai import ChatOpenAI
+from benchmarks.fake_llm_server import FakeLLMConfig, FakeLLMServer, create_app
+from src.core import llm_client
+from src.core.config import settings
+
+
+def test_chat_models_share_one_tuned_http_client(monkeypatch):
+    """Test that every chat model is built on the same pooled HTTP client."""
+    monkeypatch.setattr(llm_client, "_http_client", None)
+    first = llm_client.build_chat_model("openai:gpt-4o-mini", api_key="sk-test")
+    second = llm_client.build_chat_model("openai:gpt-4o", api_key="sk-test")
+
+    client = llm_client.get_http_client()
+    assert first.http_async_client is client
+    assert second.http_async_client is client
+    assert client.timeout.connect == settings.LLM_HTTP_CONNECT_TIMEOUT_SECONDS
+    assert client.timeout.read == settings.LLM_HTTP_READ_TIMEOUT_SECONDS
+
+    asyncio.run(llm_client.close_http_client())
+    assert client.is_closed
+    assert llm_client.get_http_client() is not client
+
+
+def test_openai_options_only_for_openai_compatible_providers(monkeypatch):
+    """Test that the shared client and stream_usage are not passed to providers that do not take them."""
+    import langchain.chat_models
+
+    calls = {}
+
+    def init_chat_model(model, **options):
+        calls[model] = options
+
+    monkeypatch.setattr(langchain.chat_models, "init_chat_model", init_chat_model)
+    llm_client.build_chat_model("openai:gpt-4o-mini")
+    llm_client.build_chat_model("gpt-4.1-nano")
+    llm_client.build_chat_model("anthropic:claude-sonnet-4-5")
+
+    for model in ("openai:gpt-4o-mini", "gpt-4.1-nano"):
+        assert calls[model]["stream_usage"] is True
+        assert calls[model]["http_async_client"] is llm_client.get_http_client()
+    anthropic = calls["anthropic:claude-sonnet-4-5"]
+    assert "stream_usage" not in anthropic and "http_async_client" not in anthropic
+    assert anthropic["timeout"] == settings.LLM_HTTP_READ_TIMEOUT_SECONDS
+    assert llm_client.model_provider("claude-sonnet-4-5", "Azure-OpenAI") == "azure_openai"
+    assert llm_client.model_provider("claude-sonnet-4-5") is None
+
+
+def test_shared_client_reuses_connections(monkeypatch):
+    """Test that sequential calls through the shared client use one connection."""
+    with FakeLLMServer(create_app()) as server:
+        monkeypatch.setattr(settings, "LLM_BASE_URL", server.base_url)
+        monkeypatch.setattr(llm_client, "_http_client", None)
+
+        async def scenario():
+            await llm_client.warm_up_http_client()
+            llm = llm_client.build_chat_model("openai:fake-model", api_key="sk-test", max_retries=0)
+            for _ in range(3):
+                response = await llm.ainvoke([HumanMessage(content="ping")])
+                assert response.content == "Hello from the fake LLM."
+            await llm_client.close_http_client()
+
+        asyncio.run(scenario())
+        stats = httpx.get(server.url + "/stats").json()
+
+    assert stats["requests"] == 4  # Warm-up plus three completions
+    assert stats["connections"] == 1
+
+
+def test_fake_server_streams_tokens_with_usage(monkeypatch):
+    """Test the LLM_FAKE_SERVER switch against a streaming fake provider."""
+    config = FakeLLMConfig(ttft_ms=50, inter_token_ms=5, completion_tokens=8)
+    with FakeLLMServer(create_app(config)) as server:
+        monkeypatch.setattr(settings, "LLM_FAKE_SERVER", True)
+        monkeypatch.setattr(settings, "LLM_FAKE_SERVER_URL", server.base_url)
+        monkeypatch.setattr(llm_client, "_http_client", None)
+
+        async def scenario():
+            llm = llm_client.build_chat_model("openai:gpt-4o-mini", max_retries=0)
+            start = time.perf_counter()
+            chunks, first_token_at = [], None
+            async for chunk in llm.astream([HumanMessage(content="one two three")]):
+                if chunk.content and first_token_at is None:
+                    first_token_at = time.perf_counter() - start
+                chunks.append(chunk)
+            await llm_client.close_http_client()
+            return sum(chunks[1:], chunks[0]), first_token_at
+
+        message, first_token_at = asyncio.run(scenario())
+
+    assert len(message.content.split()) == 8
+    assert first_token_at >= 0.05
+    assert message.usage_metadata["input_tokens"] == 3
+    assert message.usage_metadata["output_tokens"] == 8
+    assert message.usage_metadata["total_tokens"] == 11
+
+
+def test_fake_server_injects_errors():
+    """Test that the configured error rate surfaces as provider errors."""
+    with FakeLLMServer(create_app(error_rate=1.0, error_status=429)) as server:
+        async def scenario():
+            llm = ChatOpenAI(model="fake-model", base_url=server.base_url, api_key="sk-test", max_retries=0)
+            with pytest.raises(openai.RateLimitError):
+                await llm.ainvoke([HumanMessage(content="ping")])
+
+        asyncio.run(scenario())
+        stats = httpx.get(server.url + "/stats").json()
+
+    assert stats["errors"] == 1
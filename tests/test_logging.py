@@ -0,0 +1,74 @@
+import json
+import logging
+import os
+
+from src.core import logging as app_logging
+from src.core.config import settings
+from src.core.logging import JsonFormatter, SamplingFilter
+
+
+def make_record(name="src.test", level=logging.INFO, msg="hello %s", args=("world",), **extra):
+    record = logging.LogRecord(name, level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_formatter_includes_extra_fields():
+    """Test that JSON output carries the message, trace id and extra fields."""
+    record = make_record(trace_id="abc123", error_type="ValueError")
+    payload = json.loads(JsonFormatter().format(record))
+    assert payload["message"] == "hello world"
+    assert payload["level"] == "INFO"
+    assert payload["logger"] == "src.test"
+    assert payload["trace_id"] == "abc123"
+    assert payload["error_type"] == "ValueError"
+
+
+def test_sampling_filter_only_samples_debug():
+    """Test that sampling drops DEBUG records of matching loggers only."""
+    sampler = SamplingFilter({"src.noisy": 0.0})
+    assert not sampler.filter(make_record("src.noisy.child", logging.DEBUG))
+    assert sampler.filter(make_record("src.noisy.child", logging.INFO))
+    assert sampler.filter(make_record("src.noisier", logging.DEBUG))
+    assert sampler.filter(make_record("src.other", logging.DEBUG))
+
+
+def test_sampling_filter_longest_prefix_wins():
+    """Test that a more specific prefix overrides a broader one."""
+    sampler = SamplingFilter({"src": 0.0, "src.keep": 1.0})
+    assert sampler.filter(make_record("src.keep.module", logging.DEBUG))
+    assert not sampler.filter(make_record("src.drop", logging.DEBUG))
+
+
+def test_queued_pipeline_writes_json_file(tmp_path, monkeypatch):
+    """Test that records logged through the queue reach the file as JSON."""
+    log_file = tmp_path / "app.log"
+    monkeypatch.setattr(settings, "LOG_FILE", str(log_file))
+    monkeypatch.setattr(settings, "LOG_FORMAT", "json")
+    monkeypatch.setattr(settings, "LOG_ASYNC", True)
+    try:
+        app_logging.setup_logging()
+        try:
+            raise RuntimeError("boom")
+        except RuntimeError:
+            logging.getLogger("src.test").error("Failed for user %s", 42, exc_info=True, extra={"user_id": 42})
+        app_logging.shutdown_logging()
+
+        lines = [json.loads(line) for line in log_file.read_text().splitlines()]
+        record = next(line for line in lines if line["logger"] == "src.test")
+        assert record["message"] == "Failed for user 42"
+        assert record["user_id"] == 42
+        assert record["trace_id"] == "-"
+        assert "RuntimeError: boom" in record["exc_info"]
+    finally:
+        monkeypatch.undo()
+        app_logging.setup_logging()
+
+
+def test_each_worker_logs_to_its_own_file(tmp_path, monkeypatch):
+    """Test that several workers never rotate a shared LOG_FILE."""
+    monkeypatch.setattr(settings, "LOG_FILE", str(tmp_path / "app.log"))
+    monkeypatch.setattr(settings, "WEB_CONCURRENCY", 1)
+    assert app_logging.log_file_path() == tmp_path / "app.log"
+    monkeypatch.setattr(settings, "WEB_CONCURRENCY", 4)
+    assert app_logging.log_file_path() == tmp_path / f"app.{os.getpid()}.log"
@@ -0,0 +1,44 @@
+import asyncio
+import time
+
+from src.core.loop_monitor import LoopLagMonitor
+from src.core.metrics import registry
+
+
+def blocking_password_hash():
+    """Stand-in for sync work (bcrypt, a sync query) called from a coroutine."""
+    time.sleep(0.3)
+
+
+def run_blocking(monitor: LoopLagMonitor, debug: bool) -> None:
+    async def scenario():
+        monitor.start(debug=debug)
+        await asyncio.sleep(0.05)
+        blocking_password_hash()
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+
+    asyncio.run(scenario())
+
+
+def test_lag_is_logged_and_exported(caplog):
+    """Test that lag samples reach the histogram and slow ones are logged."""
+    monitor = LoopLagMonitor(interval=0.01, warn_threshold=0.1)
+    run_blocking(monitor, debug=False)
+
+    assert "Event loop lagged" in caplog.text
+    assert "event_loop_lag_seconds_count" in registry.render()
+    assert list(monitor.blocks) == []
+
+
+def test_blocking_call_stack_is_captured(caplog):
+    """Test that the watchdog captures the stack of the call blocking the loop, once per episode."""
+    monitor = LoopLagMonitor(interval=0.01, warn_threshold=10, block_threshold=0.1)
+    run_blocking(monitor, debug=True)
+
+    assert len(monitor.blocks) == 1
+    block = monitor.blocks[0]
+    assert block["blocked_seconds"] >= 0.1
+    assert "blocking_password_hash" in block["stack"]
+    assert "Event loop blocked" in caplog.text
+    assert not monitor.debug
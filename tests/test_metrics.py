@@ -0,0 +1,70 @@
+import asyncio
+from langchain_core.messages import HumanMessage
+from src.core.metrics import Registry, llm_requests, llm_tokens
+
+
+def test_histogram_renders_cumulative_buckets():
+    """Test Prometheus text rendering of counters and histograms."""
+    registry = Registry()
+    requests = registry.counter("requests", "Requests", ["route"])
+    latency = registry.histogram("latency_seconds", "Latency", ["route"], buckets=(0.1, 1.0))
+
+    requests.labels("/a").inc()
+    requests.labels("/a").inc(2)
+    for value in (0.05, 0.5, 5.0):
+        latency.labels("/a").observe(value)
+
+    output = registry.render()
+    assert 'requests_total{route="/a"} 3' in output
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in output
+    assert 'latency_seconds_bucket{route="/a",le="1"} 2' in output
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3' in output
+    assert 'latency_seconds_count{route="/a"} 3' in output
+    assert "# TYPE latency_seconds histogram" in output
+
+
+def test_worker_label_added_to_every_sample():
+    """Test that a multi-worker scrape labels each sample with the worker that answered."""
+    registry = Registry()
+    registry.counter("requests", "Requests", ["route"]).labels("/a").inc()
+    registry.gauge("in_flight", "In flight").set(2)
+    registry.histogram("latency_seconds", "Latency", buckets=(1.0,)).observe(0.5)
+
+    output = registry.render(worker="1234")
+    assert 'requests_total{route="/a",worker="1234"} 1' in output
+    assert 'in_flight{worker="1234"} 2' in output
+    assert 'latency_seconds_bucket{worker="1234",le="1"} 1' in output
+    assert 'latency_seconds_count{worker="1234"} 1' in output
+    assert "worker=" not in registry.render()
+
+
+def test_metrics_endpoint_reports_templated_routes(client):
+    """Test that request metrics use the route template and include pool gauges."""
+    client.get("/health")
+    client.get("/does-not-exist")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'http_requests_total{method="GET",route="/health",status="200"}' in response.text
+    assert 'route="unmatched",status="404"' in response.text
+    assert 'db_pool_connections{pool="sqlalchemy",state="checked_out"}' in response.text
+
+
+def test_llm_metrics_recorded_per_node_and_model(fake_llm):
+    """Test that chatbot LLM calls are counted with token totals."""
+    from agents.basic.agent import make_graph
+
+    success = llm_requests.labels("chatbot", fake_llm.model_name, "success")
+    output_tokens = llm_tokens.labels("chatbot", fake_llm.model_name, "output")
+    before_calls, before_tokens = success.value, output_tokens.value
+
+    async def run_turn():
+        agent = make_graph(config={"checkpointer": None})
+        config = {"configurable": {"usage_log_buffer": []}, "user_id": 1, "main_call_tid": "parent-metrics"}
+        await agent.ainvoke({"messages": [HumanMessage(content="hi")]}, config=config)
+
+    asyncio.run(run_turn())
+
+    assert success.value == before_calls + 1
+    assert output_tokens.value == before_tokens + 5
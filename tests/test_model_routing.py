@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agents.basic.routing import ModelRoute, ModelRouter, turn_message_chars
+from src.core.resilient_llm import ModelHealth
+from tests.conftest import FakeChatModel
+
+SMALL = ModelRoute(model="openai:gpt-4.1-nano", temperature=0.3, max_message_chars=100, max_context_tokens=500)
+PRO_ONLY = ModelRoute(model="openai:gpt-4.1-mini", max_message_chars=1000, plans=frozenset({"Pro"}))
+
+
+def make_router(*routes: ModelRoute, health: ModelHealth = None) -> ModelRouter:
+    health = health or ModelHealth(window_size=50, failure_threshold=1, reset_seconds=60)
+    return ModelRouter(routes, "openai:gpt-4o-mini", health, min_latency_samples=3)
+
+
+def test_short_turns_go_to_the_smallest_route():
+    """Test that the first route whose limits fit is used, and the default model otherwise."""
+    router = make_router(SMALL, PRO_ONLY)
+    short = [HumanMessage(content="What time is it in Lima?", id="h1")]
+    longer = [HumanMessage(content="x" * 500, id="h2")]
+
+    assert router.choose(short, plan="Free") == SMALL
+    assert router.choose(longer, plan="Free") is None
+    assert router.choose(longer, plan="Pro") == PRO_ONLY
+
+
+def test_long_conversations_leave_the_small_route():
+    """Test the context token limit over the whole conversation, not just the new message."""
+    router = make_router(SMALL)
+    history = [
+        HumanMessage(content="word " * 400, id="h1"),
+        AIMessage(content="word " * 400, id="a1"),
+        HumanMessage(content="and now?", id="h2"),
+    ]
+    assert turn_message_chars(history) == len("and now?")
+    assert router.choose(history) is None
+    assert router.choose(history[-1:]) == SMALL
+
+
+def test_slow_or_failing_models_are_skipped():
+    """Test that observed p95 latency over the route's limit, or an open circuit, skips the route."""
+    now = [0.0]
+    health = ModelHealth(window_size=50, failure_threshold=1, reset_seconds=10, clock=lambda: now[0])
+    route = ModelRoute(model="openai:gpt-4.1-nano", max_latency_seconds=1.0)
+    router = make_router(route, health=health)
+    turn = [HumanMessage(content="hi", id="h1")]
+
+    for seconds in (2.0, 2.5):
+        health.latency(route.model, streamed=True).record(seconds)
+    assert router.choose(turn) == route  # Too few samples to judge
+    health.latency(route.model, streamed=True).record(3.0)
+    assert router.choose(turn) is None
+
+    fast = ModelRoute(model="openai:gpt-4.1-mini")
+    router = make_router(fast, health=health)
+    health.breaker(fast.model).record_failure()
+    assert router.choose(turn) is None
+    now[0] = 10.0  # Due for a probe: routing resumes so the model can recover
+    assert router.choose(turn) == fast
+
+
+def test_slow_route_is_tried_again_once_its_latencies_age_out():
+    """Test that a route skipped for its latency comes back when the slow samples are older than the age limit."""
+    now = [0.0]
+    health = ModelHealth(window_size=50, failure_threshold=1, reset_seconds=10, clock=lambda: now[0])
+    route = ModelRoute(model="openai:gpt-4.1-nano", max_latency_seconds=2.0)
+    router = ModelRouter([route], "openai:gpt-4o-mini", health, min_latency_samples=3, latency_max_age_seconds=300)
+    turn = [HumanMessage(content="hi", id="h1")]
+
+    for _ in range(20):
+        health.latency(route.model).record(5.0)
+    assert router.choose(turn) is None
+    now[0] = 299.0
+    assert router.choose(turn) is None
+    now[0] = 301.0  # Every slow sample is now too old to judge by
+    assert router.choose(turn) == route
+
+    for seconds in (0.5, 0.6, 0.7):
+        health.latency(route.model).record(seconds)
+    assert router.choose(turn) == route
+
+
+def test_routes_parsed_from_settings():
+    route = ModelRoute.from_dict({"model": "openai:gpt-4.1-nano", "plans": ["Free", "Basic"], "max_message_chars": 300})
+    assert route.plans == frozenset({"Free", "Basic"})
+    assert route.max_message_chars == 300
+    with pytest.raises(ValueError):
+        ModelRoute.from_dict({"model": "openai:gpt-4.1-nano", "max_chars": 300})
+    with pytest.raises(ValueError):
+        ModelRoute.from_dict({"max_message_chars": 300})
+
+
+def test_usage_logged_under_the_routed_model(monkeypatch, fake_llm):
+    """Test that the chatbot node calls the routed model and logs its usage under that model."""
+    from agents.basic.agent import make_graph
+    from agents.basic.nodes.chatbot import node
+
+    small_llm = FakeChatModel(model_name="gpt-4.1-nano", content="Short answer")
+    monkeypatch.setattr(node, "model_router", make_router(SMALL))
+    monkeypatch.setitem(node._routed_llms, SMALL, small_llm)
+
+    async def run_turn(message: str, buffer: list):
+        agent = make_graph(config={"checkpointer": None})
+        config = {"configurable": {"usage_log_buffer": buffer, "plan": "Free"}, "user_id": 1, "main_call_tid": "parent-route"}
+        return await agent.ainvoke({"messages": [HumanMessage(content=message)]}, config=config)
+
+    short_buffer, long_buffer = [], []
+    short = asyncio.run(run_turn("hi", short_buffer))
+    asyncio.run(run_turn("tell me " * 50, long_buffer))
+
+    assert short["messages"][-1].content == "Short answer"
+    assert small_llm.calls == 1 and fake_llm.calls == 1
+    assert [log.model for log in short_buffer] == ["gpt-4.1-nano"]
+    assert [log.model for log in long_buffer] == [fake_llm.model_name]
+
+
+def test_route_tokenizers_loaded_in_the_background(monkeypatch):
+    """Test that the agent stack loads the exact token counter of every routed model, not just the default."""
+    from agents.basic import loader, tokens
+
+    class Encoding:
+        name = "fake_base"
+
+        def encode(self, text, disallowed_special=()):
+            return text.split()
+
+    loaded = []
+    monkeypatch.setattr(tokens, "_budgets", {})
+    monkeypatch.setattr(tokens, "load_tiktoken", lambda model: loaded.append(model) or Encoding())
+
+    loader.load_tokenizers(["openai:gpt-4o-mini", SMALL.model, PRO_ONLY.model])
+    assert loaded == ["openai:gpt-4o-mini", SMALL.model, PRO_ONLY.model]
+    assert tokens.get_context_budget(SMALL.model).counter.exact
@@ -0,0 +1,97 @@
+import logging
+
+from fastapi import status
+
+from src.core.config import settings
+from src.core.query_stats import MAX_RECORDED_STATEMENTS, QueryStats
+
+
+def get_auth_headers(client, test_user_data):
+    """Helper function to register and login a user."""
+    client.post("/auth/register", json=test_user_data)
+    login_data = {
+        "username": test_user_data["email"],
+        "password": test_user_data["password"]
+    }
+    response = client.post("/auth/token", data=login_data)
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def test_register_query_budget(client, test_user_data, test_plan, assert_max_queries):
+    """Test that registration stays within its query budget."""
+    with assert_max_queries(7):
+        response = client.post("/auth/register", json=test_user_data)
+    assert response.status_code == status.HTTP_201_CREATED
+
+
+def test_login_query_budget(client, test_user_data, test_plan, assert_max_queries):
+    """Test that login stays within its query budget."""
+    client.post("/auth/register", json=test_user_data)
+    login_data = {
+        "username": test_user_data["email"],
+        "password": test_user_data["password"]
+    }
+    with assert_max_queries(3):
+        response = client.post("/auth/token", data=login_data)
+    assert response.status_code == status.HTTP_200_OK
+
+
+def test_current_user_query_budget(client, test_user_data, test_plan, assert_max_queries):
+    """Test that /users/me loads the user and plan in a single query."""
+    headers = get_auth_headers(client, test_user_data)
+    with assert_max_queries(1):
+        response = client.get("/users/me", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+
+
+def test_usage_query_budget(client, test_user_data, test_plan, assert_max_queries):
+    """Test that /chatbot/usage does not reload the user to read its plan."""
+    headers = get_auth_headers(client, test_user_data)
+    with assert_max_queries(2):
+        response = client.get("/chatbot/usage", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+
+
+def test_chatbot_query_budget(client, test_user_data, test_plan, fake_llm, assert_max_queries):
+    """Test that /chatbot/ costs the user lookup, one rate-limit upsert and one quota count query."""
+    headers = get_auth_headers(client, test_user_data)
+    with assert_max_queries(3):
+        response = client.post("/chatbot/", json={"message": "Hello"}, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+
+
+def test_server_timing_header(client, test_user_data, test_plan):
+    """Test that responses report db time and query count in Server-Timing."""
+    headers = get_auth_headers(client, test_user_data)
+    response = client.get("/users/me", headers=headers)
+    timing = response.headers["server-timing"]
+    assert 'desc="1 queries"' in timing
+    assert "db;dur=" in timing
+    assert "app;dur=" in timing
+
+
+def test_slow_query_log_redacts_parameters(client, test_user_data, test_plan, monkeypatch, caplog):
+    """Test that slow queries are logged without their parameter values."""
+    headers = get_auth_headers(client, test_user_data)
+    monkeypatch.setattr(settings, "SLOW_QUERY_THRESHOLD_MS", 0.0)
+    with caplog.at_level(logging.WARNING, logger="src.core.query_stats"):
+        client.get("/users/me", headers=headers)
+
+    slow = [record.getMessage() for record in caplog.records if "Slow query" in record.getMessage()]
+    assert slow
+    assert "<str>" in slow[0]
+    assert test_user_data["email"] not in slow[0]
+
+
+def test_recorded_statements_are_capped():
+    """Test that counts and time cover every statement while only the first texts are kept."""
+    stats = QueryStats()
+    for i in range(MAX_RECORDED_STATEMENTS + 10):
+        stats.record(f"SELECT {i}", 0.001)
+    child = QueryStats()
+    child.record("SELECT child", 0.001)
+    stats.merge(child)
+
+    assert stats.count == MAX_RECORDED_STATEMENTS + 11
+    assert len(stats.statements) == MAX_RECORDED_STATEMENTS
+    assert stats.statements[-1] == f"SELECT {MAX_RECORDED_STATEMENTS - 1}"
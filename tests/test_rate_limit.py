@@ -0,0 +1,146 @@
+import pytest
+from fastapi import status
+from sqlalchemy import create_engine
+
+import src.dependencies as dependencies
+from src.core.config import settings
+from src.core.rate_limit import (
+    DatabaseRateLimitStore, MemoryRateLimitStore, Rate, RateLimiter, rate_limiter,
+)
+from src.models.rate_limit import RateLimitBucket
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_700_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_parse_rate():
+    """Test the rate string format."""
+    assert Rate.parse("10/minute") == Rate(10, 60)
+    assert Rate.parse("5 / 30 seconds") == Rate(5, 30)
+    assert Rate.parse("100/hour").emission_interval == 36
+    with pytest.raises(ValueError):
+        Rate.parse("ten per minute")
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request):
+    if request.param == "memory":
+        return MemoryRateLimitStore()
+    engine = create_engine("sqlite://")
+    RateLimitBucket.__table__.create(engine)
+    return DatabaseRateLimitStore(engine)
+
+
+def test_gcra_burst_then_steady_rate(store):
+    """Test that a full burst is allowed, the next request waits one interval, and headers are exact."""
+    clock = FakeClock()
+    limiter = RateLimiter(store, clock=clock)
+    rate = Rate(10, 60)
+
+    results = [limiter.check("user:1", rate) for _ in range(10)]
+    assert all(result.allowed for result in results)
+    assert [result.remaining for result in results] == list(range(9, -1, -1))
+    assert results[-1].reset_at == pytest.approx(clock.now + 60)
+
+    denied = limiter.check("user:1", rate)
+    assert not denied.allowed
+    assert denied.remaining == 0
+    assert denied.retry_after == pytest.approx(6)
+    assert denied.headers["Retry-After"] == "6"
+    assert denied.headers["X-RateLimit-Reset"] == str(int(clock.now + 60))
+
+    # Other keys have their own bucket
+    assert limiter.check("user:2", rate).allowed
+
+    # One emission interval later exactly one more request fits
+    clock.now += 6
+    assert limiter.check("user:1", rate).allowed
+    assert not limiter.check("user:1", rate).allowed
+
+    # After a full period the bucket is empty again
+    clock.now += 60
+    assert limiter.check("user:1", rate).remaining == 9
+
+
+def test_denied_requests_do_not_consume_quota(store):
+    """Test that hammering while limited does not push the reset further out."""
+    clock = FakeClock()
+    limiter = RateLimiter(store, clock=clock)
+    rate = Rate(2, 10)
+    limiter.check("k", rate)
+    limiter.check("k", rate)
+    for _ in range(5):
+        assert not limiter.check("k", rate).allowed
+    clock.now += 5
+    assert limiter.check("k", rate).allowed
+
+
+def test_weighted_requests(store):
+    """Test that a request costing several cells is charged all of them, capped at a full burst."""
+    clock = FakeClock()
+    limiter = RateLimiter(store, clock=clock)
+    rate = Rate(10, 60)
+
+    assert limiter.check("k", rate, cost=4).remaining == 6
+    denied = limiter.check("k", rate, cost=7)
+    assert not denied.allowed
+    assert denied.retry_after == pytest.approx(6)
+    assert limiter.check("k", rate, cost=6).remaining == 0
+
+    clock.now += 60
+    assert limiter.check("big", rate, cost=50).remaining == 0
+
+
+def test_chat_rate_limit_per_user(client, test_user_data, test_plan, fake_llm, monkeypatch):
+    """Test that the chat endpoint returns X-RateLimit-* headers and 429 with Retry-After once over the limit."""
+    monkeypatch.setattr(dependencies, "chatbot_rate", Rate(2, 60))
+    client.post("/auth/register", json=test_user_data)
+    token = client.post(
+        "/auth/token", data={"username": test_user_data["email"], "password": test_user_data["password"]}
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    first = client.post("/chatbot/", json={"message": "hi"}, headers=headers)
+    assert first.status_code == status.HTTP_200_OK
+    assert first.headers["x-ratelimit-limit"] == "2"
+    assert first.headers["x-ratelimit-remaining"] == "1"
+    assert int(first.headers["x-ratelimit-reset"]) > 1_600_000_000
+
+    stream = client.post("/chatbot/stream", json={"message": "hi"}, headers=headers)
+    assert stream.status_code == status.HTTP_200_OK
+    assert stream.headers["x-ratelimit-remaining"] == "0"
+
+    limited = client.post("/chatbot/", json={"message": "hi"}, headers=headers)
+    assert limited.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert int(limited.headers["retry-after"]) >= 1
+    assert limited.headers["x-ratelimit-remaining"] == "0"
+
+
+def test_default_store_follows_settings():
+    """Test that the shared database store is the default backend."""
+    assert settings.RATE_LIMIT_BACKEND == "database"
+    assert isinstance(rate_limiter.store, DatabaseRateLimitStore)
+
+
+def test_batch_charged_per_item(client, test_user_data, test_plan, fake_llm, monkeypatch):
+    """Test that every batch item counts against the per-user rate limit."""
+    monkeypatch.setattr(dependencies, "chatbot_rate", Rate(3, 60))
+    client.post("/auth/register", json=test_user_data)
+    token = client.post(
+        "/auth/token", data={"username": test_user_data["email"], "password": test_user_data["password"]}
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    batch = {"items": [{"message": "a"}, {"message": "b"}]}
+
+    first = client.post("/chatbot/batch", json=batch, headers=headers)
+    assert first.status_code == status.HTTP_200_OK
+    assert first.headers["x-ratelimit-remaining"] == "1"
+
+    limited = client.post("/chatbot/batch", json=batch, headers=headers)
+    assert limited.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert fake_llm.calls == 2
@@ -0,0 +1,205 @@
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+from langchain_core.messages import HumanMessage
+from langchain_openai import ChatOpenAI
+
+from benchmarks.fake_llm_server import FakeLLMConfig, FakeLLMServer, create_app
+from src.core.resilient_llm import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    LatencyWindow,
+    LLMUnavailable,
+    ModelHealth,
+    ResilientChatModel,
+)
+
+
+def openai_model(server: FakeLLMServer, name: str) -> ChatOpenAI:
+    return ChatOpenAI(model=name, base_url=server.base_url, api_key="sk-test", max_retries=0, stream_usage=True)
+
+
+def resilient(*models: tuple[str, ChatOpenAI], health: ModelHealth = None, **options) -> ResilientChatModel:
+    options.setdefault("hedge_percentile", 0)
+    return ResilientChatModel(
+        models=[model for _, model in models],
+        model_names=[name for name, _ in models],
+        health=health or ModelHealth(window_size=50, failure_threshold=2, reset_seconds=60),
+        **options,
+    )
+
+
+def speed_up_later(config: FakeLLMConfig, seconds: float, **fields) -> threading.Timer:
+    """Change the fake provider's behaviour while the first request is still in flight."""
+    timer = threading.Timer(seconds, lambda: [setattr(config, name, value) for name, value in fields.items()])
+    timer.start()
+    return timer
+
+
+def stats(server: FakeLLMServer) -> dict:
+    return httpx.get(server.url + "/stats").json()
+
+
+def test_hedged_request_answers_for_a_slow_call():
+    """Test that a duplicate sent after the hedge delay wins over a stuck first request."""
+    config = FakeLLMConfig(latency_ms=3000)
+    with FakeLLMServer(create_app(config)) as server:
+        llm = resilient(
+            ("fake-model", openai_model(server, "fake-model")),
+            hedge_percentile=95, hedge_min_delay_seconds=0.2, hedge_min_samples=0,
+        )
+        timer = speed_up_later(config, 0.05, latency_ms=0)
+
+        start = time.perf_counter()
+        response = asyncio.run(llm.ainvoke([HumanMessage(content="ping")]))
+        elapsed = time.perf_counter() - start
+        timer.join()
+
+        assert response.content == "Hello from the fake LLM."
+        assert 0.2 <= elapsed < 1.5
+        assert stats(server)["completions"] == 2
+        assert len(llm.health.latency("fake-model")) == 1
+
+
+def test_hedged_stream_yields_one_copy_of_the_tokens():
+    """Test that only the winning stream reaches the caller, usage included."""
+    config = FakeLLMConfig(ttft_ms=3000, completion_tokens=8)
+    with FakeLLMServer(create_app(config)) as server:
+        llm = resilient(
+            ("fake-model", openai_model(server, "fake-model")),
+            hedge_percentile=95, hedge_min_delay_seconds=0.2, hedge_min_samples=0,
+        )
+        timer = speed_up_later(config, 0.05, ttft_ms=0)
+
+        async def scenario():
+            chunks = [chunk async for chunk in llm.astream([HumanMessage(content="one two three")])]
+            return sum(chunks[1:], chunks[0])
+
+        start = time.perf_counter()
+        message = asyncio.run(scenario())
+        elapsed = time.perf_counter() - start
+        timer.join()
+
+        assert elapsed < 1.5
+        assert len(message.content.split()) == 8
+        assert message.usage_metadata["output_tokens"] == 8
+        assert stats(server)["streams"] == 2
+        assert len(llm.health.latency("fake-model", streamed=True)) == 1
+
+
+def test_no_hedge_until_the_model_has_latency_samples():
+    """Test that hedging waits for enough samples to know what slow means."""
+    with FakeLLMServer(create_app(latency_ms=300)) as server:
+        llm = resilient(
+            ("fake-model", openai_model(server, "fake-model")),
+            hedge_percentile=50, hedge_min_delay_seconds=0.05, hedge_min_samples=2,
+        )
+
+        async def scenario():
+            for _ in range(2):
+                await llm.ainvoke([HumanMessage(content="ping")])
+
+        asyncio.run(scenario())
+        assert stats(server)["completions"] == 2
+
+
+def test_fallback_model_serves_when_the_primary_fails():
+    """Test the fallback order and that the primary's circuit opens and is then skipped."""
+    with FakeLLMServer(create_app(error_rate=1.0, error_status=503)) as primary, FakeLLMServer(create_app()) as fallback:
+        llm = resilient(
+            ("fake-model", openai_model(primary, "fake-model")),
+            ("fallback-model", openai_model(fallback, "fallback-model")),
+        )
+
+        async def scenario():
+            return [await llm.ainvoke([HumanMessage(content="ping")]) for _ in range(3)]
+
+        responses = asyncio.run(scenario())
+
+        assert all(r.response_metadata["model_name"] == "fallback-model" for r in responses)
+        assert llm.health.breaker("fake-model").state == OPEN
+        assert stats(primary)["errors"] == 2  # The third call skipped the open circuit
+        assert stats(fallback)["completions"] == 3
+
+
+def test_slow_attempt_falls_back_and_deadline_bounds_the_call():
+    """Test that an attempt over its timeout moves on, and that the deadline ends the call."""
+    with FakeLLMServer(create_app(latency_ms=3000)) as slow, FakeLLMServer(create_app()) as fast:
+        llm = resilient(
+            ("fake-model", openai_model(slow, "fake-model")),
+            ("fallback-model", openai_model(fast, "fallback-model")),
+            attempt_timeout_seconds=0.2,
+        )
+        start = time.perf_counter()
+        response = asyncio.run(llm.ainvoke([HumanMessage(content="ping")]))
+        assert response.response_metadata["model_name"] == "fallback-model"
+        assert time.perf_counter() - start < 1.5
+
+        only_slow = resilient(("fake-model", openai_model(slow, "fake-model")), deadline_seconds=0.2)
+        start = time.perf_counter()
+        with pytest.raises(TimeoutError):
+            asyncio.run(only_slow.ainvoke([HumanMessage(content="ping")]))
+        assert time.perf_counter() - start < 1.5
+
+
+def test_bad_requests_do_not_fall_back_or_trip_the_breaker():
+    """Test that errors caused by the request itself are raised as they are."""
+    with FakeLLMServer(create_app()) as server:
+        # The provider SDK rejects the unknown argument before sending anything
+        llm = resilient(("fake-model", openai_model(server, "fake-model")))
+        with pytest.raises(TypeError):
+            asyncio.run(llm.ainvoke([HumanMessage(content="ping")], unknown_argument=1))
+        assert llm.health.breaker("fake-model").state == CLOSED
+
+
+def test_every_circuit_open_fails_fast():
+    """Test that a call with no model left to try fails without waiting for the deadline."""
+    health = ModelHealth(window_size=10, failure_threshold=1, reset_seconds=60)
+    health.breaker("fake-model").record_failure()
+    llm = resilient(("fake-model", ChatOpenAI(model="fake-model", api_key="sk-test")), health=health)
+    with pytest.raises(LLMUnavailable):
+        asyncio.run(llm.ainvoke([HumanMessage(content="ping")]))
+
+
+def test_circuit_breaker_states():
+    """Test closed -> open after consecutive failures, one half-open probe per reset period, and recovery."""
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=10, clock=lambda: now[0])
+
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.allow()
+
+    now[0] = 10.0
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    assert not breaker.allow()  # One probe at a time
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+    now[0] = 20.0
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.allow()
+
+
+def test_latency_window_percentiles():
+    """Test nearest-rank percentiles over the most recent samples."""
+    window = LatencyWindow(size=100)
+    assert window.percentile(95) is None
+    for ms in range(1, 101):
+        window.record(ms / 1000)
+    assert window.percentile(50) == 0.05
+    assert window.percentile(95) == 0.095
+    window.record(1.0)
+    assert len(window) == 100
+    assert window.percentile(100) == 1.0
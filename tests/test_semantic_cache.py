@@ -0,0 +1,97 @@
+import asyncio
+import numpy as np
+import pytest
+from langchain_core.messages import HumanMessage
+from src.core.llm_cache import CachedResponse
+from src.core.semantic_cache import HashingEmbedder, SemanticCache, VectorIndex
+
+
+def cosine(a, b):
+    a, b = np.asarray(a), np.asarray(b)
+    return float(a @ b / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+
+def test_hashing_embedder_is_deterministic_and_similarity_preserving():
+    """Test that near-duplicates score higher than unrelated questions."""
+    embedder = HashingEmbedder(dimensions=256)
+    question = embedder.embed_query("How do I reset my password?")
+
+    assert question == embedder.embed_query("How do I reset my password?")
+    near_duplicate = cosine(question, embedder.embed_query("how do i reset my password"))
+    unrelated = cosine(question, embedder.embed_query("What is the weather in Paris tomorrow?"))
+    assert near_duplicate > 0.95
+    assert unrelated < 0.5
+
+
+def test_vector_index_returns_top_match():
+    """Test cosine top-1 lookup."""
+    index = VectorIndex(dimensions=3, memory_budget_bytes=10_000)
+    index.add([1, 0, 0], CachedResponse("x-axis"))
+    index.add([0, 1, 0], CachedResponse("y-axis"))
+
+    value, score = index.search([0.1, 0.9, 0])
+    assert value.content == "y-axis"
+    assert score == pytest.approx(0.9 / np.linalg.norm([0.1, 0.9, 0]), rel=1e-5)
+
+
+def test_vector_index_evicts_least_recently_used_by_memory_budget():
+    """Test that the index stays within its memory budget by evicting LRU entries."""
+    entry_bytes = 3 * 4 + len("a")
+    index = VectorIndex(dimensions=3, memory_budget_bytes=entry_bytes * 2, initial_capacity=1)
+    index.add([1, 0, 0], CachedResponse("a"))
+    index.add([0, 1, 0], CachedResponse("b"))
+    index.search([1, 0, 0])  # Touch "a" so "b" is least recently used
+    index.add([0, 0, 1], CachedResponse("c"))
+
+    assert len(index) == 2
+    assert index.memory_bytes <= entry_bytes * 2
+    assert {index.search(v)[0].content for v in ([1, 0, 0], [0, 0, 1])} == {"a", "c"}
+    assert index.search([0, 1, 0])[0].content != "b"
+
+
+def test_semantic_cache_tracks_hit_rate_and_latency():
+    """Test hit/miss accounting and threshold handling."""
+    async def scenario():
+        cache = SemanticCache(HashingEmbedder(), VectorIndex(256, 1_000_000), threshold=0.9)
+        cached, vector = await cache.lookup("What are your opening hours?")
+        assert cached is None
+        cache.store(vector, CachedResponse("9 to 5"), miss_path_seconds=1.0)
+
+        cached, _ = await cache.lookup("what are your opening hours")
+        assert cached.content == "9 to 5"
+        cached, _ = await cache.lookup("Tell me a joke about databases")
+        assert cached is None
+
+        stats = cache.stats()
+        assert stats["lookups"] == 3
+        assert stats["hits"] == 1
+        assert stats["hit_rate"] == pytest.approx(1 / 3)
+        assert stats["lookup_seconds_total"] > 0
+        assert stats["estimated_net_seconds_saved"] > 0
+
+    asyncio.run(scenario())
+
+
+def test_graph_answers_near_duplicates_without_the_llm(monkeypatch, fake_llm):
+    """Test that the semantic cache stage short-circuits the chatbot node."""
+    from agents.basic import agent as agent_module
+    from agents.basic.nodes.semantic_cache import node as cache_node
+
+    cache = SemanticCache(HashingEmbedder(), VectorIndex(256, 1_000_000), threshold=0.9)
+    monkeypatch.setattr(agent_module, "semantic_cache", cache)
+    monkeypatch.setattr(cache_node, "semantic_cache", cache)
+
+    async def run_turn(text, buffer):
+        graph = agent_module.make_graph(config={"checkpointer": None})
+        config = {"configurable": {"usage_log_buffer": buffer}, "user_id": 1, "main_call_tid": f"parent-{text}"}
+        return await graph.ainvoke({"messages": [HumanMessage(content=text)]}, config=config)
+
+    first_buffer, second_buffer = [], []
+    asyncio.run(run_turn("How do I reset my password?", first_buffer))
+    second = asyncio.run(run_turn("how do I reset my password", second_buffer))
+
+    assert fake_llm.calls == 1
+    assert second["messages"][-1].content == fake_llm.content
+    assert second["semantic_cache_hit"] is True
+    assert [log.description for log in second_buffer] == ["Node semantic_cache (hit)"]
+    assert second_buffer[0].total == 0
@@ -0,0 +1,67 @@
+import pytest
+
+from src.core.config import settings
+from src.core.server import db_pool_sizes, request_graceful_timeout, resolve_http, resolve_loop, resolve_workers
+
+
+def test_pool_sizes_without_budget(monkeypatch):
+    """Test that configured pool sizes apply when no total budget is set."""
+    monkeypatch.setattr(settings, "DB_MAX_CONNECTIONS", 0)
+    monkeypatch.setattr(settings, "DB_POOL_SIZE", 7)
+    monkeypatch.setattr(settings, "DB_MAX_OVERFLOW", 3)
+    monkeypatch.setattr(settings, "CHECKPOINT_POOL_MAX_SIZE", 4)
+    sizes = db_pool_sizes(workers=8)
+    assert (sizes.pool_size, sizes.max_overflow, sizes.checkpoint_max_size) == (7, 3, 4)
+
+
+def test_pool_sizes_split_budget_across_workers(monkeypatch):
+    """Test that all workers together stay within DB_MAX_CONNECTIONS."""
+    monkeypatch.setattr(settings, "DB_MAX_CONNECTIONS", 100)
+    monkeypatch.setattr(settings, "CHECKPOINT_BACKEND", "postgres")
+    for workers in (1, 3, 4, 9, 50):
+        sizes = db_pool_sizes(workers=workers)
+        assert sizes.total * workers <= 100
+        assert sizes.pool_size >= 1 and sizes.checkpoint_max_size >= 1
+
+    sizes = db_pool_sizes(workers=4)
+    assert (sizes.pool_size, sizes.max_overflow, sizes.checkpoint_max_size) == (8, 9, 8)
+
+
+def test_pool_sizes_memory_checkpointer_gets_no_share(monkeypatch):
+    """Test that the memory checkpointer leaves the whole share to SQLAlchemy."""
+    monkeypatch.setattr(settings, "DB_MAX_CONNECTIONS", 20)
+    monkeypatch.setattr(settings, "CHECKPOINT_BACKEND", "memory")
+    sizes = db_pool_sizes(workers=2)
+    assert sizes.checkpoint_max_size == 0
+    assert sizes.total == 10
+
+
+def test_pool_sizes_reject_too_small_budget(monkeypatch):
+    """Test that a budget below one usable pool per worker fails fast."""
+    monkeypatch.setattr(settings, "DB_MAX_CONNECTIONS", 5)
+    monkeypatch.setattr(settings, "CHECKPOINT_BACKEND", "postgres")
+    with pytest.raises(ValueError, match="WEB_CONCURRENCY"):
+        db_pool_sizes(workers=4)
+
+
+def test_worker_loop_and_http_resolution(monkeypatch):
+    """Test that explicit settings win and auto picks an available implementation."""
+    monkeypatch.setattr(settings, "WEB_CONCURRENCY", 3)
+    assert resolve_workers() == 3
+    monkeypatch.setattr(settings, "SERVER_LOOP", "asyncio")
+    monkeypatch.setattr(settings, "SERVER_HTTP", "h11")
+    assert (resolve_loop(), resolve_http()) == ("asyncio", "h11")
+    monkeypatch.setattr(settings, "SERVER_LOOP", "auto")
+    monkeypatch.setattr(settings, "SERVER_HTTP", "auto")
+    assert resolve_loop() in ("uvloop", "asyncio")
+    assert resolve_http() in ("httptools", "h11")
+
+
+def test_graceful_timeout_leaves_room_for_the_drain(monkeypatch):
+    """Test that open requests and the lifespan drain together fit in the graceful timeout."""
+    monkeypatch.setattr(settings, "SERVER_GRACEFUL_TIMEOUT_SECONDS", 30)
+    monkeypatch.setattr(settings, "SHUTDOWN_DRAIN_SECONDS", 20.0)
+    assert request_graceful_timeout() == 10
+    monkeypatch.setattr(settings, "SHUTDOWN_DRAIN_SECONDS", 30.0)
+    with pytest.raises(ValueError, match="SHUTDOWN_DRAIN_SECONDS"):
+        request_graceful_timeout()
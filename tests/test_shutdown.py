@@ -0,0 +1,172 @@
+import asyncio
+import os
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+
+import httpx
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from benchmarks.fake_llm_server import FakeLLMServer, create_app
+from src.core.drain import DrainController, drain_controller
+from src.models.plan import Plan
+
+
+@pytest.fixture
+def draining():
+    drain_controller.start()
+    yield drain_controller
+    drain_controller.reset()
+
+
+def test_drain_waits_for_tracked_runs_and_writes():
+    """Test that drain() returns once in-flight runs and deferred writes are done."""
+    controller = DrainController(poll_interval=0.01)
+    written = []
+
+    async def scenario():
+        async def run():
+            async with controller.track():
+                await asyncio.sleep(0.1)
+            await controller.defer_write(lambda: (time.sleep(0.05), written.append("usage")))
+
+        task = asyncio.create_task(run())
+        await asyncio.sleep(0.01)
+        assert controller.active == 1
+        drained = await controller.drain(timeout=5)
+        await task
+        return drained
+
+    assert asyncio.run(scenario()) is True
+    assert written == ["usage"]
+    assert controller.draining and not controller.ready
+
+
+def test_drain_gives_up_at_the_deadline():
+    """Test that drain() reports work still running past its deadline."""
+    controller = DrainController(poll_interval=0.01)
+
+    async def scenario():
+        async with controller.track():
+            return await controller.drain(timeout=0.05)
+
+    assert asyncio.run(scenario()) is False
+
+
+def test_deferred_write_survives_cancellation():
+    """Test that cancelling the caller does not cancel a deferred write."""
+    controller = DrainController()
+    written = []
+
+    async def scenario():
+        async def caller():
+            await asyncio.shield(controller.defer_write(lambda: (time.sleep(0.05), written.append(1))))
+
+        task = asyncio.create_task(caller())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await controller.drain(timeout=5)
+
+    asyncio.run(scenario())
+    assert written == [1]
+
+
+def test_new_chat_turns_rejected_while_draining(client, draining):
+    """Test that chat endpoints answer 503 with Retry-After and the health check fails."""
+    for path in ("/chatbot/", "/chatbot/stream", "/chatbot/batch"):
+        response = client.post(path, json={"message": "hi"})
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "1"
+
+    response = client.get("/health")
+    assert response.status_code == 503
+    assert response.json() == {"status": "draining"}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_up(url: str, process: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(process.stdout.read())
+        try:
+            if httpx.get(f"{url}/health").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.1)
+    raise TimeoutError("API did not start")
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="POSIX signals")
+def test_sigterm_during_stream_finishes_the_stream(tmp_path):
+    """Test that a worker receiving SIGTERM mid-stream completes it and persists its usage log."""
+    database = tmp_path / "shutdown.db"
+    words = 20
+    with FakeLLMServer(create_app(inter_token_ms=50, completion_tokens=words)) as llm:
+        port = _free_port()
+        url = f"http://127.0.0.1:{port}"
+        env = dict(
+            os.environ,
+            DATABASE_URL=f"sqlite:///{database}",
+            DB_CREATE_TABLES="true",
+            SCHEMA_CHECK="off",
+            CHECKPOINT_BACKEND="memory",
+            AGENT_PRELOAD="false",
+            LLM_FAKE_SERVER="true",
+            LLM_FAKE_SERVER_URL=llm.base_url,
+            OPENAI_API_KEY="test",
+            LOG_FILE=str(tmp_path / "app.log"),
+            LOG_ASYNC="false",
+            SHUTDOWN_DRAIN_SECONDS="10",
+        )
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "src.main:app", "--port", str(port), "--timeout-graceful-shutdown", "15"],
+            env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+        )
+        try:
+            _wait_until_up(url, process)
+            with Session(create_engine(f"sqlite:///{database}")) as db:
+                db.add(Plan(name="Free", description="test", query_limit=100, query_window_hours=24))
+                db.commit()
+            user = {"email": "drain@example.com", "username": "drainuser", "password": "Password123!"}
+            assert httpx.post(f"{url}/auth/register", json=user).status_code == 201
+            token = httpx.post(
+                f"{url}/auth/token", data={"username": user["email"], "password": user["password"]}
+            ).json()["access_token"]
+
+            chunks = []
+            with httpx.stream(
+                "POST", f"{url}/chatbot/stream", json={"message": "hello"},
+                headers={"Authorization": f"Bearer {token}"}, timeout=30,
+            ) as response:
+                assert response.status_code == 200
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    if not chunks:
+                        process.send_signal(signal.SIGTERM)
+                    chunks.append(line)
+
+            # uvicorn re-raises the captured signal once shut down, so a clean exit reports SIGTERM
+            assert process.wait(timeout=30) in (0, -signal.SIGTERM)
+        finally:
+            if process.poll() is None:
+                process.kill()
+            output = process.stdout.read()
+
+    assert len(chunks) >= words // 2, output
+    assert "Draining: new chat turns are rejected, 1 in flight" in output
+    assert "Drained" in output
+    with sqlite3.connect(database) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM usage_logs").fetchone()[0] >= 1
@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from src.core.config import settings
+from src.db.schema import SchemaOutOfDate, check_schema, get_current_revisions, get_head_revisions
+
+
+def test_head_revision_read_from_migrations():
+    """Test that the migration head is found without importing alembic."""
+    assert get_head_revisions() == frozenset({"0003_plan_token_limits"})
+
+
+def test_head_revisions_follow_down_revision(tmp_path):
+    """Test that revisions referenced as down_revision are not heads."""
+    (tmp_path / "a.py").write_text("revision = 'a'\ndown_revision = None\n")
+    (tmp_path / "b.py").write_text("revision: str = 'b'\ndown_revision: str = 'a'\n")
+    assert get_head_revisions(tmp_path) == frozenset({"b"})
+
+
+def test_check_schema_on_unmigrated_database(monkeypatch, caplog):
+    """Test that a database without alembic_version warns or refuses to start."""
+    engine = create_engine("sqlite://")
+    assert get_current_revisions(engine) == frozenset()
+
+    monkeypatch.setattr(settings, "SCHEMA_CHECK", "warn")
+    assert check_schema(engine) is False
+    assert "alembic upgrade head" in caplog.text
+
+    monkeypatch.setattr(settings, "SCHEMA_CHECK", "error")
+    with pytest.raises(SchemaOutOfDate):
+        check_schema(engine)
+
+
+def test_check_schema_on_migrated_database(monkeypatch):
+    """Test that a database stamped at the head passes the check."""
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL)"))
+        conn.execute(text("INSERT INTO alembic_version VALUES ('0003_plan_token_limits')"))
+    monkeypatch.setattr(settings, "SCHEMA_CHECK", "error")
+    assert check_schema(engine) is True
+
+
+def test_importing_app_does_not_load_agent_stack():
+    """Test that importing src.main leaves langgraph's graph, langchain and the provider SDK unloaded."""
+    code = (
+        "import sys, src.main; "
+        "print(','.join(m for m in ('langchain_openai', 'langchain.chat_models', 'langgraph.graph', 'agents.basic.agent') "
+        "if m in sys.modules))"
+    )
+    env = dict(os.environ, DATABASE_URL=os.environ.get("DATABASE_URL", "sqlite://"))
+    result = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", code], capture_output=True, text=True, env=env, check=True,
+    )
+    assert result.stdout.strip().splitlines()[-1:] in ([], [""])
@@ -0,0 +1,234 @@
+import asyncio
+
+import pytest
+from fastapi import status
+
+from src.core import thread_lock
+from src.core.thread_lock import AdvisoryLocks, ThreadBusy, ThreadLocks
+from src.models.user import User
+
+
+def test_queue_policy_runs_turns_one_at_a_time():
+    """Test that concurrent turns on a thread never overlap and the lock map is cleaned up."""
+    locks = ThreadLocks("queue", wait_seconds=5)
+    running = 0
+    overlaps = 0
+    order = []
+
+    async def turn(messages):
+        nonlocal running, overlaps
+        running += 1
+        overlaps += running > 1
+        await asyncio.sleep(0.01)
+        order.append(messages[0])
+        running -= 1
+        return messages
+
+    async def scenario():
+        await asyncio.gather(*(locks.run_turn("thread-1", f"m{i}", turn) for i in range(5)))
+
+    asyncio.run(scenario())
+    assert overlaps == 0
+    assert order == ["m0", "m1", "m2", "m3", "m4"]
+    assert locks.threads == 0
+
+
+def test_threads_do_not_wait_for_each_other():
+    """Test that turns on different threads run concurrently."""
+    locks = ThreadLocks("queue", wait_seconds=5)
+
+    async def scenario():
+        started = asyncio.Event()
+
+        async def first(messages):
+            started.set()
+            await asyncio.sleep(0.05)
+
+        async def second(messages):
+            assert started.is_set() and locks.threads == 2
+
+        task = asyncio.create_task(locks.run_turn("thread-1", "a", first))
+        await started.wait()
+        await asyncio.wait_for(locks.run_turn("thread-2", "b", second), timeout=0.04)
+        await task
+
+    asyncio.run(scenario())
+    assert locks.threads == 0
+
+
+def test_reject_policy_and_wait_timeout():
+    """Test that a busy thread rejects under the reject policy and after the queue wait."""
+    async def scenario(policy, wait_seconds):
+        locks = ThreadLocks(policy, wait_seconds=wait_seconds)
+        lease = await locks.acquire("thread-1")
+        with pytest.raises(ThreadBusy):
+            await locks.acquire("thread-1")
+        other = await locks.acquire("thread-2")
+        await other.release()
+        await lease.release()
+        await lease.release()
+        again = await locks.acquire("thread-1")
+        await again.release()
+        return locks
+
+    assert asyncio.run(scenario("reject", wait_seconds=5)).threads == 0
+    locks = asyncio.run(scenario("queue", wait_seconds=0.05))
+    assert locks.threads == 0
+    assert locks.stats()["rejected_total"] == 1
+
+
+def test_merge_policy_folds_waiting_turns_into_one_run():
+    """Test that turns arriving while the thread is busy share one follow-up run."""
+    locks = ThreadLocks("merge", wait_seconds=5)
+    runs = []
+
+    async def turn(messages):
+        runs.append(list(messages))
+        await asyncio.sleep(0.02)
+        return " + ".join(messages)
+
+    async def scenario():
+        first = asyncio.create_task(locks.run_turn("thread-1", "a", turn))
+        await asyncio.sleep(0.005)
+        rest = [asyncio.create_task(locks.run_turn("thread-1", m, turn)) for m in ("b", "c", "d")]
+        return await first, await asyncio.gather(*rest)
+
+    first, rest = asyncio.run(scenario())
+    assert runs == [["a"], ["b", "c", "d"]]
+    assert first == "a"
+    assert rest == ["b + c + d"] * 3
+    assert locks.stats()["merged_total"] == 2
+    assert locks.threads == 0
+
+
+def test_merge_policy_shares_failures():
+    """Test that merged turns see the error of the run they were folded into."""
+    locks = ThreadLocks("merge", wait_seconds=5)
+
+    async def turn(messages):
+        await asyncio.sleep(0.02)
+        if len(messages) > 1:
+            raise RuntimeError("boom")
+        return "ok"
+
+    async def scenario():
+        first = asyncio.create_task(locks.run_turn("thread-1", "a", turn))
+        await asyncio.sleep(0.005)
+        rest = [asyncio.create_task(locks.run_turn("thread-1", m, turn)) for m in ("b", "c")]
+        return await first, await asyncio.gather(*rest, return_exceptions=True)
+
+    first, rest = asyncio.run(scenario())
+    assert first == "ok"
+    assert all(isinstance(result, RuntimeError) for result in rest)
+    assert locks.threads == 0
+
+
+def test_advisory_locks_serialize_across_workers(db_session):
+    """Test that two workers (two lock maps) cannot hold the same thread with the postgres backend."""
+    engine = db_session.get_bind().engine
+    if engine.dialect.name != "postgresql":
+        pytest.skip("Advisory locks need PostgreSQL")
+
+    async def scenario():
+        worker_a = ThreadLocks("reject", wait_seconds=1, advisory=AdvisoryLocks(engine))
+        worker_b = ThreadLocks("queue", wait_seconds=0.2, advisory=AdvisoryLocks(engine))
+        lease = await worker_a.acquire("thread-advisory-test")
+        with pytest.raises(ThreadBusy):
+            await worker_b.acquire("thread-advisory-test")
+
+        waiter = asyncio.create_task(
+            ThreadLocks("queue", wait_seconds=2, advisory=AdvisoryLocks(engine)).acquire("thread-advisory-test")
+        )
+        await asyncio.sleep(0.1)
+        await lease.release()
+        second = await waiter
+        await second.release()
+        return worker_a, worker_b
+
+    worker_a, worker_b = asyncio.run(scenario())
+    assert worker_a.threads == worker_b.threads == 0
+
+
+def test_busy_thread_rejected_with_409(client, db_session, test_user_data, test_plan, fake_llm, monkeypatch):
+    """Test that a turn on a thread another turn holds gets 409 and Retry-After under the reject policy."""
+    locks = ThreadLocks("reject", wait_seconds=5)
+    monkeypatch.setattr("src.routers.chatbot.thread_locks", locks)
+    client.post("/auth/register", json=test_user_data)
+    token = client.post(
+        "/auth/token", data={"username": test_user_data["email"], "password": test_user_data["password"]}
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    user = db_session.query(User).filter(User.email == test_user_data["email"]).first()
+
+    lease = client.portal.call(locks.acquire, f"thread-{user.id}")
+    for path in ("/chatbot/", "/chatbot/stream"):
+        response = client.post(path, json={"message": "hi"}, headers=headers)
+        assert response.status_code == status.HTTP_409_CONFLICT
+        assert "Retry-After" in response.headers
+    assert fake_llm.calls == 0
+
+    client.portal.call(lease.release)
+    response = client.post("/chatbot/", json={"message": "hi"}, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert fake_llm.calls == 1
+    assert locks.threads == 0
+
+
+def test_unknown_policy_rejected():
+    with pytest.raises(ValueError):
+        ThreadLocks("drop", wait_seconds=1)
+    assert thread_lock.thread_locks.policy in thread_lock.POLICIES
+
+
+def test_stream_abandoned_before_first_chunk_releases_the_thread(client, db_session, test_user_data, test_plan, fake_llm, monkeypatch):
+    """Test that a client leaving before the stream starts frees the thread, the admission slot and the idempotency key."""
+    from src.core.admission import admission_controller
+    from src.core.idempotency import idempotency_store
+
+    locks = ThreadLocks("reject", wait_seconds=5)
+    monkeypatch.setattr("src.routers.chatbot.thread_locks", locks)
+    client.post("/auth/register", json=test_user_data)
+    token = client.post(
+        "/auth/token", data={"username": test_user_data["email"], "password": test_user_data["password"]}
+    ).json()["access_token"]
+    in_flight = admission_controller.in_flight
+
+    async def disconnected_stream():
+        body = b'{"message": "hi"}'
+        messages = [{"type": "http.request", "body": body, "more_body": False}]
+        sent = []
+
+        async def receive():
+            # The request body, then the client is gone
+            return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+        async def send(message):
+            # Like a real server, sending yields to the loop, where the disconnect cancels the stream
+            sent.append(message)
+            await asyncio.sleep(0)
+
+        scope = {
+            "type": "http", "asgi": {"version": "3.0", "spec_version": "2.3"}, "http_version": "1.1",
+            "method": "POST", "scheme": "http", "path": "/chatbot/stream", "raw_path": b"/chatbot/stream",
+            "root_path": "", "query_string": b"", "server": ("testserver", 80), "client": ("testclient", 50000),
+            "headers": [
+                (b"host", b"testserver"),
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"authorization", f"Bearer {token}".encode()),
+                (b"idempotency-key", b"abandoned-1"),
+            ],
+        }
+        await client.app(scope, receive, send)
+        return sent
+
+    sent = client.portal.call(disconnected_stream)
+
+    assert sent[0]["status"] == status.HTTP_200_OK
+    assert locks.threads == 0
+    assert admission_controller.in_flight == in_flight
+    assert idempotency_store.stats()["in_flight"] == 0
+
+    # The user's next turn is not stuck behind the abandoned one
+    response = client.post("/chatbot/", json={"message": "hi"}, headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == status.HTTP_200_OK
@@ -0,0 +1,110 @@
+import json
+
+import pytest
+from fastapi import status
+
+from agents.basic.tokens import estimate_message_tokens
+from langchain_core.messages import HumanMessage, SystemMessage
+from src.core.token_budget import TokenBudget, TokenBudgetExceeded
+from src.models.plan import Plan
+from src.models.user import User
+from src.schemas.usage_log import UsageLogCreate
+from src.services.usage_log_service import create_usage_log, create_usage_logs_bulk, get_token_usage
+
+
+def get_auth_headers(client, test_user_data):
+    """Helper function to register and login a user."""
+    client.post("/auth/register", json=test_user_data)
+    login_data = {
+        "username": test_user_data["email"],
+        "password": test_user_data["password"]
+    }
+    response = client.post("/auth/token", data=login_data)
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def set_token_limits(db_session, plan, **limits):
+    # Requests close the test session, so the fixture's plan is detached by now
+    db_session.query(Plan).filter(Plan.id == plan.id).update(limits)
+    db_session.commit()
+
+
+def usage(inputs: int, outputs: int) -> UsageLogCreate:
+    return UsageLogCreate(
+        main_call_tid="parent-test", node_call_tid="node-test", description="test",
+        model="fake-model", inputs=inputs, outputs=outputs, total=inputs + outputs,
+    )
+
+
+def test_budget_remaining_and_prompt_check():
+    """Test remaining tokens, exhaustion and the pre-flight prompt check."""
+    budget = TokenBudget(window_hours=24, input_limit=100, total_limit=150, input_used=60, total_used=150)
+    assert budget.remaining("input") == 40
+    assert budget.remaining("output") is None
+    assert budget.exhausted() == ["total"]
+
+    budget = TokenBudget(window_hours=24, input_limit=100, input_used=60)
+    budget.check_prompt(40)
+    with pytest.raises(TokenBudgetExceeded) as exc:
+        budget.check_prompt(41)
+    assert exc.value.kind == "input"
+
+
+def test_estimate_grows_with_prompt_length():
+    """Test that a long prompt is estimated far above a short one."""
+    short = estimate_message_tokens([SystemMessage(content="sys"), HumanMessage(content="hi")])
+    long = estimate_message_tokens([SystemMessage(content="sys"), HumanMessage(content="x" * 2000)])
+    assert long - short >= 2000 // 4 - 1
+
+
+def test_counters_updated_when_usage_is_recorded(client, db_session, test_user_data, test_plan):
+    """Test that single and bulk usage writes add up in the running counters."""
+    get_auth_headers(client, test_user_data)
+    user = db_session.query(User).filter(User.email == test_user_data["email"]).first()
+
+    create_usage_log(db_session, user.id, usage(10, 5))
+    create_usage_logs_bulk(db_session, user.id, [usage(100, 20), usage(1, 1)])
+
+    assert get_token_usage(db_session, user.id, 24) == (111, 26, 137)
+
+
+def test_exhausted_budget_rejected_before_the_graph_runs(client, db_session, test_user_data, test_plan, fake_llm):
+    """Test that a user with no total tokens left gets 429 and the LLM is not called."""
+    headers = get_auth_headers(client, test_user_data)
+    user = db_session.query(User).filter(User.email == test_user_data["email"]).first()
+    create_usage_log(db_session, user.id, usage(900, 100))
+    set_token_limits(db_session, test_plan, total_token_limit=1000)
+
+    response = client.post("/chatbot/", json={"message": "hi"}, headers=headers)
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    detail = response.json()["detail"]
+    assert detail["limit"] == "total"
+    assert detail["tokens"]["total"] == {"used": 1000, "limit": 1000, "remaining": 0}
+    assert fake_llm.calls == 0
+
+    usage_response = client.get("/chatbot/usage", headers=headers).json()
+    assert usage_response["can_query"] is False
+    assert usage_response["tokens"]["total"]["remaining"] == 0
+
+
+def test_long_prompt_rejected_before_the_llm_call(client, db_session, test_user_data, test_plan, fake_llm):
+    """Test that a prompt estimated above the remaining input budget never reaches the LLM."""
+    headers = get_auth_headers(client, test_user_data)
+    set_token_limits(db_session, test_plan, input_token_limit=200)
+
+    response = client.post("/chatbot/", json={"message": "word " * 400}, headers=headers)
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert response.json()["detail"]["limit"] == "input"
+    assert fake_llm.calls == 0
+
+    response = client.post("/chatbot/stream", json={"message": "word " * 400}, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert "event: error" in response.text
+    error = json.loads(response.text.split("data: ", 1)[1])
+    assert error["limit"] == "input"
+    assert fake_llm.calls == 0
+
+    set_token_limits(db_session, test_plan, input_token_limit=None)
+    response = client.post("/chatbot/", json={"message": "hi"}, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert fake_llm.calls == 1
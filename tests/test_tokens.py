@@ -0,0 +1,128 @@
+import pytest
+from fastapi import status
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from agents.basic import tokens
+from agents.basic.tokens import (
+    ContextBudget,
+    ContextWindowExceeded,
+    TokenCounter,
+    context_window,
+    estimate_message_tokens,
+)
+from src.core.config import settings
+
+
+class CountingTokenizer:
+    """One token per word, counting how often it is asked."""
+
+    name = "words"
+
+    def __init__(self):
+        self.calls = 0
+
+    def count(self, text: str) -> int:
+        self.calls += 1
+        return len(text.split())
+
+
+def words_counter() -> TokenCounter:
+    counter = TokenCounter("openai:gpt-4o-mini", mode="heuristic")
+    counter.tokenizer = CountingTokenizer()
+    return counter
+
+
+def test_counts_cached_per_message_id():
+    """Test that history messages are tokenized once, however many turns include them."""
+    counter = words_counter()
+    history = [HumanMessage(content="one two three", id="m1"), AIMessage(content="four five", id="m2")]
+
+    first = counter.count_messages(history)
+    second = counter.count_messages(history + [HumanMessage(content="six", id="m3")])
+
+    assert first == tokens.TOKENS_PER_REPLY + 2 * tokens.TOKENS_PER_MESSAGE + 5
+    assert second == first + tokens.TOKENS_PER_MESSAGE + 1
+    assert counter.tokenizer.calls == 3
+
+
+def test_exact_tokenizer_used_once_loaded(monkeypatch):
+    """Test that the counter switches from the heuristic to tiktoken when the encoding loads."""
+    class Encoding:
+        name = "fake_base"
+
+        def encode(self, text, disallowed_special=()):
+            return text.split()
+
+    monkeypatch.setattr(tokens, "load_tiktoken", lambda model: Encoding())
+    counter = TokenCounter("openai:gpt-4o-mini")
+    message = HumanMessage(content="x" * 40, id="m1")
+    assert counter.count_message(message) == tokens.TOKENS_PER_MESSAGE + 10
+
+    counter.load()
+    assert counter.exact
+    assert counter.count_message(message) == tokens.TOKENS_PER_MESSAGE + 1
+
+
+def test_failed_load_keeps_the_heuristic(monkeypatch):
+    """Test that a tokenizer that cannot be loaded (e.g. offline) falls back to the estimate."""
+    def unavailable(model):
+        raise OSError("no network")
+
+    monkeypatch.setattr(tokens, "load_tiktoken", unavailable)
+    counter = TokenCounter("openai:gpt-4o-mini")
+    counter.load()
+    messages = [HumanMessage(content="hello there", id="m1")]
+    assert not counter.exact
+    assert counter.count_messages(messages) == estimate_message_tokens(messages)
+
+
+def test_fit_drops_oldest_history_from_a_user_turn():
+    """Test that old turns are dropped first and the kept history starts at a user message."""
+    counter = words_counter()
+    system = SystemMessage(content="sys")
+    history = [
+        HumanMessage(content="a " * 50, id="h1"),
+        AIMessage(content="b " * 50, id="a1"),
+        HumanMessage(content="c " * 10, id="h2"),
+        AIMessage(content="d " * 10, id="a2"),
+        HumanMessage(content="latest", id="h3"),
+    ]
+    budget = ContextBudget(counter, context_window=100, reserve_tokens=20)
+
+    fitted = budget.fit(system, history)
+
+    assert [m.id for m in fitted.messages[1:]] == ["h2", "a2", "h3"]
+    assert fitted.dropped == 2
+    assert fitted.tokens == counter.count_messages(fitted.messages) <= budget.available
+
+    with pytest.raises(ContextWindowExceeded):
+        budget.fit(system, [HumanMessage(content="w " * 200, id="big")])
+
+
+def test_context_window_lookup(monkeypatch):
+    """Test the known model windows and the LLM_CONTEXT_WINDOW override."""
+    assert context_window("openai:gpt-4o-mini") == 128_000
+    assert context_window("openai:gpt-4.1-mini") == 1_047_576
+    assert context_window("gpt-4") == 8_192
+    monkeypatch.setattr(settings, "LLM_CONTEXT_WINDOW", 32_000)
+    assert context_window("openai:gpt-4o-mini") == 32_000
+
+
+def test_prompt_over_the_context_window_never_reaches_the_llm(client, test_user_data, test_plan, fake_llm, monkeypatch):
+    """Test that a message larger than the model accepts gets an error reply instead of an LLM call."""
+    from agents.basic.nodes.chatbot import node
+
+    counter = TokenCounter(node.llm_model, mode="heuristic")
+    monkeypatch.setitem(tokens._budgets, node.llm_model, ContextBudget(counter, context_window=400, reserve_tokens=100))
+    client.post("/auth/register", json=test_user_data)
+    token = client.post(
+        "/auth/token", data={"username": test_user_data["email"], "password": test_user_data["password"]}
+    ).json()["access_token"]
+
+    response = client.post(
+        "/chatbot/", json={"message": "word " * 399}, headers={"Authorization": f"Bearer {token}"}
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert "too long" in response.json()
+    assert fake_llm.calls == 0
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import pytest
+from langchain_core.messages import HumanMessage
+from src.core import tracing
+from src.core.tracing import InMemorySpanExporter, TraceContextFilter, instrument_engine, trace_graph_runs
+
+
+def get_auth_headers(client, test_user_data):
+    """Helper function to register and login a user."""
+    client.post("/auth/register", json=test_user_data)
+    login_data = {
+        "username": test_user_data["email"],
+        "password": test_user_data["password"]
+    }
+    response = client.post("/auth/token", data=login_data)
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture
+def spans(monkeypatch):
+    """Enable tracing with an in-memory exporter."""
+    exporter = InMemorySpanExporter()
+    monkeypatch.setattr(tracing.tracer, "enabled", True)
+    monkeypatch.setattr(tracing.tracer, "exporters", [exporter])
+    return exporter
+
+
+def test_chat_turn_is_traced_end_to_end(spans, client, test_user_data, test_plan, fake_llm, monkeypatch, db_session):
+    """Test that one chat turn yields nested request, dependency, graph, node, LLM, checkpoint and SQL spans."""
+    from agents.basic import usage
+    monkeypatch.setattr(usage, "SessionLocal", lambda: db_session)
+    instrument_engine(db_session.get_bind().engine)
+    headers = get_auth_headers(client, test_user_data)
+    trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+    headers["traceparent"] = f"00-{trace_id}-00f067aa0ba902b7-01"
+
+    response = client.post("/chatbot/", json={"message": "hi"}, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["x-trace-id"] == trace_id
+
+    trace = [span for span in spans.spans if span.trace_id == trace_id]
+    by_name = {span.name: span for span in trace}
+    request = by_name["HTTP POST /chatbot/"]
+    assert request.parent_id == "00f067aa0ba902b7"
+    assert by_name["dependency get_current_user"].parent_id == request.span_id
+    assert by_name["dependency verify_chatbot_rate_limit"].parent_id == request.span_id
+
+    graph = by_name["graph LangGraph"]
+    node = by_name["node chatbot"]
+    assert graph.parent_id == request.span_id
+    assert node.parent_id == graph.span_id
+    llm = next(span for span in trace if span.name.startswith("llm "))
+    assert llm.parent_id == node.span_id
+    assert llm.attributes["llm.output_tokens"] == 5
+
+    assert any(span.name == "checkpoint aget_tuple" for span in trace)
+    assert any(span.name == "checkpoint aput" for span in trace)
+    sql = [span for span in trace if span.name.startswith("db ")]
+    assert sql
+    # Usage-log INSERT runs in a worker thread inside the node
+    assert any(span.name == "db INSERT" and span.parent_id == node.span_id for span in sql)
+
+
+def test_graph_runs_traced_outside_requests(spans, fake_llm):
+    """Test tracing a graph run from a script via trace_graph_runs."""
+    from agents.basic.agent import make_graph
+
+    async def run_turn():
+        agent = make_graph(config={"checkpointer": None})
+        config = {"configurable": {"usage_log_buffer": []}, "user_id": 1, "main_call_tid": "parent-trace"}
+        with trace_graph_runs():
+            await agent.ainvoke({"messages": [HumanMessage(content="hi")]}, config=config)
+
+    asyncio.run(run_turn())
+
+    graph = spans.by_name("graph ")[0]
+    node = spans.by_name("node chatbot")[0]
+    assert node.parent_id == graph.span_id
+    assert node.trace_id == graph.trace_id
+
+
+def test_log_records_carry_trace_id(spans):
+    """Test that the log filter adds the current trace id."""
+    record = logging.LogRecord("test", logging.INFO, __file__, 1, "message", None, None)
+    log_filter = TraceContextFilter()
+
+    log_filter.filter(record)
+    assert record.trace_id == "-"
+
+    with tracing.span("work") as current:
+        log_filter.filter(record)
+    assert record.trace_id == current.trace_id
+    assert spans.by_name("work")[0].span_id == current.span_id